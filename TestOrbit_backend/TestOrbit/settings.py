@@ -122,6 +122,37 @@ AUTHORIZE_API = (
 NO_AUTHORIZE_API = ('/user/login',)
 
 FILE_DIR_HOST = 'http://127.0.0.1:8003/'  # 用于获取上传的文件主机地址，部署时需要修改
+FILE_CACHE_MAX_SIZE = 256 * 1024 * 1024  # 执行步骤时缓存的form-data上传文件总大小上限（字节），超过后淘汰最久未使用的文件
+FILE_CACHE_MMAP_THRESHOLD = 4 * 1024 * 1024  # 超过该大小（字节）的上传文件写入缓存目录后以内存映射方式读取，较小的保存在内存中
+FILE_CACHE_DIR = None  # 内存映射的上传文件缓存目录，为None时使用系统临时目录下的testorbit_file_cache
+FILE_CACHE_URL_TTL = 300  # 非本服务的上传文件下载后多久（秒）内不再重新下载
+RESPONSE_CAPTURE_MAX_BYTES = 10 * 1024 * 1024  # 接口步骤的响应体在内存中最多保留的字节数，超出部分只计算大小及hash，不参与解析
+RESPONSE_PREVIEW_BYTES = 64 * 1024  # 不超过该大小（字节）的文本响应完整保存到请求日志，较大或二进制的响应只保存大小、hash及预览
+JSON_CODEC = 'auto'  # 响应体、JSON路径断言使用的JSON解码实现：auto为安装了orjson时使用orjson，否则使用标准库json；也可指定orjson或json
+ASYNC_RUN_CONCURRENCY = 100  # 批量执行异步模式下同时执行的用例数上限，可通过concurrency参数覆盖
+PROCESS_RUN_WORKERS = None  # 批量执行多进程模式下的进程数，为None时使用CPU核数，可通过processes参数覆盖
+FOREACH_PARALLEL_CONCURRENCY = 10  # 循环控制器开启并行执行时同时执行的循环数，可通过循环控制器的concurrency参数覆盖
+PROCESS_RUN_START_METHOD = None  # 多进程模式创建子进程的方式(fork/spawn/forkserver)，为None时使用平台默认方式
+STEP_RESULT_FLUSH_INTERVAL = 2  # 步骤结果后台批量写入数据库的间隔（秒），为0时只在用例执行结束时写入
+STEP_RESULT_DURABLE = False  # 为True时步骤结果会立即写入数据库，执行中途崩溃也能保留已执行步骤的结果
+CANCEL_BACKEND = 'db'  # 中断通知后端：db为当前进程直接通知、其他进程轮询UserCfg.exec_status；memory只通知当前进程；redis为发布订阅
+CANCEL_POLL_INTERVAL = 1  # db后端中，有执行中任务的进程查询中断状态的间隔（秒）
+DB_POOL_MAX_SIZE = 5  # SQL步骤的数据库连接池中，每个连接目标（环境数据库）最多同时打开的连接数
+DB_POOL_IDLE_TIMEOUT = 300  # 数据库连接池中的连接、ssh隧道空闲超过该时间（秒）后关闭
+DB_POOL_CHECK_INTERVAL = 30  # 数据库连接池中空闲超过该时间（秒）的连接，取出时先检查连接是否可用
+DB_POOL_WAIT_TIMEOUT = 30  # 数据库连接数达到上限时等待其他步骤归还连接的最长时间（秒）
+ENV_SNAPSHOT_TTL = 60  # 执行用的环境快照在进程内缓存的时间（秒），修改环境后其他进程最多在该时间后生效
+CANCEL_REDIS_URL = 'redis://127.0.0.1:6379/0'  # CANCEL_BACKEND为redis时使用的redis地址，为local://时使用进程内的替身（本地开发、测试）
+ARTIFACT_BACKEND = 'local'  # 请求/响应内容的制品存储后端，为空时不启用，内容直接保存在步骤结果及报告中
+ARTIFACT_ROOT = BASE_DIR / 'artifacts'  # local后端保存制品的目录
+ARTIFACT_MIN_SIZE = 1024  # 内容超过该大小(字节)时才保存为制品
+SCHEDULER_MAX_WORKERS = 4  # 同时执行的定时任务数上限
+SCHEDULER_SYNC_INTERVAL = 10  # 定时任务调度主节点从数据库全量同步任务的间隔（秒），其他进程创建的任务最多延迟该时间被加载
+SCHEDULER_LEASE_TTL = 30  # 调度主节点租约及任务执行租约的时长（秒），持有进程退出后超过该时长由其他进程接管
+JOB_WORKER_CONCURRENCY = 2  # 每个执行进程(python manage.py run_worker)同时执行的批量执行任务数
+JOB_POLL_INTERVAL = 1  # 执行进程在队列为空时查询新任务的间隔（秒）
+JOB_LEASE_TTL = 60  # 批量执行任务的执行租约时长（秒），执行进程退出后超过该时长任务重新排队
+JOB_MAX_ATTEMPTS = 3  # 批量执行任务的最大认领次数，超过后标记为执行失败
 # 数据库配置
 # 自行配置
 DATABASES = {
@@ -14,8 +14,9 @@ class ApidataConfig(AppConfig):
         import sys
         import os
         
-        # 检查是否是主进程（避免在自动重新加载时重复启动）
-        if os.environ.get('RUN_MAIN') == 'true' and ('runserver' in sys.argv or 'gunicorn' in sys.argv[0]):
+        # runserver只在自动重新加载的子进程中启动；gunicorn每个worker都会启动调度器，由数据库租约选举唯一的主节点负责调度
+        is_runserver = 'runserver' in sys.argv and os.environ.get('RUN_MAIN') == 'true'
+        if is_runserver or 'gunicorn' in sys.argv[0]:
             from .views.function.scheduled_tasks_def import TaskScheduler
             scheduler = TaskScheduler()
             scheduler.start()
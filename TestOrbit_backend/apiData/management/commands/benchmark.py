@@ -0,0 +1,275 @@
+"""
+执行引擎的性能基准测试
+用法：python manage.py benchmark params --number 2000
+"""
+import copy
+import re
+import time
+import timeit
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from utils.diyException import DiyBaseException
+
+
+def legacy_get_parm_v_by_temp(name_list, base_params, i=0):
+    """
+    逐级解析路径并eval取值（取值器编译前的实现），作为基准测试的对照
+    """
+
+    if name_list:  # 单条变量或值记录
+        _name = name_list[0]
+        if isinstance(_name, str):
+            if _name.startswith('*') and isinstance(base_params, list):
+                _name = _name[1:]
+                res_data = []
+                for v in base_params:
+                    if not isinstance(v, dict):
+                        return False
+                    if _name not in v:
+                        return False
+                    get_value = v[_name]
+                    if isinstance(get_value, dict) and len(name_list) > 1:
+                        get_value = legacy_get_parm_v_by_temp(name_list[1:], get_value)['value']
+                    res_data.append(get_value)
+                base_params = res_data
+            else:
+                # 数组取索引值
+                _index = re.findall(r'\[(.*?)]', _name)  # 可能有多维数组的情况[0][1]
+                str_index = ''
+                if _index:  # 处理列表索引的情况
+                    _name = _name.split('[')[0]
+                    if _name:  # 返回结果可能为纯数组，这个时候是没有变量的
+                        str_index += '[_name]'
+                    for index_name in _index:
+                        # []中字符串为纯数字，或者为i，或者为-1这种数字
+                        if index_name.isdigit() or index_name == 'i' or (
+                                index_name.startswith('-') and index_name[1:].isdigit()):
+                            str_index += f'[{index_name}]'
+                        else:  # 代表索引名称为一个变量
+                            raise DiyBaseException('错误的数组格式，若要使用变量表示数组下标，格式为:[${变量}]')
+
+                if isinstance(base_params, dict):
+                    if _name in base_params:
+                        # 有exp_index代表是列表，就不能按取字典的方式进下级，应该按索引的方式进入下一级
+                        new_response_data = eval(
+                            'base_params' + str_index) if _index else base_params[_name]
+                        return legacy_get_parm_v_by_temp(name_list[1:], new_response_data, i)
+                elif isinstance(base_params, list) and _index:  # _name为空的时候会走这个分支，也代表响应结果是纯数组
+                    new_response_data = eval('base_params' + str_index)
+                    return legacy_get_parm_v_by_temp(name_list[1:], new_response_data, i)
+                return False
+        elif isinstance(_name, list):  # [0].id这种参数时，格式化后会变为[0]的数组，会走这个分支
+            new_response_data = eval('base_params' + str(_name))
+            return legacy_get_parm_v_by_temp(name_list[1:], new_response_data, i)
+
+    return {'value': base_params}
+
+
+def legacy_parse_param_value(v, params, i=0):
+    """
+    逐次正则匹配解析参数（模板编译前的实现），作为基准测试的对照
+    """
+    is_eval = False
+    if isinstance(v, str):
+        if v.startswith('eval('):
+            v, is_eval = v[5:-1], True
+        var_name_list = re.findall(r'\${(.*?)}', v)  # 取变量
+        if var_name_list:  # 有变量的情况
+            var_name_len = len(var_name_list)
+            for j, var_name in enumerate(var_name_list):
+                real_var_name = var_name
+                if '${' in var_name:  # 当变量为${${a}}代表嵌套变量，这种格式的时候走此分支
+                    real_var_name += '}'
+                    pattern = re.escape(real_var_name) + r"(.*?)}"
+                    real_var_name += re.findall(pattern, v)[0]  # 补齐字段
+                    var_name = str(legacy_parse_param_value(real_var_name, params, i))
+                name_list = var_name.split('.')  # 获取父子级参数
+                res = legacy_get_parm_v_by_temp(name_list, params, i)
+
+                if not res:
+                    if var_name == 'i':  # i为固定变量
+                        res = {'value': i}
+                    else:
+                        raise Exception("指定的变量不存在")
+                res_value = res['value']
+                # name_list只有一个,如果变量加上${}后与原字符串相等，所以直接赋值就可，不需要替换
+                if j == 0 and 1 == var_name_len and (('${' + real_var_name + '}') == v):
+                    v = res_value
+                else:
+                    if not isinstance(res_value, str):
+                        res_value = str(res_value)
+                    v = v.replace('${' + real_var_name + '}', res_value)
+    elif isinstance(v, dict):
+        v = {key: legacy_parse_param_value(v[key], params, i) for key in v}
+    elif isinstance(v, list):
+        v = [legacy_parse_param_value(_v, params, i) for _v in v]
+    if is_eval:
+        v = eval(v)
+    return v
+
+
+def get_params_samples():
+    """
+    构造接近真实步骤的参数：请求头、查询参数、请求体、输出参数和期望值
+    """
+    default_var = {
+        'host': 'http://127.0.0.1:8000', 'token': 'abc123', 'user_id': 10, 'name': 'test', 'key': 'token',
+        'user': {'id': 10, 'name': 'test', 'roles': [{'id': 1}, {'id': 2}]}, 'items': [1, 2, 3],
+    }
+    params = {
+        'header': {'Authorization': 'Bearer ${token}', 'X-User': '${user.id}', 'Content-Type': 'application/json'},
+        'query': {'id': '${user_id}', 'page': 1, 'size': 20, 'keyword': '${name}-${i}'},
+        'body': {'user': '${user}', 'roles': ['${user.roles[0].id}', '${user.roles[-1].id}'], 'nested': '${${key}}',
+                 'items': '${items}', 'total': 'eval(${user_id} * 2)', 'desc': 'plain text without variables'},
+        'output': [{'name': 'id', 'value': 'data.id'}, {'name': 'token', 'value': 'data.token'}],
+        'expect': [{'name': 'code', 'value': '${user_id}'}],
+    }
+    return params, default_var
+
+
+def bench_params(number):
+    from utils.paramsDef import parse_param_value
+
+    params, default_var = get_params_samples()
+    results = []
+    for i in range(3):
+        legacy_res = legacy_parse_param_value(copy.deepcopy(params), default_var, i)
+        res = parse_param_value(copy.deepcopy(params), default_var, i)
+        results.append(legacy_res == res)
+    legacy_time = timeit.timeit(lambda: legacy_parse_param_value(params, default_var, 1), number=number)
+    new_time = timeit.timeit(lambda: parse_param_value(params, default_var, 1), number=number)
+    return {'name': 'parse_param_value', 'legacy': legacy_time, 'new': new_time, 'same': all(results)}
+
+
+def bench_path(number):
+    from utils.paramsDef import get_parm_v_by_temp
+
+    response = {'code': 0, 'data': {'list': [{'id': n, 'user': {'name': f'u{n}'}, 'tags': [n, n + 1]}
+                                             for n in range(50)], 'total': 50}}
+    paths = [['data', 'list[0]', 'id'], ['data', 'list[-1]', 'tags[1]'], ['data', 'list[i]', 'user', 'name'],
+             ['data', 'list', '*id'], ['data', 'list', '*user', 'name'], ['data', 'total'], ['code']]
+
+    def run(func):
+        return [func(path, response, 3) for path in paths]
+
+    legacy_time = timeit.timeit(lambda: run(legacy_get_parm_v_by_temp), number=number)
+    new_time = timeit.timeit(lambda: run(get_parm_v_by_temp), number=number)
+    return {'name': 'get_parm_v_by_temp', 'legacy': legacy_time, 'new': new_time,
+            'same': run(legacy_get_parm_v_by_temp) == run(get_parm_v_by_temp)}
+
+
+def bench_scope(number):
+    """
+    模拟循环控制器的每次循环：复制循环的步骤、检查中止条件、检查步骤的执行条件
+    default_var中保存了sql_var查询出的较大结果
+    """
+    from apiData.views.function.viewDef import copy_foreach_steps
+    from utils.paramsDef import run_params_code
+    from utils.scopeDef import VarScope
+
+    default_var = {'token': 'abc123', 'flag': True,
+                   'sql_rows': [{'id': n, 'name': f'name{n}', 'tags': [n, n + 1], 'detail': {'a': n, 'b': str(n)}}
+                                for n in range(100)]}
+    steps = [{'id': n, 'type': 'api', 'step_name': f'step{n}', 'enabled': True, 'status': 0, 'results': None,
+              'controller_data': {'execute_on': "return var['token'] != ''"},
+              'params': {'header': {'token': '${token}'}, 'body': {'id': '${sql_rows[0].id}', 'list': list(range(20))}}}
+             for n in range(5)]
+    break_code = "return var['flag'] is False and i > 100000"
+
+    def legacy_iteration(i):
+        loop_steps = copy.deepcopy(steps)
+        res = [run_params_code(break_code, copy.deepcopy(default_var), i)]
+        for step in loop_steps:
+            res.append(run_params_code(step['controller_data']['execute_on'], copy.deepcopy(default_var), i))
+            step['status'] = 4
+        return res
+
+    def new_iteration(i):
+        loop_steps = copy_foreach_steps(steps)
+        res = [run_params_code(break_code, VarScope(default_var), i)]
+        for step in loop_steps:
+            res.append(run_params_code(step['controller_data']['execute_on'], VarScope(default_var), i))
+            step['status'] = 4
+        return res
+
+    def run(func):
+        start = time.perf_counter()
+        res = [func(i) for i in range(number)]
+        return time.perf_counter() - start, res
+
+    def memory(func, times=100):
+        """
+        单次循环新分配内存的峰值（平均值）
+        """
+        tracemalloc.start()
+        total = 0
+        for i in range(times):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func(i)
+            total += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        return total / times
+
+    legacy_time, legacy_res = run(legacy_iteration)
+    new_time, new_res = run(new_iteration)
+    return {'name': f'循环控制器{number}次循环', 'legacy': legacy_time, 'new': new_time,
+            'same': legacy_res == new_res and steps[0]['status'] == 0,
+            'legacy_memory': memory(legacy_iteration), 'new_memory': memory(new_iteration)}
+
+
+def bench_json(number):
+    """
+    较大的响应体的解码：标准库json.loads与JSON_CODEC配置的解码实现
+    """
+    import datetime
+    import decimal
+    import json
+
+    from utils.comDef import JSONEncoder, json_dumps, json_loads
+    from utils.jsonCodecDef import get_json_codec
+
+    now = datetime.datetime(2024, 1, 1, 12, 30)
+    body = {'code': 0, 'msg': '成功', 'data': {'total': 2000, 'list': [
+        {'id': n, 'name': f'用户{n}', 'amount': decimal.Decimal(f'{n}.25'), 'created': now, 'enabled': n % 2 == 0,
+         'tags': ['a', 'b', str(n)], 'detail': {'score': n / 3, 'remark': None, 'roles': [{'id': 1}, {'id': 2}]}}
+        for n in range(2000)]}}
+
+    content = json_dumps(body, JSONEncoder).encode()
+
+    legacy_time = timeit.timeit(lambda: json.loads(content), number=number)
+    new_time = timeit.timeit(lambda: json_loads(content), number=number)
+    return {'name': f'JSON解码（{get_json_codec().name}，{len(content) // 1024}KB）',
+            'legacy': legacy_time, 'new': new_time, 'same': json.loads(content) == json_loads(content)}
+
+
+BENCHMARKS = {
+    'params': (bench_params, 2000),
+    'path': (bench_path, 2000),
+    'scope': (bench_scope, 10000),
+    'json': (bench_json, 50),
+}
+
+
+class Command(BaseCommand):
+    help = '执行引擎的性能基准测试，对比优化前后的实现耗时及结果是否一致'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=list(BENCHMARKS), help='基准测试项')
+        parser.add_argument('--number', type=int, help='每种实现的执行次数，默认使用各基准测试项的默认次数')
+
+    def handle(self, *args, **options):
+        func, default_number = BENCHMARKS[options['target']]
+        number = options['number'] or default_number
+        res = func(number)
+        self.stdout.write(f"{res['name']}：执行{number}次")
+        self.stdout.write(f"  原实现：{res['legacy']:.4f}s（{res['legacy'] / number * 1e6:.1f}us/次）")
+        self.stdout.write(f"  新实现：{res['new']:.4f}s（{res['new'] / number * 1e6:.1f}us/次）")
+        if res['new']:
+            self.stdout.write(f"  加速比：{res['legacy'] / res['new']:.2f}x")
+        if 'legacy_memory' in res:
+            self.stdout.write(f"  单次内存峰值：原实现{res['legacy_memory'] / 1024:.1f}KB，"
+                              f"新实现{res['new_memory'] / 1024:.1f}KB")
+        self.stdout.write(f"  结果一致：{res['same']}")
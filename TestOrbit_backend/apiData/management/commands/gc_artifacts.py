@@ -0,0 +1,37 @@
+"""
+制品存储的垃圾回收：删除没有被报告及步骤结果引用的制品
+用法：python manage.py gc_artifacts --grace 3600 --dry-run
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apiData.models import Report, ApiCaseStep
+from utils.artifactDef import get_artifact_store, iter_artifact_refs
+
+
+def get_referenced_artifacts():
+    """
+    收集报告及步骤结果中引用的所有制品
+    """
+    referenced = set()
+    for report_data in Report.objects.values_list('report_data', flat=True).iterator(chunk_size=100):
+        referenced.update(iter_artifact_refs(report_data))
+    for results in ApiCaseStep.objects.exclude(results=None).values_list('results', flat=True).iterator(chunk_size=500):
+        referenced.update(iter_artifact_refs(results))
+    return referenced
+
+
+class Command(BaseCommand):
+    help = '删除没有被报告及步骤结果引用的制品'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=3600,
+                            help='最近多少秒内写入或被引用过的制品不删除，避免删除执行中还未保存结果的制品')
+        parser.add_argument('--dry-run', action='store_true', help='只统计需要删除的制品，不实际删除')
+
+    def handle(self, *args, **options):
+        if not (artifact_store := get_artifact_store()):
+            raise CommandError('未启用制品存储(ARTIFACT_BACKEND)')
+        referenced = get_referenced_artifacts()
+        removed = artifact_store.collect_garbage(referenced, grace=options['grace'], dry_run=options['dry_run'])
+        action = '需要删除' if options['dry_run'] else '已删除'
+        self.stdout.write(f'被引用的制品：{len(referenced)}个，{action}未被引用的制品：{len(removed)}个')
@@ -0,0 +1,20 @@
+"""
+批量执行的执行进程：从数据库任务队列中认领并执行批量执行任务
+用法：python manage.py run_worker --concurrency 4
+可以在多台机器上启动多个执行进程增加执行能力
+"""
+from django.core.management.base import BaseCommand
+
+from apiData.views.function.job_def import JobWorker
+
+
+class Command(BaseCommand):
+    help = '从任务队列中认领并执行批量执行任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help='同时执行的任务数，默认使用JOB_WORKER_CONCURRENCY')
+        parser.add_argument('--poll-interval', type=float, help='队列为空时查询新任务的间隔（秒），默认使用JOB_POLL_INTERVAL')
+        parser.add_argument('--once', action='store_true', help='执行完队列中的任务后退出')
+
+    def handle(self, *args, **options):
+        JobWorker(options['concurrency'], options['poll_interval']).run(once=options['once'])
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiData", "0006_remove_apicase_report_data_assertionrule"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="apicase",
+            name="report_data",
+        ),
+        migrations.AddField(
+            model_name="report",
+            name="run_id",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                max_length=32,
+                null=True,
+                verbose_name="执行id",
+            ),
+        ),
+    ]
@@ -0,0 +1,160 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_report_summaries(apps, schema_editor):
+    """
+    为已有的报告生成摘要
+    """
+    Report = apps.get_model("apiData", "Report")
+    ReportSummary = apps.get_model("apiData", "ReportSummary")
+    summaries = []
+    for report in Report.objects.iterator():
+        report_data = report.report_data if isinstance(report.report_data, dict) else {}
+        summary = report_data.get("summary") or {}
+        cases = report_data.get("cases") or []
+        summaries.append(
+            ReportSummary(
+                report_id=report.id,
+                name=report.name,
+                run_id=report.run_id,
+                total_cases=summary.get("total_cases", len(cases)),
+                success_cases=summary.get("success_cases", 0),
+                failed_cases=summary.get("failed_cases", 0),
+                total_steps=sum(
+                    case.get("statistics", {}).get("total_steps", 0) for case in cases
+                ),
+                success_steps=sum(
+                    case.get("statistics", {}).get("success_steps", 0) for case in cases
+                ),
+                success_rate=summary.get("success_rate", 0),
+                duration=sum(case.get("spend_time", 0) for case in cases),
+                creater_id=report.creater_id,
+                project_id=report.project_id,
+            )
+        )
+    ReportSummary.objects.bulk_create(summaries, batch_size=500)
+    # auto_now_add在创建时写入当前时间，改为报告的创建时间
+    for summary in ReportSummary.objects.select_related("report").iterator():
+        ReportSummary.objects.filter(id=summary.id).update(
+            created=summary.report.created
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiData", "0007_report_run_id"),
+        ("config", "0004_environment_http_cfg"),
+        ("project", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportSummary",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=255, verbose_name="报告名称")),
+                (
+                    "run_id",
+                    models.CharField(
+                        blank=True,
+                        db_index=True,
+                        max_length=32,
+                        null=True,
+                        verbose_name="执行id",
+                    ),
+                ),
+                (
+                    "trigger",
+                    models.IntegerField(
+                        choices=[(0, "手动执行"), (1, "批量执行"), (2, "定时执行")],
+                        db_index=True,
+                        default=0,
+                        verbose_name="触发方式",
+                    ),
+                ),
+                (
+                    "total_cases",
+                    models.IntegerField(default=0, verbose_name="用例总数"),
+                ),
+                (
+                    "success_cases",
+                    models.IntegerField(default=0, verbose_name="成功用例数"),
+                ),
+                (
+                    "failed_cases",
+                    models.IntegerField(default=0, verbose_name="失败用例数"),
+                ),
+                (
+                    "total_steps",
+                    models.IntegerField(default=0, verbose_name="步骤总数"),
+                ),
+                (
+                    "success_steps",
+                    models.IntegerField(default=0, verbose_name="成功步骤数"),
+                ),
+                (
+                    "success_rate",
+                    models.FloatField(db_index=True, default=0, verbose_name="通过率"),
+                ),
+                ("duration", models.FloatField(default=0, verbose_name="执行耗时(秒)")),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="创建时间"
+                    ),
+                ),
+                (
+                    "creater",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="创建者",
+                    ),
+                ),
+                (
+                    "env",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="config.environment",
+                        verbose_name="执行环境",
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="project.project",
+                        verbose_name="关联项目",
+                    ),
+                ),
+                (
+                    "report",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="summary",
+                        to="apiData.report",
+                        verbose_name="关联报告",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "用例执行报告摘要",
+                "db_table": "case_report_summary",
+                "indexes": [
+                    models.Index(
+                        fields=["project", "-created"],
+                        name="report_summary_proj_created",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(create_report_summaries, migrations.RunPython.noop),
+    ]
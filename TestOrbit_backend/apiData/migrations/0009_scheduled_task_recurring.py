@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiData", "0008_report_summary"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scheduledtask",
+            name="cron_expression",
+            field=models.CharField(
+                blank=True, max_length=100, null=True, verbose_name="cron表达式"
+            ),
+        ),
+        migrations.AddField(
+            model_name="scheduledtask",
+            name="misfire_grace_time",
+            field=models.IntegerField(
+                default=60, verbose_name="错过执行的容忍时间(秒)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="scheduledtask",
+            name="misfire_policy",
+            field=models.CharField(
+                choices=[("run_once", "立即补执行一次"), ("skip", "跳过本次执行")],
+                default="run_once",
+                max_length=20,
+                verbose_name="错过执行的处理方式",
+            ),
+        ),
+        migrations.AddField(
+            model_name="scheduledtask",
+            name="overlap_policy",
+            field=models.CharField(
+                choices=[
+                    ("skip", "跳过本次执行"),
+                    ("queue", "上次执行结束后再执行"),
+                    ("allow", "允许同时执行"),
+                ],
+                default="skip",
+                max_length=20,
+                verbose_name="重叠执行的处理方式",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scheduledtask",
+            index=models.Index(
+                fields=["status", "scheduled_time"], name="sched_task_status_time"
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiData", "0009_scheduled_task_recurring"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ServiceLease",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="租约名称",
+                    ),
+                ),
+                ("owner", models.CharField(max_length=100, verbose_name="持有者")),
+                ("expires", models.DateTimeField(verbose_name="过期时间")),
+            ],
+            options={
+                "verbose_name": "服务租约",
+                "db_table": "api_service_lease",
+            },
+        ),
+        migrations.AddField(
+            model_name="scheduledtask",
+            name="lease_expires",
+            field=models.DateTimeField(
+                blank=True, db_index=True, null=True, verbose_name="租约过期时间"
+            ),
+        ),
+        migrations.AddField(
+            model_name="scheduledtask",
+            name="lease_owner",
+            field=models.CharField(
+                blank=True, max_length=100, null=True, verbose_name="执行进程"
+            ),
+        ),
+    ]
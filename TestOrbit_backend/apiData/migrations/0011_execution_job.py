@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiData", "0010_scheduler_lease"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExecutionJob",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "run_id",
+                    models.CharField(max_length=32, unique=True, verbose_name="执行id"),
+                ),
+                ("params", models.JSONField(verbose_name="执行参数")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "排队中"),
+                            ("running", "执行中"),
+                            ("completed", "已完成"),
+                            ("failed", "执行失败"),
+                            ("cancelled", "已取消"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                        verbose_name="任务状态",
+                    ),
+                ),
+                (
+                    "result",
+                    models.JSONField(blank=True, null=True, verbose_name="执行结果"),
+                ),
+                (
+                    "error_message",
+                    models.TextField(blank=True, null=True, verbose_name="错误信息"),
+                ),
+                ("attempts", models.IntegerField(default=0, verbose_name="认领次数")),
+                (
+                    "worker",
+                    models.CharField(
+                        blank=True, max_length=100, null=True, verbose_name="执行进程"
+                    ),
+                ),
+                (
+                    "lease_expires",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="租约过期时间"
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(auto_now_add=True, verbose_name="提交时间"),
+                ),
+                (
+                    "started",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="开始时间"
+                    ),
+                ),
+                (
+                    "finished",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="结束时间"
+                    ),
+                ),
+                (
+                    "creater",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="提交者",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "执行任务",
+                "db_table": "api_execution_job",
+                "indexes": [
+                    models.Index(fields=["status", "id"], name="exec_job_status_id")
+                ],
+            },
+        ),
+    ]
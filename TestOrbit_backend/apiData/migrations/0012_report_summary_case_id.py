@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiData", "0011_execution_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reportsummary",
+            name="case_id",
+            field=models.IntegerField(
+                blank=True, db_index=True, null=True, verbose_name="执行的用例id"
+            ),
+        ),
+    ]
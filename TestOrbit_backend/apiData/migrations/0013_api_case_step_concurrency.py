@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiData", "0012_report_summary_case_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apicase",
+            name="step_concurrency",
+            field=models.IntegerField(default=0, verbose_name="步骤并发数"),
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.db.models import JSONField
 from utils.comDef import get_next_id
 from utils.comModel import ComTimeModel, ComModuleModel
-from utils.constant import WAITING, SUCCESS, FAILED
+from utils.constant import WAITING, SUCCESS, FAILED, MANUAL_TRIGGER, TRIGGER_LABEL
 from project.models import Project
 from user.models import UserEditModel
 from config.models import Environment
@@ -45,6 +45,7 @@ class ApiCase(ComTimeModel, UserEditModel):
     latest_run_time = models.DateTimeField(null=True, verbose_name='最后一次执行时间')
     position = models.IntegerField(default=0, verbose_name='排序优先级')
     env = models.ForeignKey(to=Environment, null=True, blank=True, on_delete=models.PROTECT, verbose_name="引用的环境")
+    step_concurrency = models.IntegerField(default=0, verbose_name='步骤并发数')  # 大于1时没有依赖关系的步骤并发执行
 
     class Meta:
         verbose_name = '接口用例'
@@ -230,6 +231,19 @@ class ScheduledTask(ComTimeModel, UserEditModel):
         (1, '并行'),
     ]
     
+    # 错过预定时间（超过misfire_grace_time）时的处理方式
+    MISFIRE_POLICY_CHOICES = [
+        ('run_once', '立即补执行一次'),
+        ('skip', '跳过本次执行'),
+    ]
+    
+    # 周期任务到期时上一次执行还未结束的处理方式
+    OVERLAP_POLICY_CHOICES = [
+        ('skip', '跳过本次执行'),
+        ('queue', '上次执行结束后再执行'),
+        ('allow', '允许同时执行'),
+    ]
+    
     id = models.AutoField(primary_key=True)
     task_name = models.CharField(max_length=255, verbose_name="任务名称", default="定时测试任务")
     
@@ -261,20 +275,42 @@ class ScheduledTask(ComTimeModel, UserEditModel):
     # 执行次数统计
     execution_count = models.IntegerField(default=0, verbose_name="执行次数")
     
-    # 是否重复执行（为将来的周期性任务预留）
+    # 是否重复执行，重复执行的任务按recurring_interval间隔执行
     is_recurring = models.BooleanField(default=False, verbose_name="是否重复执行")
     
     # 重复执行的间隔（分钟）
     recurring_interval = models.IntegerField(null=True, blank=True, verbose_name="重复间隔(分钟)")
     
+    # cron表达式（分 时 日 月 周），设置后按表达式周期执行
+    cron_expression = models.CharField(max_length=100, null=True, blank=True, verbose_name="cron表达式")
+    
+    # 错过执行的容忍时间及处理方式
+    misfire_grace_time = models.IntegerField(default=60, verbose_name="错过执行的容忍时间(秒)")
+    misfire_policy = models.CharField(max_length=20, choices=MISFIRE_POLICY_CHOICES, default='run_once',
+                                      verbose_name="错过执行的处理方式")
+    
+    # 上次执行未结束时的处理方式
+    overlap_policy = models.CharField(max_length=20, choices=OVERLAP_POLICY_CHOICES, default='skip',
+                                      verbose_name="重叠执行的处理方式")
+    
+    # 执行租约：执行中的进程定时续期，租约过期说明执行进程已退出，由调度主节点接管
+    lease_owner = models.CharField(max_length=100, null=True, blank=True, verbose_name="执行进程")
+    lease_expires = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name="租约过期时间")
+    
     class Meta:
         verbose_name = '定时任务'
         db_table = 'api_scheduled_task'
         ordering = ['-scheduled_time']
+        indexes = [models.Index(fields=['status', 'scheduled_time'], name='sched_task_status_time')]
     
     def __str__(self):
         return f"{self.task_name} - {self.scheduled_time}"
     
+    @property
+    def is_periodic(self):
+        """是否为周期任务（cron表达式或固定间隔）"""
+        return bool(self.cron_expression) or bool(self.is_recurring and self.recurring_interval)
+    
     @property
     def is_expired(self):
         """检查任务是否已过期"""
@@ -289,9 +325,58 @@ class ScheduledTask(ComTimeModel, UserEditModel):
         return None
 
 
+class ExecutionJob(models.Model):
+    """
+    执行任务队列
+    批量执行提交为任务后立即返回run_id，由执行进程（python manage.py run_worker）认领执行，执行进程可部署在多台机器上
+    """
+    STATUS_CHOICES = [
+        ('queued', '排队中'),
+        ('running', '执行中'),
+        ('completed', '已完成'),
+        ('failed', '执行失败'),
+        ('cancelled', '已取消'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    run_id = models.CharField(max_length=32, unique=True, verbose_name='执行id')
+    params = models.JSONField(verbose_name='执行参数')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name='任务状态')
+    result = models.JSONField(null=True, blank=True, verbose_name='执行结果')
+    error_message = models.TextField(null=True, blank=True, verbose_name='错误信息')
+    attempts = models.IntegerField(default=0, verbose_name='认领次数')
+    # 执行租约：执行进程定时续期，租约过期说明执行进程已退出，任务重新排队
+    worker = models.CharField(max_length=100, null=True, blank=True, verbose_name='执行进程')
+    lease_expires = models.DateTimeField(null=True, blank=True, verbose_name='租约过期时间')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='提交时间')
+    started = models.DateTimeField(null=True, blank=True, verbose_name='开始时间')
+    finished = models.DateTimeField(null=True, blank=True, verbose_name='结束时间')
+    creater = models.ForeignKey(ExpendUser, on_delete=models.CASCADE, verbose_name='提交者')
+
+    class Meta:
+        verbose_name = '执行任务'
+        db_table = 'api_execution_job'
+        indexes = [models.Index(fields=['status', 'id'], name='exec_job_status_id')]
+
+
+class ServiceLease(models.Model):
+    """
+    服务租约
+    多进程部署时用于选举唯一的主节点（如定时任务调度器），持有者需要在过期前续期，过期后其他进程可以接管
+    """
+    name = models.CharField(max_length=100, primary_key=True, verbose_name='租约名称')
+    owner = models.CharField(max_length=100, verbose_name='持有者')
+    expires = models.DateTimeField(verbose_name='过期时间')
+
+    class Meta:
+        verbose_name = '服务租约'
+        db_table = 'api_service_lease'
+
+
 class Report(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255, verbose_name='报告名称')
+    run_id = models.CharField(max_length=32, null=True, blank=True, db_index=True, verbose_name='执行id')
     created = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     report_data = models.JSONField(null=True, verbose_name="测试报告数据")
     # 外键
@@ -300,4 +385,34 @@ class Report(models.Model):
 
     class Meta:
         verbose_name = '用例执行报告'
-        db_table = 'case_report'
\ No newline at end of file
+        db_table = 'case_report'
+
+class ReportSummary(models.Model):
+    """
+    报告摘要
+    报告列表只查询该表，不读取Report中保存完整执行日志的report_data
+    """
+    id = models.AutoField(primary_key=True)
+    report = models.OneToOneField(Report, on_delete=models.CASCADE, related_name='summary', verbose_name='关联报告')
+    name = models.CharField(max_length=255, verbose_name='报告名称')
+    run_id = models.CharField(max_length=32, null=True, blank=True, db_index=True, verbose_name='执行id')
+    trigger = models.IntegerField(choices=list(TRIGGER_LABEL.items()), default=MANUAL_TRIGGER, db_index=True,
+                                  verbose_name='触发方式')
+    case_id = models.IntegerField(null=True, blank=True, db_index=True, verbose_name='执行的用例id')
+    total_cases = models.IntegerField(default=0, verbose_name='用例总数')
+    success_cases = models.IntegerField(default=0, verbose_name='成功用例数')
+    failed_cases = models.IntegerField(default=0, verbose_name='失败用例数')
+    total_steps = models.IntegerField(default=0, verbose_name='步骤总数')
+    success_steps = models.IntegerField(default=0, verbose_name='成功步骤数')
+    success_rate = models.FloatField(default=0, db_index=True, verbose_name='通过率')
+    duration = models.FloatField(default=0, verbose_name='执行耗时(秒)')
+    created = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间')
+    # 外键
+    env = models.ForeignKey(Environment, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='执行环境')
+    creater = models.ForeignKey(ExpendUser, on_delete=models.CASCADE, verbose_name='创建者')
+    project = models.ForeignKey(to=Project, verbose_name="关联项目", on_delete=models.PROTECT)
+
+    class Meta:
+        verbose_name = '用例执行报告摘要'
+        db_table = 'case_report_summary'
+        indexes = [models.Index(fields=['project', '-created'], name='report_summary_proj_created')]
@@ -16,6 +16,7 @@ apiData/serializers.py - API 数据序列化器模块
 from rest_framework import serializers
 from apiData.models import ApiCaseModule, ApiCase, ApiModule, ApiCaseStep, ApiForeachStep, AssertionRule
 from apiData.views.function.viewDef import set_foreach_tree
+from utils.artifactDef import resolve_artifacts
 from utils.comSerializers import ComEditUserNameSerializer
 from utils.constant import API_FOREACH, API
 
@@ -88,6 +89,7 @@ class ApiCaseStepSerializer(serializers.ModelSerializer):
     排除了case、api和quote_case字段，这些关系可能在其他地方处理。
     """
     params = serializers.SerializerMethodField()
+    results = serializers.SerializerMethodField()
     assertions = AssertionRuleSerializer(many=True, read_only=True)
     
     def __init__(self, *args, **kwargs):
@@ -100,6 +102,12 @@ class ApiCaseStepSerializer(serializers.ModelSerializer):
         # print(f"🔄 ApiCaseStepSerializer.to_representation 结束\n")
         return result
 
+    def get_results(self, obj):
+        """
+        步骤执行结果，请求日志中的制品引用替换为原内容
+        """
+        return resolve_artifacts(obj.results)
+
     def get_params(self, obj):
         """
         获取步骤参数，特别处理foreach类型步骤
@@ -161,6 +169,7 @@ class ApiCaseRelationApiStepSerializer(serializers.ModelSerializer):
     """
     is_relation = serializers.SerializerMethodField()
     params = serializers.SerializerMethodField()
+    results = serializers.SerializerMethodField()
 
     def get_is_relation(self, obj):
         """
@@ -188,6 +197,12 @@ class ApiCaseRelationApiStepSerializer(serializers.ModelSerializer):
         
         return False
 
+    def get_results(self, obj):
+        """
+        步骤执行结果，请求日志中的制品引用替换为原内容
+        """
+        return resolve_artifacts(obj.results)
+
     def get_params(self, obj):
         """
         获取步骤参数，为foreach类型的步骤添加API关联信息
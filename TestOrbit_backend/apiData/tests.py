@@ -0,0 +1,332 @@
+import asyncio
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pymysql
+from django.test import TestCase
+
+from apiData.models import ApiCaseModule, ApiCase, ApiCaseStep, ExecutionJob, ServiceLease
+from apiData.views.function.dag_def import build_step_graph
+from apiData.views.function.job_def import claim_job
+from apiData.views.function.lease_def import acquire_lease, release_lease
+from apiData.views.function.plan_def import load_execution_plan
+from apiData.views.function.viewDef import ApiCasesActuator
+from config.models import Environment
+from project.models import Project
+from user.models import ExpendUser
+from utils.comDef import get_proj_envir_db_data
+from utils.constant import MYSQL, SUCCESS, FAILED, API, API_VAR, API_SQL
+from utils.dbPoolDef import DBConnectionPool, send_reset_connection
+from utils.envDef import load_env_snapshot
+from utils.sessionDef import HttpSessionPool, AsyncHttpClient
+
+
+class FakeConnection:
+    """不连接数据库的pymysql连接，记录收到的命令"""
+
+    def __init__(self, support_reset=True):
+        self.open = True
+        self.commands = []
+        self.charset, self.collation = 'utf8', None
+        if support_reset:
+            self._execute_command = lambda command, sql: self.commands.append(command)
+            self._read_ok_packet = lambda: None
+
+    def set_character_set(self, charset, collation=None):
+        self.commands.append('SET NAMES')
+
+    def autocommit(self, value):
+        self.commands.append('autocommit')
+
+    def select_db(self, db):
+        self.commands.append(f'USE {db}')
+
+    def cursor(self):
+        return mock.MagicMock()
+
+    def close(self):
+        self.open = False
+
+
+class EnvDBDataTest(TestCase):
+    """执行环境中的数据库连接参数测试类"""
+
+    def get_db_data(self, variables, db_name='default'):
+        env = Environment.objects.create(name='测试环境', type=1, variables=variables)
+        return get_proj_envir_db_data((None, db_name), snapshot=load_env_snapshot(env.id))
+
+    def test_named_db_variable(self):
+        """测试从与连接同名的对象变量中读取连接参数"""
+        db_data = self.get_db_data({'default': {'value': {
+            'db_host': '10.0.0.1', 'db_user': 'root', 'db_pwd': 'pwd', 'db_database': 'app', 'ssh_host': ''}}})
+        self.assertEqual(db_data, {'db_type': MYSQL, 'db_host': '10.0.0.1', 'db_port': 3306, 'db_user': 'root',
+                                   'db_pwd': 'pwd', 'db_database': 'app'})
+
+    def test_flat_db_variables(self):
+        """测试没有同名变量时从环境的db_host等变量中读取连接参数"""
+        db_data = self.get_db_data({'db_host': {'value': 'db.local'}, 'db_port': {'value': '3307'},
+                                    'ssh_host': {'value': 'jump'}, 'ssh_user': {'value': 'u'}})
+        self.assertEqual(db_data['db_host'], 'db.local')
+        self.assertEqual(db_data['db_port'], '3307')
+        self.assertEqual((db_data['ssh_host'], db_data['ssh_user']), ('jump', 'u'))
+        self.assertNotIn('db_database', db_data)
+
+    def test_missing_db_host(self):
+        """测试未配置db_host时返回None"""
+        self.assertIsNone(self.get_db_data({'url': {'value': 'http://127.0.0.1'}}))
+
+
+class DBConnectionPoolTest(TestCase):
+    """SQL步骤的数据库连接池测试类"""
+
+    db_data = {'db_type': MYSQL, 'db_host': '10.0.0.1', 'db_port': 3306, 'db_user': 'root', 'db_pwd': 'pwd',
+               'db_database': 'app'}
+
+    def test_pymysql_supports_reset(self):
+        """测试当前pymysql版本提供发送重置命令所需的内部方法"""
+        for name in ('_execute_command', '_read_ok_packet'):
+            self.assertTrue(hasattr(pymysql.connections.Connection, name))
+
+    def test_send_reset_without_private_methods(self):
+        """测试pymysql没有内部方法时不发送重置命令"""
+        self.assertFalse(send_reset_connection(FakeConnection(support_reset=False)))
+
+    def test_release_resets_session(self):
+        """测试归还连接时重置会话并切换回配置的库，再次取出时复用该连接"""
+        pool = DBConnectionPool(max_size=1)
+        conn = FakeConnection()
+        with mock.patch('utils.dbPoolDef.create_mysql_connection', return_value=conn) as create:
+            with pool.connect(self.db_data) as res:
+                self.assertEqual(res['status'], SUCCESS)
+            self.assertEqual(conn.commands, [0x1f, 'SET NAMES', 'autocommit', 'USE app'])
+            with pool.connect(self.db_data):
+                pass
+        self.assertEqual(create.call_count, 1)
+        self.assertTrue(conn.open)
+
+    def test_release_discards_unresettable(self):
+        """测试无法重置会话的连接归还时关闭，不再复用"""
+        pool = DBConnectionPool(max_size=1)
+        conn = FakeConnection(support_reset=False)
+        with mock.patch('utils.dbPoolDef.create_mysql_connection', return_value=conn):
+            with pool.connect(self.db_data):
+                pass
+        self.assertFalse(conn.open)
+        self.assertEqual(sum(pool._opened.values()), 0)
+
+
+class QuoteStepTest(TestCase):
+    """引用接口步骤（quote_step_id）的执行计划测试类"""
+
+    def setUp(self):
+        ExpendUser.objects.create(id=1, username='tester')
+        Environment.objects.create(id=1, name='测试环境', type=1)
+        module = ApiCaseModule.objects.create(id='M1', name='模块', project=Project.objects.create(name='项目'))
+        case = ApiCase.objects.create(name='用例', module=module)
+        self.quote_step = ApiCaseStep.objects.create(case=case, type='api', step_name='被引用的接口', params={
+            'host': 'http://127.0.0.1:8000', 'path': '/login', 'method': 'POST', 'timeout': 5})
+        self.steps = [{'id': None, 'type': 'api', 'step_name': f'引用{n}', 'quote_step_id': self.quote_step.id,
+                       'params': {}} for n in range(2)]
+        self.steps.append({'id': None, 'type': 'api', 'step_name': '引用不存在的步骤', 'quote_step_id': self.quote_step.id + 1,
+                           'params': {}})
+
+    def test_plan_loads_quote_steps(self):
+        """测试执行计划一次性加载引用的接口步骤，不存在的步骤为None"""
+        plan = load_execution_plan(self.steps)
+        self.assertEqual(plan.quote_steps[self.quote_step.id]['path'], '/login')
+        self.assertIsNone(plan.quote_steps[self.quote_step.id + 1])
+
+    def test_api_target_from_plan(self):
+        """测试引用的接口步骤从执行计划中读取参数及请求地址，执行时不再查库"""
+        actuator = ApiCasesActuator(1, cfg_data={'envir_id': 1, 'failed_stop': False}, temp_params=[])
+        actuator.plan = load_execution_plan(self.steps)
+        with self.assertNumQueries(0):
+            targets = [actuator.get_api_target(step) for step in self.steps]
+        self.assertEqual(targets[0][1:], ('http://127.0.0.1:8000/login', 'POST', 5))
+        self.assertEqual(targets[0], targets[1])
+        self.assertIsNot(targets[0][0], targets[1][0])
+        self.assertEqual(targets[2]['status'], FAILED)
+
+    def test_api_target_without_plan(self):
+        """测试没有执行计划时引用的接口步骤只查询一次"""
+        actuator = ApiCasesActuator(1, cfg_data={'envir_id': 1, 'failed_stop': False}, temp_params=[])
+        with self.assertNumQueries(1):
+            first, second = (actuator.get_api_target(step) for step in self.steps[:2])
+        self.assertEqual(first[0]['path'], '/login')
+        self.assertEqual(first, second)
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """保持长连接的本地接口，记录建立的连接数"""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpSessionPoolTest(TestCase):
+    """HTTP连接池的连接复用统计测试类"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.server.lock, self.server.connections = threading.Lock(), 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        self.pool = HttpSessionPool({'pool_maxsize': 4})
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_sequential_requests_reuse(self):
+        """测试同一主机的连续请求复用连接"""
+        logs = [self.pool.request(method='GET', url=self.url, timeout=5)[1] for _ in range(3)]
+        self.assertEqual([log['reused'] for log in logs], [False, True, True])
+        self.assertEqual(logs[-1]['run_connections'], 1)
+        self.assertEqual(logs[-1]['run_reuse_rate'], 66.67)
+
+    def test_concurrent_requests_count(self):
+        """测试多线程共用session时，每个请求只统计自己建立的连接"""
+        with ThreadPoolExecutor(4) as executor:
+            logs = list(executor.map(lambda _: self.pool.request(method='GET', url=self.url, timeout=5)[1], range(40)))
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['run_requests'], 40)
+        self.assertEqual(stats['run_connections'], self.server.connections)
+        self.assertEqual(sum(not log['reused'] for log in logs), self.server.connections)
+
+    def async_requests(self, http_pool, number):
+        async def run():
+            client = AsyncHttpClient(http_pool)
+            try:
+                return [(await client.request(method='GET', url=self.url, timeout=5))[1] for _ in range(number)]
+            finally:
+                await client.aclose()
+        return asyncio.run(run())
+
+    def test_async_requests_stats(self):
+        """测试异步模式的请求日志与同步模式统计相同的连接复用信息"""
+        logs = self.async_requests(self.pool, 3)
+        self.assertEqual([log['reused'] for log in logs], [False, True, True])
+        self.assertEqual({key: logs[-1][key] for key in ('client', 'run_requests', 'run_connections', 'run_reused')},
+                         {'client': 'httpx', 'run_requests': 3, 'run_connections': 1, 'run_reused': 2})
+
+    def test_async_retry_status_uses_requests(self):
+        """测试配置了按状态码重试时，异步模式改用requests发送请求"""
+        http_pool = HttpSessionPool({'retries': 2, 'retry_status': [503], 'backoff_factor': 0.1})
+        try:
+            logs = self.async_requests(http_pool, 2)
+        finally:
+            http_pool.close()
+        self.assertEqual([(log['client'], log['reused']) for log in logs], [('requests', False), ('requests', True)])
+
+
+class ClaimJobTest(TestCase):
+    """执行任务队列的认领测试类"""
+
+    def setUp(self):
+        user = ExpendUser.objects.create(id=1, username='tester')
+        self.job = ExecutionJob.objects.create(run_id='job1', params={'case_ids': [1]}, creater=user)
+
+    def test_claim_job_once(self):
+        """测试任务被认领后不会再次被认领"""
+        job = claim_job('worker-a', 60)
+        self.assertEqual((job.id, job.status, job.worker, job.attempts), (self.job.id, 'running', 'worker-a', 1))
+        self.assertIsNone(claim_job('worker-b', 60))
+
+    def test_double_claim(self):
+        """测试两个执行进程查询到同一个排队中的任务时，只有先更新状态的认领成功"""
+        stale_job = ExecutionJob.objects.get(id=self.job.id)
+        claim_job('worker-a', 60)
+        with mock.patch.object(ExecutionJob.objects, 'select_for_update') as select_for_update:
+            select_for_update.return_value.filter.return_value.order_by.return_value.first.return_value = stale_job
+            self.assertIsNone(claim_job('worker-b', 60))
+            select_for_update.assert_called_once_with(skip_locked=True)
+        job = ExecutionJob.objects.get(id=self.job.id)
+        self.assertEqual((job.worker, job.attempts), ('worker-a', 1))
+
+
+class ServiceLeaseTest(TestCase):
+    """基于数据库的服务租约测试类"""
+
+    def test_lease_held_by_one_owner(self):
+        """测试租约未过期时只有持有者能获取及续期"""
+        self.assertTrue(acquire_lease('scheduler', 'owner-a', 60))
+        self.assertFalse(acquire_lease('scheduler', 'owner-b', 60))
+        self.assertTrue(acquire_lease('scheduler', 'owner-a', 60))
+        self.assertEqual(ServiceLease.objects.get(name='scheduler').owner, 'owner-a')
+
+    def test_takeover_after_expiry(self):
+        """测试租约过期后被其他进程接管，原持有者不能再续期"""
+        acquire_lease('scheduler', 'owner-a', 60)
+        ServiceLease.objects.filter(name='scheduler').update(
+            expires=datetime.datetime.now() - datetime.timedelta(seconds=1))
+        self.assertTrue(acquire_lease('scheduler', 'owner-b', 60))
+        self.assertFalse(acquire_lease('scheduler', 'owner-a', 60))
+        self.assertEqual(ServiceLease.objects.get(name='scheduler').owner, 'owner-b')
+
+    def test_release_lease(self):
+        """测试释放租约后其他进程可以立即获取，非持有者不能释放"""
+        acquire_lease('scheduler', 'owner-a', 60)
+        release_lease('scheduler', 'owner-b')
+        self.assertFalse(acquire_lease('scheduler', 'owner-b', 60))
+        release_lease('scheduler', 'owner-a')
+        self.assertTrue(acquire_lease('scheduler', 'owner-b', 60))
+
+
+class StepGraphTest(TestCase):
+    """用例步骤依赖图测试类"""
+
+    @staticmethod
+    def api_step(body=None, output=None, **kwargs):
+        params = {'headers': {'Content-Type': 'application/json'}, 'body': body or {}}
+        if output:
+            params['output_source'] = [{'name': name, 'value': f'data.{name}'} for name in output]
+        return {'type': API, 'params': params, **kwargs}
+
+    def get_deps(self, steps):
+        return [node['deps'] for node in build_step_graph(steps)]
+
+    def test_read_write_deps(self):
+        """测试读取变量的步骤依赖最近的写入步骤，写入变量的步骤依赖之前的写入及读取步骤"""
+        steps = [
+            self.api_step(output=['token']),
+            self.api_step(body={'token': '${token}'}),
+            self.api_step(body={'auth': 'Bearer ${token}', 'i': '${i}'}),
+            {'type': API_VAR, 'params': {'var_list': [{'name': 'token', 'value': 'new'}]}},
+            self.api_step(body={'token': '${token}'}),
+            {'type': API_SQL, 'params': {'sql': 'select 1', 'sql_var': 'row'}},
+        ]
+        self.assertEqual(self.get_deps(steps), [set(), {0}, {0}, {0, 1, 2}, {3}, set()])
+
+    def test_barrier_deps(self):
+        """测试屏障步骤等待之前的所有步骤，之后的步骤都依赖屏障"""
+        steps = [
+            self.api_step(output=['token']),
+            self.api_step(body={'id': '${user_id}'}),
+            self.api_step(controller_data={'barrier': True}),
+            self.api_step(body={'token': '${token}'}),
+            self.api_step(),
+        ]
+        nodes = build_step_graph(steps)
+        self.assertTrue(nodes[2]['effect'].barrier)
+        self.assertEqual([node['deps'] for node in nodes], [set(), set(), {0, 1}, {2}, {2}])
+
+    def test_disabled_step_ignored(self):
+        """测试禁用的步骤不参与依赖分析"""
+        steps = [self.api_step(output=['token'], enabled=False), self.api_step(body={'token': '${token}'})]
+        self.assertEqual(self.get_deps(steps), [set(), set()])
@@ -19,6 +19,14 @@ urlpatterns = [
     path('case-view', caseGroup.ApiCaseViews.as_view()),
     # 批量运行选中的用例组（支持并行或串行）
     path('batch-run-api-cases', caseGroup.batch_run_api_cases),
+    # 提交批量执行任务，立即返回run_id，由执行进程执行
+    path('batch-run-api-cases/submit', caseGroup.submit_batch_run),
+    # 查询批量执行任务的状态及结果
+    path('execution-jobs', caseGroup.execution_job),
+    # 取消排队中的批量执行任务
+    path('execution-jobs/cancel', caseGroup.cancel_execution_job),
+    # 查看用例步骤的依赖图及关键路径
+    path('case-step-dag', caseGroup.case_step_dag),
     # 复制用例组
     path('copy-cases', caseGroup.copy_cases),
     # 标记选中用例组为删除状态
@@ -51,8 +59,14 @@ urlpatterns = [
     path('steps/delete', case_steps.delete_step),  
 
     # 测试报告管理——————————————待调整
-    # 获取报告列表和查看报告详情
+    # 获取报告列表和查看报告摘要
     path('reports', case_report.ReportViews.as_view()),
+    # 分页查看报告中的用例结果
+    path('reports/cases', case_report.report_cases),
+    # 分页查看报告中某个用例的步骤结果
+    path('reports/steps', case_report.report_steps),
+    # 流式读取步骤结果、报告中引用的请求/响应内容
+    path('reports/artifact', case_report.artifact_content),
     # 通过id删除报告
     path('reports/delete', case_report.delete_report),
     # 批量删除报告
@@ -8,6 +8,7 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from apiData.models import ApiCaseModule, ApiCase, ApiModule, ApiCaseStep, ApiForeachStep
 from apiData.serializers import ApiCaseListSerializer, ApiCaseSerializer, ApiCaseDetailSerializer
+from utils.cancelDef import get_cancel_registry
 from utils.comDef import get_module_related, get_case_sort_list
 from utils.constant import DEFAULT_MODULE_NAME, USER_API, API, FAILED, API_CASE, API_FOREACH, SUCCESS, RUNNING, WAITING, INTERRUPT
 from utils.views import View
@@ -18,6 +19,8 @@ from .function.viewDef import parse_create_foreach_steps
 from .function.steps_def import save_step
 from .function.group_def import copy_cases_func
 from .function.group_batch import handleGroupbatch, BatchExecutionException
+from .function.job_def import submit_job, cancel_job, get_job_data
+from .function.dag_def import get_case_dag
 
 
 
@@ -269,13 +272,60 @@ def batch_run_api_cases(request):
 
 
 
+@api_view(['POST'])
+def submit_batch_run(request):
+    """
+    提交批量执行任务，立即返回run_id，由执行进程(python manage.py run_worker)执行
+    参数与batch_run_api_cases一致，通过execution_job接口查询执行状态及结果
+    """
+    try:
+        run_id = submit_job(request.data, request.user.id)
+    except BatchExecutionException as e:
+        return Response(data={'message': e.message}, status=e.status_code)
+    return Response({'message': '已提交执行！', 'run_id': run_id})
+
+
+@api_view(['GET'])
+def execution_job(request):
+    """
+    查询批量执行任务的状态及结果
+    """
+    job_data = get_job_data(request.query_params.get('run_id'), request.user.id)
+    if not job_data:
+        return Response(data={'message': '任务不存在'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job_data)
+
+
+@api_view(['POST'])
+def cancel_execution_job(request):
+    """
+    取消排队中或执行中的批量执行任务，执行中的任务会中断正在执行的用例
+    """
+    if not cancel_job(request.data.get('run_id'), request.user.id):
+        return Response(data={'message': '任务不存在或已结束'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'message': '已取消！'})
+
+
+@api_view(['GET'])
+def case_step_dag(request):
+    """
+    查看用例步骤的依赖图及关键路径
+    """
+    case_id = request.query_params.get('case_id')
+    if not case_id or not str(case_id).isdigit() or not ApiCase.objects.filter(id=case_id).exists():
+        return Response(data={'message': '用例不存在'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(get_case_dag(int(case_id)))
+
+
 @api_view(['POST'])
 def stop_casing(request):
     """
     中断测试
     """
     UserCfg.objects.filter(user_id=request.user.id).update(exec_status=INTERRUPT)
-    return Response({'message': '中断成功，请等待几秒后刷新列表查看！'})
+    # 通知执行中的用例立即中断，当前步骤执行完成后即停止
+    get_cancel_registry().cancel(user_id=request.user.id)
+    return Response({'message': '中断成功，请刷新列表查看！'})
 
 
 @api_view(['POST'])
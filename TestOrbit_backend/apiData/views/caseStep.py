@@ -8,7 +8,6 @@ from rest_framework.response import Response
 from apiData.models import ApiCase,  ApiCaseStep, ApiForeachStep
 from apiData.serializers import ApiCaseListSerializer, ApiDataListSerializer
 from apiData.views.function.viewDef import  ApiCasesActuator
-from utils.comDef import MyThread
 from utils.constant import DEFAULT_MODULE_NAME, USER_API, API, FAILED, API_CASE, API_FOREACH, SUCCESS, RUNNING,  WAITING
 from utils.diyException import CaseCascaderLevelError
 from utils.paramsDef import set_user_temp_params
@@ -21,6 +20,7 @@ import json
 # 功能函数切分保存位置,变更到其他位置
 from .function.steps_def import save_step,go_step
 from .function.monitor_def import monitor_interrupt
+from .function.plan_def import load_execution_plan
 
 
 """
@@ -156,11 +156,15 @@ def run_api_case_step(request):
     try:
         UserCfg.objects.filter(user_id=user_id).update(exec_status=RUNNING)
         if s_type in (API_CASE, API_FOREACH):
-            thread = MyThread(target=monitor_interrupt, args=[user_id, actuator_obj])
-            thread.start()
-        res = go_step(actuator_obj, req_data, i=0)
+            actuator_obj.plan = load_execution_plan([req_data])
+            with monitor_interrupt(user_id, actuator_obj):
+                res = go_step(actuator_obj, req_data, i=0)
+        else:
+            res = go_step(actuator_obj, req_data, i=0)
     except CaseCascaderLevelError as e:
         return Response(data={'status': FAILED, 'msg': str(e)})
+    finally:
+        actuator_obj.close()
     res_msg = ''
     if res['status'] != SUCCESS:
         if s_type in (API_CASE, API_FOREACH):
@@ -226,7 +230,10 @@ def test_api_data(request):
         return Response({'code': 400, 'message': '请先保存当前步骤！'})
 
     # 调用go_step函数执行步骤
-    res = go_step(actuator_obj, step_id, i=0)
+    try:
+        res = go_step(actuator_obj, step_id, i=0)
+    finally:
+        actuator_obj.close()
 
         # 打印结果
     print("\n✅ 执行完成")
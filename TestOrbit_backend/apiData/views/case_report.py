@@ -1,17 +1,20 @@
 """
 测试报告管理相关接口
-包括：获取报告列表，查看报告详情，通过id删除报告
+包括：获取报告列表，查看报告摘要，分页查看报告中的用例及步骤结果，通过id删除报告
 """
 
-import datetime
+import itertools
+
+from django.http import StreamingHttpResponse
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django.db.models import Q
 
-from apiData.models import ApiCase, Report
-from project.models import Project
+from apiData.models import Report, ReportSummary
+from utils.artifactDef import get_artifact_store, resolve_artifacts, DIGEST_PATTERN
+from utils.constant import TRIGGER_LABEL
 from utils.views import View
 
 # 定义报告分页器
@@ -21,46 +24,150 @@ class ReportPagination(PageNumberPagination):
     max_page_size = 100
 
 
+# 报告列表返回的摘要字段，只查询ReportSummary，不读取report_data
+SUMMARY_LIST_FIELDS = (
+    'id', 'report_id', 'name', 'run_id', 'trigger', 'total_cases', 'success_cases', 'failed_cases', 'total_steps',
+    'success_steps', 'success_rate', 'duration', 'created', 'project_id', 'project__name', 'env_id', 'env__name',
+    'creater_id', 'creater__username')
+
+
+def get_summary_list_data(summary):
+    """
+    报告摘要转换为列表数据，id为报告id
+    """
+    return {
+        'id': summary['report_id'],
+        'name': summary['name'],
+        'run_id': summary['run_id'],
+        'trigger': summary['trigger'],
+        'trigger_name': TRIGGER_LABEL.get(summary['trigger']),
+        'total_cases': summary['total_cases'],
+        'success_cases': summary['success_cases'],
+        'failed_cases': summary['failed_cases'],
+        'total_steps': summary['total_steps'],
+        'success_steps': summary['success_steps'],
+        'success_rate': summary['success_rate'],
+        'success_rate_str': f"{summary['success_rate']}%",
+        'duration': summary['duration'],
+        'created': summary['created'],
+        'project_id': summary['project_id'],
+        'project_name': summary['project__name'] or "未关联项目",
+        'env_id': summary['env_id'],
+        'env_name': summary['env__name'],
+        'creater_id': summary['creater_id'],
+        'creater_name': summary['creater__username'] or "未知用户",
+    }
+
+
+def get_report_cases(report_id):
+    """
+    读取一份报告中的用例结果，报告不存在时返回None
+    """
+    report_data = Report.objects.filter(id=report_id).values_list('report_data', flat=True).first()
+    if report_data is None:
+        return None
+    return report_data.get('cases') or []
+
+
 # 报告管理视图类
 class ReportViews(View):
     """
     测试报告管理视图类
-    提供报告的查询和过滤功能
+    报告列表只查询报告摘要表，用例、步骤详情通过report_cases、report_steps按需分页获取
     """
-    queryset = Report.objects.select_related('project', 'creater').order_by('-created')
+    queryset = ReportSummary.objects.order_by('-created')
     pagination_class = ReportPagination
-    filterset_fields = ('project',)
-    ordering_fields = ('created', 'name')
+    filterset_fields = ('project', 'trigger', 'env')
+    ordering_fields = ('created', 'name', 'success_rate', 'duration')
     diy_search_fields = ('name',)
-    
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).values(*SUMMARY_LIST_FIELDS)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response([get_summary_list_data(summary) for summary in page])
+
     def get(self, request, *args, **kwargs):
         """
-        获取报告列表或详情
+        获取报告列表或详情(摘要)
         """
-        # 如果指定了report_id，则返回详情
+        # 如果指定了report_id，则返回该报告的摘要
         report_id = request.query_params.get('report_id')
         if report_id:
-            try:
-                # 获取报告详情
-                report = Report.objects.get(id=report_id)
-                data = {
-                    "id": report.id,
-                    "name": report.name,
-                    "project_id": report.project_id,
-                    "project_name": report.project.name if report.project else "未关联项目",
-                    "report_data": report.report_data,
-                    "created": report.created,
-                    "creater_id": report.creater_id,
-                    "creater_name": report.creater.username if report.creater else "未知用户",
-                }
-                return Response(data)
-            except Report.DoesNotExist:
+            summary = ReportSummary.objects.filter(report_id=report_id).values(*SUMMARY_LIST_FIELDS).first()
+            if not summary:
                 return Response({"message": "报告不存在"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(get_summary_list_data(summary))
         else:
             # 返回列表
             return self.list(request, *args, **kwargs)
 
 
+@api_view(['GET'])
+def report_cases(request):
+    """
+    分页获取一份报告中的用例结果，只返回用例的统计信息，不包含步骤详情
+    """
+    report_id = request.query_params.get('report_id')
+    if not report_id:
+        return Response({"message": "缺少report_id参数"}, status=status.HTTP_400_BAD_REQUEST)
+    cases = get_report_cases(report_id)
+    if cases is None:
+        return Response({"message": "报告不存在"}, status=status.HTTP_404_NOT_FOUND)
+
+    paginator = ReportPagination()
+    page = paginator.paginate_queryset(cases, request)
+    start_index = paginator.page.start_index() - 1
+    # index为用例在报告中的序号，用于获取没有id的用例的步骤
+    result = [{**{key: value for key, value in case.items() if key != 'steps'}, 'index': start_index + i}
+              for i, case in enumerate(page)]
+    return paginator.get_paginated_response(result)
+
+
+@api_view(['GET'])
+def report_steps(request):
+    """
+    分页获取一份报告中某个用例的步骤结果
+    通过case_id或用例在报告中的序号case_index(从0开始)指定用例，请求日志中的制品引用默认替换为原内容，
+    resolve=0时保留引用，内容通过artifact_content按需读取
+    """
+    report_id = request.query_params.get('report_id')
+    case_id, case_index = request.query_params.get('case_id'), request.query_params.get('case_index')
+    if not report_id or (case_id is None and case_index is None):
+        return Response({"message": "缺少report_id或case_id参数"}, status=status.HTTP_400_BAD_REQUEST)
+    cases = get_report_cases(report_id)
+    if cases is None:
+        return Response({"message": "报告不存在"}, status=status.HTTP_404_NOT_FOUND)
+
+    if case_id is not None:
+        case = next((case for case in cases if str(case.get('id')) == case_id), None)
+    else:
+        case = cases[int(case_index)] if case_index.isdigit() and int(case_index) < len(cases) else None
+    if case is None:
+        return Response({"message": "报告中不存在该用例"}, status=status.HTTP_404_NOT_FOUND)
+
+    paginator = ReportPagination()
+    page = paginator.paginate_queryset(case.get('steps') or [], request)
+    if request.query_params.get('resolve') != '0':
+        page = resolve_artifacts(page)
+    return paginator.get_paginated_response(page)
+
+
+@api_view(['GET'])
+def artifact_content(request):
+    """
+    流式读取步骤结果、报告中引用的请求/响应内容
+    """
+    digest = request.query_params.get('digest', '')
+    if not (artifact_store := get_artifact_store()) or not DIGEST_PATTERN.match(digest):
+        return Response({"message": "无效的制品"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        chunks = artifact_store.iter_chunks(digest)
+        first_chunk = next(chunks, b'')
+    except FileNotFoundError:
+        return Response({"message": "制品不存在或已被清理"}, status=status.HTTP_404_NOT_FOUND)
+    return StreamingHttpResponse(itertools.chain((first_chunk,), chunks), content_type='text/plain; charset=utf-8')
+
+
 @api_view(['DELETE'])
 def delete_report(request):
     """
@@ -106,9 +213,7 @@ def search_reports(request):
     query = Q()
     
     if project_name:
-        # 通过project表关联查询
-        project_ids = Project.objects.filter(name__icontains=project_name).values_list('id', flat=True)
-        query &= Q(project_id__in=project_ids)
+        query &= Q(project__name__icontains=project_name)
     
     if report_name:
         query &= Q(name__icontains=report_name)
@@ -119,25 +224,14 @@ def search_reports(request):
     if end_time:
         query &= Q(created__lte=end_time)
     
-    # 执行查询
-    reports = Report.objects.filter(query).select_related('project', 'creater').order_by('-created')
+    # 执行查询，只查询报告摘要
+    summaries = ReportSummary.objects.filter(query).order_by('-created').values(*SUMMARY_LIST_FIELDS)
     
     # 使用分页
     paginator = ReportPagination()
-    paginated_reports = paginator.paginate_queryset(reports, request)
+    paginated_summaries = paginator.paginate_queryset(summaries, request)
     
     # 构建响应数据
-    result = []
-    for report in paginated_reports:
-        result.append({
-            "id": report.id,
-            "name": report.name,
-            "project_id": report.project_id,
-            "project_name": report.project.name if report.project else "未关联项目",
-            "report_data": report.report_data,
-            "created": report.created,
-            "creater_id": report.creater_id,
-            "creater_name": report.creater.username if report.creater else "未知用户",
-        })
+    result = [get_summary_list_data(summary) for summary in paginated_summaries]
     
     return paginator.get_paginated_response(result)
@@ -0,0 +1,248 @@
+"""
+异步执行引擎
+批量执行时以asyncio协程并发运行用例：接口请求通过异步HTTP客户端发送，数据库读写通过sync_to_async执行，
+单个进程即可同时驱动大量用例，而不需要为每个用例创建一个线程。
+步骤的执行逻辑、结果及报告与 run_api_case_func 保持一致，便于两种模式直接对比。
+"""
+import asyncio
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from utils.constant import SUCCESS, FAILED, DISABLED, INTERRUPT, SKIP, API_CASE, API_FOREACH, FAILED_STOP, WAITING, \
+    BATCH_TRIGGER
+from utils.sessionDef import AsyncHttpClient
+from .viewDef import ApiCasesActuator, copy_foreach_steps
+from .steps_def import get_step_data, check_step_condition, get_method_result, save_step_result
+from .group_def import start_case_run, finish_case_run
+from .monitor_def import monitor_interrupt_batch
+from .foreach_def import get_foreach_parallel_cfg, run_foreach_parallel_async
+
+DEFAULT_CONCURRENCY = 100  # 未配置ASYNC_RUN_CONCURRENCY时，同时执行的用例数上限
+
+
+class AsyncApiCasesActuator(ApiCasesActuator):
+    """
+    异步接口用例执行器
+    接口、引用用例、循环控制器步骤以协程执行，其余步骤沿用同步执行器的方法
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.async_client = AsyncHttpClient(self.http_pool)
+
+    async def aclose(self):
+        """
+        关闭异步HTTP客户端，需要在事件循环中调用
+        """
+        await self.async_client.aclose()
+
+    async def api(self, step, prefix_label, i=0):
+        """
+        执行类型为接口的步骤，请求的封装与响应的解析与同步执行器一致
+        """
+        upload_files_list = []
+        target = await sync_to_async(self.get_api_target)(step)
+        if isinstance(target, dict):
+            return target
+        params, url, method, timeout = target
+        req_log = {'url': url, 'method': method, 'response': '无响应结果', 'res_header': '无响应头'}
+        res_status, results = WAITING, ''  # 初始化为等待状态
+        try:
+            req_params = await sync_to_async(self.build_api_request)(
+                params, url, method, timeout, i, req_log, upload_files_list)
+            try:
+                r, req_log['connection'] = await self.async_client.request(**req_params)
+            except KeyError as e:
+                req_log['results'] = results = self.api_process + '未找到key：' + str(e)
+                res_status = FAILED
+            except Exception as e:
+                if not (send_error := self.get_send_error(e) or self.async_client.get_send_error(e)):
+                    raise
+                log_key, results = send_error
+                req_log[log_key] = results
+                res_status = FAILED
+            else:
+                res_status, results = await sync_to_async(self.parse_api_response)(
+                    step, params, prefix_label, i, r, req_log)
+        except Exception as e:
+            print(f"❌ API执行出错: {str(e)}")
+            req_log['results'] = results = self.api_process + str(e)
+            res_status = FAILED
+
+        # 清理临时文件
+        self.clear_upload_files(upload_files_list)
+        return {'status': res_status, 'data': {'message': results, 'request_log': req_log}}
+
+    async def case(self, step, prefix_label='', cascader_level=1, i=0):
+        """
+        执行类型为用例
+        """
+        if cascader_level > 10:  # 引用计划嵌套超过10层判断为死循环
+            self.cascader_error = True
+            return {'status': FAILED}
+        params = step.get('params')
+        step_data = await sync_to_async(self.get_quote_case_steps)(params['case_related'][-1])
+        prefix_label += step['step_name'] + '-'
+        res_status, step_data = await run_step_groups_async(self, step_data, prefix_label, cascader_level, i)
+        return self.get_case_result(cascader_level, res_status, step_data)
+
+    async def foreach(self, step, prefix_label='', cascader_level=1, i=0):
+        """
+        循环控制器
+        """
+        if cascader_level > 15:  # 嵌套超过15层则判断为死循环
+            self.cascader_error = True
+            return {'status': FAILED}
+        loop_range, break_code, steps = await sync_to_async(self.get_foreach_data)(step)
+        prefix_label += step['step_name'] + '-'
+        res_status, res_data = SUCCESS, []
+        if parallel_cfg := get_foreach_parallel_cfg(step):  # 开启并行执行时各次循环以协程同时执行
+            res_status, res_data = await run_foreach_parallel_async(
+                self, loop_range, break_code, steps, prefix_label, cascader_level, i, *parallel_cfg)
+            return self.get_foreach_result(cascader_level, res_status, res_data)
+        for _ in loop_range:
+            # 满足break条件的话则中止循环
+            if self.foreach_need_break(break_code, i):
+                break
+            run_status, step_data = await run_step_groups_async(
+                self, copy_foreach_steps(steps), prefix_label, cascader_level=cascader_level, i=i)
+            i += 1
+            res_data.append(step_data)
+            if run_status == FAILED:
+                res_status = FAILED
+        return self.get_foreach_result(cascader_level, res_status, res_data)
+
+
+async def run_step_method(actuator_obj, s_type, params):
+    """
+    执行步骤类型对应的方法，协程方法直接await，同步方法放到sync_to_async中执行
+    """
+    method = getattr(actuator_obj, s_type)
+    if inspect.iscoroutinefunction(method):
+        return await method(**params)
+    return await sync_to_async(method)(**params)
+
+
+async def go_step_async(actuator_obj, step, i=0, prefix_label='', **extra_params):
+    """
+    go_step的异步版本，执行条件、重试、结果保存的逻辑与go_step一致
+    """
+    if not step:
+        return {'status': FAILED, 'data': '步骤ID不存在'}
+
+    step = get_step_data(step) if isinstance(step, dict) else await sync_to_async(get_step_data)(step)
+    step_id, s_type = step['step_id'], step['type']
+
+    # 检查是否需要中断执行
+    if actuator_obj.status in (INTERRUPT, FAILED_STOP):
+        return {'status': SKIP, 'data': '执行被中断！' if s_type not in (API_CASE, API_FOREACH) else None}
+
+    params = {'step': step, 'i': i, 'prefix_label': prefix_label, **extra_params}
+    controller_data = step.get('controller_data') or {}
+    retry_times = controller_data.get('re_times', 0) if s_type not in (API_CASE, API_FOREACH) else 0
+    retry_interval = controller_data.get('re_interval', 0)
+    execute_on = controller_data.get('execute_on', '')
+    sleep_time = controller_data.get('sleep')
+    res = {'status': SUCCESS, 'data': ''}
+
+    # 检查是否有执行条件
+    if execute_on and (condition_res := check_step_condition(actuator_obj, execute_on, i)):
+        return condition_res
+
+    # 执行前等待，等待期间不占用事件循环
+    if sleep_time:
+        await asyncio.sleep(sleep_time)
+
+    for j in range(retry_times + 1):
+        try:
+            res = get_method_result(s_type, await run_step_method(actuator_obj, s_type, params))
+        except Exception as e:
+            print(f"❌ 执行出错: {str(e)}")
+            res = {'status': FAILED, 'data': str(e)}
+        if res['status'] == FAILED:
+            if j < retry_times:
+                await asyncio.sleep(retry_interval)
+        else:
+            break
+
+    return await sync_to_async(save_step_result)(actuator_obj, step_id, s_type, res, j)
+
+
+async def run_step_groups_async(actuator_obj, step_data, prefix_label='', cascader_level=0, i=0):
+    """
+    run_step_groups的异步版本，同一用例内的步骤依然按顺序执行
+    """
+    run_status = SUCCESS
+    for step in step_data:
+        step['step_id'] = step.get('id')
+        s_type = step['type']
+        if step.get('enabled'):
+            params = {'actuator_obj': actuator_obj, 'step': step, 'prefix_label': prefix_label, 'i': i}
+            if s_type in (API_CASE, API_FOREACH):
+                params['cascader_level'] = cascader_level + 1
+            res = await go_step_async(**params)
+            step['status'] = res.get('status', WAITING)
+            if 'data' in res:
+                step['data'] = res['data']
+            if 'results' in res:
+                step['results'] = res['results']
+            print(f"步骤 {step['step_name']} 执行完成，状态: {step['status']}")
+        else:
+            step['status'] = DISABLED
+        if cascader_level == 0 and actuator_obj.report:  # 顶层步骤执行完成后汇总到报告
+            actuator_obj.report.add_step(step.get('case_id'), step)
+        if run_status != FAILED and step.get('status') == FAILED:
+            run_status = FAILED
+    return run_status, step_data
+
+
+async def run_api_case_async(case_data, user_id, cfg_data, semaphore, batch_state):
+    """
+    run_api_case_func的异步版本，通过信号量控制同时执行的用例数
+    """
+    async with semaphore:
+        actuator_obj = await sync_to_async(AsyncApiCasesActuator)(user_id, cfg_data=cfg_data)
+        if batch_state['interrupted']:
+            actuator_obj.status = INTERRUPT
+        batch_state['actuators'].add(actuator_obj)
+        try:
+            case_status, step_data = None, None
+            if (case_id := await sync_to_async(start_case_run)(actuator_obj, case_data)) is not None:
+                case_status, step_data = await run_step_groups_async(actuator_obj, case_data)
+            return await sync_to_async(finish_case_run)(actuator_obj, user_id, case_id, case_status, step_data)
+        finally:
+            batch_state['actuators'].discard(actuator_obj)
+            await actuator_obj.aclose()
+
+
+async def run_cases_async(cases_to_run, user_id, concurrency=None, trigger=BATCH_TRIGGER, job_id=None):
+    """
+    以协程并发执行多个用例
+    cases_to_run：{case_id: {'case_data': 步骤列表, 'env_id': 环境id, 'case_name': 用例名称}}
+    返回与handleGroupbatch并行/串行模式相同格式的结果列表
+    """
+    concurrency = int(concurrency or getattr(settings, 'ASYNC_RUN_CONCURRENCY', DEFAULT_CONCURRENCY))
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    batch_state = {'actuators': set(), 'interrupted': False}
+    print(f'采用异步模式执行测试用例，并发数：{concurrency}')
+
+    case_list = list(cases_to_run.items())
+    with monitor_interrupt_batch(user_id, batch_state, job_id):
+        outcomes = await asyncio.gather(*(
+            run_api_case_async(case_info['case_data'], user_id,
+                               {'envir_id': case_info['env_id'], 'failed_stop': False, 'trigger': trigger,
+                                'job_id': job_id},
+                               semaphore, batch_state)
+            for case_id, case_info in case_list), return_exceptions=True)
+
+    results = []
+    for (case_id, case_info), outcome in zip(case_list, outcomes):
+        item = {'case_id': case_id, 'case_name': case_info['case_name'], 'env_id': case_info['env_id']}
+        if isinstance(outcome, Exception):
+            item.update({'status': 'failed', 'error': str(outcome)})
+        else:
+            item.update({'status': 'success', 'result': outcome})
+        results.append(item)
+    return results
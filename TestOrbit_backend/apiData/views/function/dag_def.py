@@ -0,0 +1,333 @@
+"""
+用例步骤的依赖分析及并发执行
+根据步骤参数中的${变量}引用、代码中的var['变量']读取，以及步骤产生的变量（接口的输出参数、SQL的sql_var、全局变量步骤）推导步骤间的依赖：
+读取变量的步骤依赖最近一次写入该变量的步骤，写入变量的步骤依赖之前写入及读取该变量的步骤，保证与按步骤顺序执行时读到的变量一致；
+无法确定读写变量的步骤（代码模式的输出参数、引用用例无法加载等）以及controller_data中barrier为True的步骤作为屏障，
+等待之前的所有步骤完成，之后的步骤也都等待它完成。步骤之间通过外部系统（如数据库、服务端会话）产生的依赖无法分析，需要设置屏障。
+用例的step_concurrency大于1时，无依赖的步骤由多个执行线程并发执行，执行后按实际耗时计算关键路径写入报告；
+每个步骤使用执行器的副本执行，错误标签等单个步骤的临时状态互不影响，变量、执行状态等与原执行器共享
+"""
+import copy
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.db import connection
+
+from utils.constant import SUCCESS, FAILED, API, API_SQL, API_VAR, API_CASE, API_FOREACH, TABLE_MODE
+from .plan_def import get_quote_case_id, load_execution_plan
+
+VAR_REF_PATTERN = re.compile(r'\$\{([^${}.\[\]]+)')  # ${name}、${name.key}中的变量名
+DYNAMIC_REF_PATTERN = re.compile(r'\$\{[^}]*\$\{')  # ${${name}}：变量名由其他变量决定
+CODE_VAR_PATTERN = re.compile(r'''\bvar\s*(?:\[\s*(['"])([^'"]+)\1\s*\]|\.get\(\s*(['"])([^'"]+)\3)''')
+CODE_VAR_USE_PATTERN = re.compile(r'\bvar\b')
+LOOP_VAR = 'i'  # 循环序号，不是变量
+HEADER_VAR = '$header'  # 默认请求头，设置了请求头的接口步骤会写入，未设置请求头的接口步骤会读取
+MAX_ANALYZE_DEPTH = 15  # 分析引用用例、循环控制器子步骤的最大层数，超过时作为屏障
+
+
+class StepEffect:
+    """
+    步骤读写的变量
+    reads_any：读取的变量无法确定（如代码中把var整体传递给其他函数）；barrier：作为屏障执行
+    """
+
+    def __init__(self):
+        self.reads, self.writes = set(), set()
+        self.reads_any = self.barrier = False
+
+    def update(self, other):
+        self.reads |= other.reads
+        self.writes |= other.writes
+        self.reads_any |= other.reads_any
+        self.barrier |= other.barrier
+
+
+def scan_var_refs(value, effect):
+    """
+    收集参数中引用的变量
+    """
+    if isinstance(value, dict):
+        for key, v in value.items():
+            scan_var_refs(key, effect)
+            scan_var_refs(v, effect)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            scan_var_refs(v, effect)
+    elif isinstance(value, str):
+        if '${' in value:
+            if DYNAMIC_REF_PATTERN.search(value):
+                effect.reads_any = True
+            effect.reads.update(name.strip() for name in VAR_REF_PATTERN.findall(value))
+        if 'var' in value and (uses := len(CODE_VAR_USE_PATTERN.findall(value))):
+            names = [m[1] or m[3] for m in CODE_VAR_PATTERN.findall(value)]
+            effect.reads.update(names)
+            if uses > len(names):  # 除var['name']、var.get('name')以外的用法，无法确定读取的变量
+                effect.reads_any = True
+
+
+def get_output_names(params, effect):
+    """
+    接口步骤的输出参数，代码模式的输出无法确定写入的变量，作为屏障
+    """
+    if not (output := params.get('output_source')):
+        return
+    if params.get('output_mode', TABLE_MODE) != TABLE_MODE or not isinstance(output, list):
+        effect.barrier = True
+        return
+    for out in output:
+        name = str(out.get('name') or '').strip('?')
+        if '${' in name:
+            effect.barrier = True
+        elif name:
+            effect.writes.add(name)
+
+
+def get_var_step_names(params, effect):
+    """
+    全局变量步骤写入的变量：表格模式为各行的name，json模式为字典的key，代码模式无法确定，作为屏障
+    """
+    for value in params.values():
+        if isinstance(value, list):
+            effect.writes.update(str(v['name']) for v in value if isinstance(v, dict) and v.get('name'))
+        elif isinstance(value, dict):
+            effect.writes.update(str(key) for key in value)
+        elif isinstance(value, str) and 'return' in value:
+            effect.barrier = True
+
+
+def analyze_step(step, plan=None, depth=0):
+    """
+    分析步骤读写的变量，引用用例、循环控制器合并所有子步骤的读写
+    """
+    effect = StepEffect()
+    if not step.get('enabled', True):
+        return effect
+    params, s_type = step.get('params') or {}, step.get('type')
+    controller_data = step.get('controller_data') or {}
+    if controller_data.get('barrier') or depth > MAX_ANALYZE_DEPTH:
+        effect.barrier = True
+        return effect
+    scan_var_refs(params, effect)
+    scan_var_refs(controller_data.get('execute_on'), effect)
+    if plan and step.get('id'):
+        for rule in plan.get_assertions(step['id']):
+            scan_var_refs([rule.expression, rule.expected_value], effect)
+
+    if s_type == API:
+        get_output_names(params, effect)
+        if params.get('header_source'):
+            effect.writes.add(HEADER_VAR)
+        elif not params.get('headers'):
+            effect.reads.add(HEADER_VAR)
+    elif s_type == API_SQL:
+        if sql_var := params.get('sql_var'):
+            effect.writes.add(sql_var)
+    elif s_type == API_VAR:
+        get_var_step_names(params, effect)
+    elif s_type in (API_CASE, API_FOREACH):
+        children = get_child_steps(step, plan)
+        if children is None:
+            effect.barrier = True
+        for child in children or []:
+            effect.update(analyze_step(child, plan, depth + 1))
+    else:  # 全局请求头、请求地址、自定义函数等步骤会修改执行器的状态
+        effect.barrier = True
+    effect.reads.discard(LOOP_VAR)
+    return effect
+
+
+def get_child_steps(step, plan):
+    """
+    获取引用用例、循环控制器的子步骤，无法获取时返回None
+    """
+    if step.get('type') == API_FOREACH:
+        if 'steps' in (step.get('params') or {}):
+            return step['params']['steps']
+        return plan.get_foreach_steps(step.get('id')) if plan else None
+    quote_case_id = get_quote_case_id(step)
+    return plan.get_case_steps(quote_case_id) if plan and quote_case_id else None
+
+
+def build_step_graph(step_data, plan=None):
+    """
+    生成步骤依赖图，返回 [{'index': 序号, 'deps': 依赖的步骤序号集合, 'effect': StepEffect}, ...]
+    """
+    nodes = []
+    last_writer, readers = {}, defaultdict(set)  # 上个屏障之后各变量最近一次的写入步骤、最近一次写入之后的读取步骤
+    writers, any_readers, since_barrier = set(), set(), set()
+    last_barrier = None
+    for index, step in enumerate(step_data):
+        effect = analyze_step(step, plan)
+        deps = set()
+        if step.get('enabled', True):
+            if effect.barrier:
+                deps = since_barrier | ({last_barrier} if last_barrier is not None else set())
+                for tracked in (last_writer, readers, writers, any_readers, since_barrier):
+                    tracked.clear()
+                last_barrier = index
+            else:
+                if last_barrier is not None:
+                    deps.add(last_barrier)
+                deps.update(last_writer[name] for name in effect.reads if name in last_writer)
+                if effect.reads_any:
+                    deps |= writers
+                for name in effect.writes:
+                    if name in last_writer:
+                        deps.add(last_writer[name])
+                    deps |= readers[name]
+                if effect.writes:
+                    deps |= any_readers
+                for name in effect.reads:
+                    readers[name].add(index)
+                if effect.reads_any:
+                    any_readers.add(index)
+                for name in effect.writes:
+                    last_writer[name] = index
+                    readers[name] = set()
+                if effect.writes:
+                    writers.add(index)
+                since_barrier.add(index)
+        deps.discard(index)
+        nodes.append({'index': index, 'deps': deps, 'effect': effect})
+    return nodes
+
+
+def get_critical_path(step_data, nodes, durations=None, timing=None):
+    """
+    计算关键路径（耗时最长的依赖链），返回可视化的依赖图数据
+    durations：{序号: 耗时(秒)}，未传递时每个步骤按1计算；timing：{序号: (开始时间, 结束时间)} 实际执行时间（相对用例开始）
+    """
+    durations = durations or {}
+    finish, prev = {}, {}
+    for node in nodes:  # 依赖只指向之前的步骤，按顺序即为拓扑序
+        index = node['index']
+        start = max((finish[d] for d in node['deps']), default=0)
+        prev[index] = max(node['deps'], key=lambda d: finish[d]) if node['deps'] else None
+        finish[index] = start + durations.get(index, 1 if not durations else 0)
+    path, index = [], max(finish, key=finish.get) if finish else None
+    while index is not None:
+        path.append(index)
+        index = prev[index]
+    path.reverse()
+    critical = set(path)
+    node_data = []
+    for node in nodes:
+        index, step, effect = node['index'], step_data[node['index']], node['effect']
+        item = {
+            'index': index, 'id': step.get('id'), 'name': step.get('step_name'), 'order': step.get('step_order'),
+            'type': step.get('type'), 'deps': sorted(node['deps']), 'reads': sorted(effect.reads),
+            'writes': sorted(effect.writes), 'barrier': effect.barrier, 'critical': index in critical,
+            'duration': round(durations.get(index, 0), 3), 'earliest_finish': round(finish[index], 3)
+        }
+        if timing and index in timing:
+            item.update(start=round(timing[index][0], 3), end=round(timing[index][1], 3))
+        node_data.append(item)
+    serial_duration = sum(durations.values()) if durations else len(nodes)
+    critical_duration = finish[path[-1]] if path else 0
+    return {
+        'nodes': node_data,
+        'critical_path': path,
+        'critical_duration': round(critical_duration, 3),
+        'serial_duration': round(serial_duration, 3),
+        'parallelism': round(serial_duration / critical_duration, 2) if critical_duration else 1
+    }
+
+
+def get_case_dag(case_id):
+    """
+    分析用例步骤的依赖图及关键路径，步骤耗时取最近一次报告中记录的实际耗时，没有记录时每个步骤按1计算
+    """
+    # 延迟导入避免循环引用
+    from apiData.models import ReportSummary
+    from .group_def import parse_api_case_steps
+
+    step_data = parse_api_case_steps([case_id]).get(case_id, [])
+    nodes = build_step_graph(step_data, load_execution_plan(step_data))
+    durations = {}
+    if summary := ReportSummary.objects.filter(case_id=case_id).select_related('report').order_by('-id').first():
+        cases = (summary.report.report_data or {}).get('cases') or []
+        if dag := next((case['dag'] for case in cases if case.get('dag')), None):
+            step_durations = {node['id']: node['duration'] for node in dag['nodes']}
+            durations = {index: step_durations[step['id']] for index, step in enumerate(step_data)
+                         if step['id'] in step_durations}
+    return get_critical_path(step_data, nodes, durations)
+
+
+def create_step_actuator(actuator_obj):
+    """
+    创建单个步骤使用的执行器副本：变量、输出参数记录、HTTP连接池、报告及执行状态与原执行器共享，
+    接口处理阶段的错误标签、引用用例的错误标记为副本独有
+    """
+    step_actuator = copy.copy(actuator_obj)
+    step_actuator.api_process = ''
+    step_actuator.cascader_error = False
+    return step_actuator
+
+
+def run_step_groups_dag(actuator_obj, step_data, concurrency):
+    """
+    按依赖关系并发执行用例的顶层步骤，返回与run_step_groups相同的 (执行状态, 步骤数据)
+    步骤执行完成后按步骤顺序汇总到报告，并把按实际耗时计算的依赖图及关键路径写入报告
+    """
+    # 延迟导入避免循环引用
+    from .group_def import run_step
+
+    nodes = build_step_graph(step_data, actuator_obj.plan)
+    waiting = {node['index']: set(node['deps']) for node in nodes}
+    dependents = defaultdict(list)
+    for node in nodes:
+        for dep in node['deps']:
+            dependents[dep].append(node['index'])
+    ready = [index for index, deps in waiting.items() if not deps]
+    timing, condition, base_time = {}, threading.Condition(), time.time()
+    print(f'步骤按依赖关系并发执行，并发数：{concurrency}')
+
+    def work():
+        try:
+            while True:
+                with condition:
+                    condition.wait_for(lambda: ready or not waiting)
+                    if not ready:
+                        return
+                    index = ready.pop(0)
+                    step_actuator = create_step_actuator(actuator_obj)
+                    base_header = step_actuator.default_header
+                start = time.time() - base_time
+                try:
+                    run_step(step_actuator, step_data[index])
+                except Exception as e:
+                    print(f"步骤 {step_data[index].get('step_name')} 执行出错: {str(e)}")
+                    step_data[index].update(status=FAILED, results=str(e))
+                with condition:
+                    # 设置请求头的步骤会替换默认请求头，读取默认请求头的步骤依赖它，完成后写回原执行器
+                    if step_actuator.default_header is not base_header:
+                        actuator_obj.default_header = step_actuator.default_header
+                    timing[index] = (start, time.time() - base_time)
+                    waiting.pop(index)
+                    for dependent in dependents[index]:
+                        waiting[dependent].discard(index)
+                        if not waiting[dependent]:
+                            ready.append(dependent)
+                    ready.sort()  # 同时可执行的步骤优先执行顺序靠前的
+                    condition.notify_all()
+        finally:
+            connection.close()  # 执行线程有独立的数据库连接，退出前关闭
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(min(concurrency, len(step_data)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    run_status = SUCCESS
+    for step in step_data:
+        if actuator_obj.report:
+            actuator_obj.report.add_step(step.get('case_id'), step)
+        if step.get('status') == FAILED:
+            run_status = FAILED
+    if actuator_obj.report and step_data:
+        durations = {index: end - start for index, (start, end) in timing.items()}
+        actuator_obj.report.set_dag(step_data[0].get('case_id'), get_critical_path(step_data, nodes, durations, timing))
+    return run_status, step_data
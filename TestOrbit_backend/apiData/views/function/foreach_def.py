@@ -0,0 +1,226 @@
+"""
+循环控制器的并行执行
+循环控制器的params中parallel为True时，各次循环由concurrency个执行线程（异步执行器中为协程）同时执行：
+每次循环使用独立的执行器副本，变量、请求头、输出参数记录在副本中修改，执行状态（中断、失败中止）与原执行器共享；
+循环完成后按循环顺序合并：合并前先按串行执行的语义判断中止条件（此时的变量包含之前所有循环写回的值），满足时丢弃该次及之后的循环结果，
+不满足时按merge_policy把本次循环写入的变量写回原执行器。返回的结果与串行执行一样按循环顺序排列。
+变量只浅复制一层，各次循环中变量通过赋值修改，不会修改原变量的值。
+"""
+import asyncio
+import copy
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from utils.constant import SUCCESS, FAILED, VAR_PARAM, FOREACH_MERGE_LAST, FOREACH_MERGE_COLLECT, \
+    FOREACH_MERGE_NONE, FOREACH_MERGE_POLICIES
+from utils.diyException import DiyBaseException
+from .viewDef import copy_foreach_steps
+
+DEFAULT_CONCURRENCY = 10  # 未配置FOREACH_PARALLEL_CONCURRENCY时，同时执行的循环数
+PENDING_FACTOR = 4  # 已开始但还未按顺序合并的循环数最多为并发数的4倍，避免前面的循环较慢时缓存过多的结果
+_END = object()
+
+
+def get_foreach_parallel_cfg(step):
+    """
+    获取循环控制器的并行配置，返回 (并发数, 变量写回方式)，未开启并行时返回None
+    """
+    params = step['params']
+    if not params.get('parallel'):
+        return None
+    concurrency = params.get('concurrency') or getattr(settings, 'FOREACH_PARALLEL_CONCURRENCY', DEFAULT_CONCURRENCY)
+    merge_policy = params.get('merge_policy') or FOREACH_MERGE_LAST
+    if merge_policy not in FOREACH_MERGE_POLICIES:
+        raise DiyBaseException(f'无效的变量写回方式：{merge_policy}！')
+    try:
+        concurrency = int(concurrency)
+    except (TypeError, ValueError):
+        raise DiyBaseException(f'无效的循环并发数：{concurrency}！')
+    return max(concurrency, 1), merge_policy
+
+
+def create_iteration_actuator(actuator_obj):
+    """
+    创建单次循环使用的执行器副本，HTTP连接池、结果缓冲区、执行计划及执行状态与原执行器共享
+    返回 (执行器副本, 创建时的变量、输出参数记录及请求头)，合并时只写回与创建时不同的值
+    """
+    base = {'var': dict(actuator_obj.default_var), 'header': actuator_obj.default_header,
+            'params_source': {key: dict(value) for key, value in actuator_obj.params_source.items()}}
+    iteration = copy.copy(actuator_obj)
+    iteration.default_var = dict(base['var'])
+    iteration.params_source = {key: dict(value) for key, value in base['params_source'].items()}
+    iteration.cascader_error = False
+    return iteration, base
+
+
+class IterationMerger:
+    """
+    按循环顺序合并各次循环的结果
+    """
+
+    def __init__(self, actuator_obj, break_code, merge_policy, start):
+        self.actuator_obj = actuator_obj
+        self.break_code = break_code
+        self.merge_policy = merge_policy
+        self.next_index = start  # 下一个需要合并的循环序号
+        self.next_start = start  # 下一个开始执行的循环序号
+        self.finished = {}  # {循环序号: (执行器副本, 执行状态, 步骤结果)} 已完成、等待按顺序合并的循环
+        self.bases = {}  # {循环序号: 创建执行器副本时的变量} 执行中及等待合并的循环
+        self.res_status, self.res_data = SUCCESS, []
+        self.collected = {}  # merge_policy为collect时各变量写入的值
+        self.stopped = False  # 满足中止条件或执行被中断，不再开始新的循环
+        self.exhausted = False  # 所有循环都已开始
+
+    def start(self):
+        """
+        开始下一次循环，返回 (循环序号, 执行器副本)
+        """
+        index = self.next_start
+        iteration, self.bases[index] = create_iteration_actuator(self.actuator_obj)
+        self.next_start += 1
+        return index, iteration
+
+    def add(self, index, iteration, run_status, step_data):
+        """
+        记录完成的循环，并合并已按顺序完成的循环
+        """
+        self.finished[index] = (iteration, run_status, step_data)
+        while not self.stopped and self.next_index in self.finished:
+            # 与串行执行一致：每次循环开始前判断中止条件，满足时丢弃该次及之后的循环
+            if self.actuator_obj.foreach_need_break(self.break_code, self.next_index):
+                self.stopped = True
+                break
+            iteration, run_status, step_data = self.finished.pop(self.next_index)
+            self.merge(iteration, self.bases.pop(self.next_index))
+            self.res_data.append(step_data)
+            if run_status == FAILED:
+                self.res_status = FAILED
+            self.next_index += 1
+        if self.stopped:
+            self.finished.clear()
+            self.bases.clear()
+
+    def can_start(self, concurrency):
+        """
+        是否可以开始下一次循环，循环已结束时也返回True，等待中的执行线程据此退出
+        """
+        return self.stopped or self.exhausted or self.next_start < self.next_index + concurrency * PENDING_FACTOR
+
+    def merge(self, iteration, base):
+        """
+        把单次循环写入的变量、请求头及输出参数记录写回原执行器，只写回与循环开始时不同的值
+        """
+        actuator_obj = self.actuator_obj
+        if iteration.cascader_error:
+            actuator_obj.cascader_error = True
+        if self.merge_policy == FOREACH_MERGE_NONE:
+            return
+        changed = {key: value for key, value in iteration.default_var.items()
+                   if key not in base['var'] or base['var'][key] is not value}
+        if self.merge_policy == FOREACH_MERGE_COLLECT:
+            for key, value in changed.items():
+                self.collected.setdefault(key, []).append(value)
+        else:
+            actuator_obj.default_var.update(changed)
+        for key, params in iteration.params_source.items():
+            base_params = base['params_source'].get(key, {})
+            actuator_obj.params_source.setdefault(key, {}).update(
+                (name, parm) for name, parm in params.items() if base_params.get(name) is not parm)
+        if iteration.default_header is not base['header']:
+            actuator_obj.default_header = iteration.default_header
+
+    def finish(self):
+        """
+        所有循环结束后写回collect方式收集的变量，返回 (执行状态, 按循环顺序排列的步骤结果)
+        """
+        for key, values in self.collected.items():
+            self.actuator_obj.default_var[key] = values
+            if parm := self.actuator_obj.params_source.get(VAR_PARAM, {}).get(key):
+                self.actuator_obj.params_source[VAR_PARAM][key] = {**parm, 'value': values}
+        return self.res_status, self.res_data
+
+
+def run_foreach_parallel(actuator_obj, loop_range, break_code, steps, prefix_label, cascader_level, i,
+                         concurrency, merge_policy):
+    """
+    以多个执行线程并行执行循环控制器的各次循环
+    """
+    # 延迟导入避免循环引用
+    from .group_def import run_step_groups
+
+    merger = IterationMerger(actuator_obj, break_code, merge_policy, i)
+    loop_iter = iter(loop_range)
+    condition = threading.Condition()
+    print(f'循环控制器并行执行，并发数：{concurrency}，变量写回方式：{merge_policy}')
+
+    def next_iteration():
+        """
+        取下一次循环，没有可执行的循环时返回None
+        """
+        with condition:
+            condition.wait_for(lambda: merger.can_start(concurrency))
+            if merger.stopped or merger.exhausted or next(loop_iter, _END) is _END:
+                merger.exhausted = True
+                condition.notify_all()
+                return None
+            return merger.start()
+
+    def work():
+        try:
+            while (item := next_iteration()) is not None:
+                index, iteration = item
+                try:
+                    run_status, step_data = run_step_groups(
+                        iteration, copy_foreach_steps(steps), prefix_label, cascader_level=cascader_level, i=index)
+                except Exception as e:
+                    print(f'第{index + 1}次循环执行出错: {str(e)}')
+                    run_status, step_data = FAILED, [{'status': FAILED, 'results': str(e)}]
+                with condition:
+                    merger.add(index, iteration, run_status, step_data)
+                    condition.notify_all()
+        finally:
+            connection.close()  # 执行线程有独立的数据库连接，退出前关闭
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return merger.finish()
+
+
+async def run_foreach_parallel_async(actuator_obj, loop_range, break_code, steps, prefix_label, cascader_level, i,
+                                     concurrency, merge_policy):
+    """
+    run_foreach_parallel的异步版本，各次循环以协程并发执行
+    """
+    # 延迟导入避免循环引用
+    from .async_engine import run_step_groups_async
+
+    merger = IterationMerger(actuator_obj, break_code, merge_policy, i)
+    loop_iter = iter(loop_range)
+    condition = asyncio.Condition()
+
+    async def work():
+        while True:
+            async with condition:
+                await condition.wait_for(lambda: merger.can_start(concurrency))
+                if merger.stopped or merger.exhausted or next(loop_iter, _END) is _END:
+                    merger.exhausted = True
+                    condition.notify_all()
+                    return
+                index, iteration = merger.start()
+            try:
+                run_status, step_data = await run_step_groups_async(
+                    iteration, copy_foreach_steps(steps), prefix_label, cascader_level=cascader_level, i=index)
+            except Exception as e:
+                print(f'第{index + 1}次循环执行出错: {str(e)}')
+                run_status, step_data = FAILED, [{'status': FAILED, 'results': str(e)}]
+            async with condition:
+                merger.add(index, iteration, run_status, step_data)
+                condition.notify_all()
+
+    await asyncio.gather(*(work() for _ in range(concurrency)))
+    return merger.finish()
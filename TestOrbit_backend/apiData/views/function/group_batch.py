@@ -1,19 +1,22 @@
 """
 批量执行API用例相关功能模块
 
-本模块提供批量执行API测试用例的相关功能，支持并行和串行两种执行方式。
+本模块提供批量执行API测试用例的相关功能，支持串行、多线程并行、协程异步和多进程分片四种执行方式。
 """
 
 import datetime
+from asgiref.sync import async_to_sync
 from rest_framework import status
 from rest_framework.response import Response
 from apiData.models import ApiCase
-from utils.constant import RUNNING, WAITING
+from utils.constant import RUNNING, WAITING, THREAD_MODE, ASYNC_MODE, PROCESS_MODE, BATCH_TRIGGER
 from user.models import UserCfg
 import concurrent.futures 
 
 # 功能函数切分保存位置,变更到其他位置
 from .group_def import run_api_case_func, parse_api_case_steps
+from .async_engine import run_cases_async
+from .process_engine import run_cases_in_processes, merge_summaries
 
 
 class BatchExecutionException(Exception):
@@ -24,13 +27,14 @@ class BatchExecutionException(Exception):
         super().__init__(self.message)
 
 
-def handleGroupbatch(batch_params, user_id):
+def handleGroupbatch(batch_params, user_id, job_id=None):
     """
     批量执行API用例的核心处理函数
     
     Args:
-        batch_params: 包含case_ids和parallel参数的字典
+        batch_params: 包含case_ids、parallel、concurrency、processes及trigger(触发方式，默认为批量执行)参数的字典
         user_id: 当前用户ID
+        job_id: 由执行进程执行的批量执行任务的run_id，取消任务时中断执行中的用例
         
     Returns:
         dict: 执行结果数据
@@ -40,7 +44,10 @@ def handleGroupbatch(batch_params, user_id):
     """
     print("已进入batch_run_api_cases函数，准备批量运行选中的用例组")
     case_ids = batch_params.get('case_ids', [])
-    parallel = batch_params.get('parallel', 0)  # 1表示并行，0表示串行
+    parallel = batch_params.get('parallel', 0)  # 3表示多进程，2表示异步，1表示并行，0表示串行
+    concurrency = batch_params.get('concurrency')  # 异步模式下同时执行的用例数，不传时使用ASYNC_RUN_CONCURRENCY
+    processes = batch_params.get('processes')  # 多进程模式下的进程数，不传时使用PROCESS_RUN_WORKERS
+    trigger = batch_params.get('trigger', BATCH_TRIGGER)
 
     if not case_ids:
         raise BatchExecutionException("请选择至少一个测试用例")
@@ -96,12 +103,17 @@ def handleGroupbatch(batch_params, user_id):
         }
     )
 
-    results = []
+    results, shards = [], None
     start_time = datetime.datetime.now()
-    execution_mode = 'parallel' if parallel == 1 else 'serial'
+    execution_mode = {THREAD_MODE: 'parallel', ASYNC_MODE: 'async', PROCESS_MODE: 'process'}.get(parallel, 'serial')
 
     try:
-        if parallel == 1:
+        if parallel == ASYNC_MODE:
+            # async_to_sync会在独立的事件循环中运行协程，协程中的数据库操作回到当前线程执行
+            results = async_to_sync(run_cases_async)(cases_to_run, user_id, concurrency, trigger, job_id)
+        elif parallel == PROCESS_MODE:
+            results, shards = run_cases_in_processes(cases_to_run, user_id, processes, trigger, job_id)
+        elif parallel == THREAD_MODE:
             print('采用并行模式执行测试用例')
             with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(case_ids), 5)) as executor:
                 # 创建一个任务字典，记录每个future对应的case_id
@@ -112,7 +124,9 @@ def handleGroupbatch(batch_params, user_id):
                     # 准备每个用例的执行配置
                     cfg_data = {
                         'envir_id': case_info['env_id'],
-                        'failed_stop': False
+                        'failed_stop': False,
+                        'trigger': trigger,
+                        'job_id': job_id
                     }
                     
                     future = executor.submit(
@@ -156,7 +170,9 @@ def handleGroupbatch(batch_params, user_id):
                     # 准备每个用例的执行配置
                     cfg_data = {
                         'envir_id': case_info['env_id'],
-                        'failed_stop': False
+                        'failed_stop': False,
+                        'trigger': trigger,
+                        'job_id': job_id
                     }
                     
                     result = run_api_case_func(
@@ -198,6 +214,9 @@ def handleGroupbatch(batch_params, user_id):
             'execution_mode': execution_mode,
             'data': results
         }
+        if shards is not None:
+            # 多进程模式下各分片的报告汇总为本次批量执行的统计数据
+            response_data.update(summary=merge_summaries(results), shards=shards)
         
         # 如果有环境冲突，在响应中添加警告信息
         if environment_conflicts:
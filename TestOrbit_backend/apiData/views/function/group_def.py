@@ -12,13 +12,14 @@ from openpyxl import load_workbook
 from requests import ReadTimeout
 from rest_framework.response import Response
 
-from apiData.models import ApiCaseStep, ApiCase, ApiForeachStep, Report
+from apiData.models import ApiCaseStep, ApiCase, ApiForeachStep
 from utils.comDef import get_proj_envir_db_data, db_connect, execute_sql_func, \
     close_db_con, json_dumps, JSONEncoder, MyThread, json_loads, format_parm_type_v
 from utils.constant import USER_API, VAR_PARAM, HEADER_PARAM, HOST_PARAM, RUNNING, SUCCESS, FAILED, DISABLED, \
     INTERRUPT, SKIP, API_CASE, API_FOREACH, TABLE_MODE, STRING, DIY_CFG, JSON_MODE, PY_TO_CONF_TYPE, CODE_MODE, \
     OBJECT, FAILED_STOP, WAITING, PRO_CFG, FORM_MODE, EQUAL, API_VAR, NOT_EQUAL, \
     CONTAIN, NOT_CONTAIN, TEXT_MODE, API, FORM_FILE_TYPE, FORM_TEXT_TYPE, API_SQL, RES_BODY
+from utils.artifactDef import offload_artifacts
 from utils.diyException import DiyBaseException, NotFoundFileError
 from utils.paramsDef import parse_param_value, run_params_code, parse_temp_params, get_parm_v_by_temp
 from config.models import Environment
@@ -27,6 +28,9 @@ from user.models import UserCfg, UserTempParams
 # 功能函数切分保存位置,变更到其他位置
 from .steps_def import go_step
 from .monitor_def import monitor_interrupt
+from .plan_def import load_execution_plan
+from .report_def import ReportBuilder
+from .dag_def import run_step_groups_dag
 # 避免循环引用，在需要时导入 ApiCasesActuator
 
 
@@ -135,109 +139,35 @@ def parse_api_case_steps(case_ids=None, is_step=False):
     return step_data
 
 
-"""
-执行完成后，写入结果并生成报告
-"""
-def save_results(case_data, user_id):
-    if not case_data:
-        return
-    #  创建执行报告
-    try:
-        print(f'case_data: {case_data}')
-        # 获取第一个用例的项目信息
-        first_case = case_data[0]
-        case_obj = ApiCase.objects.select_related('module__project').get(id=first_case.id)
-        project = case_obj.module.project
-        
-        # 构建报告名称
-        report_name = f"API测试报告 - {datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
-        # 构建综合报告数据
-        report_data = {
-            'execution_time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'cases': [],
-            'summary': {
-                'total_cases': len(case_data),
-                'success_cases': 0,
-                'failed_cases': 0,
-                'success_rate': 0
-            }
-        }
-        print('所有报告数据基本准备完成')
-        
-        # 收集所有用例的结果
-        for case in case_data:
-            # 获取用例详细信息
-            case_obj = ApiCase.objects.get(id=case.id)
-            case_steps = ApiCaseStep.objects.filter(case_id=case.id).order_by('step_order')
-            
-            # 计算步骤统计信息
-            total_steps = len(case_steps)
-            enabled_steps = len([s for s in case_steps if s.enabled])
-            success_steps = len([s for s in case_steps if s.status == SUCCESS and s.enabled])
-            
-            # 计算成功率
-            success_rate = (success_steps / enabled_steps * 100) if enabled_steps > 0 else 0
-            success_rate = round(success_rate, 2)
-            
-            # 构建步骤信息列表
-            steps_info = []
-            for step in case_steps:
-                steps_info.append({
-                    'id': step.id,
-                    'name': step.step_name,
-                    'order': step.step_order,
-                    'type': step.type,
-                    'enabled': step.enabled,
-                    'status': step.status,
-                    'results': step.results
-                })
-            
-            # 计算执行时间(秒)
-            spend_time = 0
-            if case_obj.latest_run_time:
-                time_diff = case_obj.latest_run_time - case_obj.created
-                spend_time = round(time_diff.total_seconds(), 2)
-            
-            # 添加用例报告数据
-            case_info = {
-                'statistics': {
-                    'total_steps': total_steps,
-                    'enabled_steps': enabled_steps,
-                    'success_steps': success_steps,
-                    'success_rate': success_rate,
-                    'success_rate_str': f'{success_rate}%'
-                },
-                'steps': steps_info,
-                'spend_time': spend_time
-            }
-            report_data['cases'].append(case_info)
-            
-            # 更新总体统计信息
-            if case.status == SUCCESS:
-                report_data['summary']['success_cases'] += 1
-            elif case.status == FAILED:
-                report_data['summary']['failed_cases'] += 1
-        
-        # 计算总体成功率
-        total_cases = report_data['summary']['total_cases']
-        if total_cases > 0:
-            success_rate = (report_data['summary']['success_cases'] / total_cases) * 100
-            report_data['summary']['success_rate'] = round(success_rate, 2)
-            report_data['summary']['success_rate_str'] = f"{round(success_rate, 2)}%"
-        
-        # 创建报告记录
-        Report.objects.create(
-            name=report_name,
-            report_data=report_data,
-            creater_id=user_id,
-            project=project
-        )
-        print(f'成功创建执行报告: {report_name}')
-        
-    except Exception as e:
-        print(f'创建执行报告失败: {str(e)}')
+def run_step(actuator_obj, step, prefix_label='', cascader_level=0, i=0):
+    """
+    执行单个步骤，执行状态及结果写入step中
+    """
+    # 往step中添加step_id，方便后续引用
+    step['step_id'] = step.get('id')
+    s_type = step['type']
+    # print(f'开始执行步骤: {step["step_name"]}，类型: {s_type}')
+    if step.get('enabled'):
 
+        params = {'actuator_obj': actuator_obj, 'step': step, 'prefix_label': prefix_label,
+                  'i': i}  # 将step传递给go_step
+        if s_type in (API_CASE, API_FOREACH):
+            params['cascader_level'] = cascader_level + 1
+        # print(f'params:{params}\t')
+        res = go_step(**params)
+        # print(f'{step["step_name"]}步骤执行结果: {res}')
+
+        # 更新步骤状态和结果
+        step['status'] = res.get('status', WAITING)  # 设置默认值为WAITING
+        if 'data' in res:
+            step['data'] = res['data']
+        if 'results' in res:
+            step['results'] = res['results']
+            
+        print(f"步骤 {step['step_name']} 执行完成，状态: {step['status']}")
+    else:
+        step['status'] = DISABLED
+        print(f"步骤 {step['step_name']} 被禁用，状态: {step['status']}")
 
 
 """
@@ -249,32 +179,9 @@ def run_step_groups(actuator_obj, step_data, prefix_label='', cascader_level=0,
     print('开始使用run_step_groups函数执行步骤合集')
     # print(f'步骤合集内容: {step_data}')
     for step in step_data:
-        # 往step中添加step_id，方便后续引用
-        step['step_id'] = step.get('id')
-        step_id = step.get('id')
-        s_type = step['type']
-        # print(f'开始执行步骤: {step["step_name"]}，类型: {s_type}')
-        if step.get('enabled'):
-
-            params = {'actuator_obj': actuator_obj, 'step_id': step_id, 'prefix_label': prefix_label,
-                      'i': i}  # 将step传递给go_step
-            if s_type in (API_CASE, API_FOREACH):
-                params['cascader_level'] = cascader_level + 1
-            # print(f'params:{params}\t')
-            res = go_step(**params)
-            # print(f'{step["step_name"]}步骤执行结果: {res}')
-
-            # 更新步骤状态和结果
-            step['status'] = res.get('status', WAITING)  # 设置默认值为WAITING
-            if 'data' in res:
-                step['data'] = res['data']
-            if 'results' in res:
-                step['results'] = res['results']
-                
-            print(f"步骤 {step['step_name']} 执行完成，状态: {step['status']}")
-        else:
-            step['status'] = DISABLED
-            print(f"步骤 {step['step_name']} 被禁用，状态: {step['status']}")
+        run_step(actuator_obj, step, prefix_label, cascader_level, i)
+        if cascader_level == 0 and actuator_obj.report:  # 顶层步骤执行完成后汇总到报告
+            actuator_obj.report.add_step(step.get('case_id'), step)
         
         # 当测试计划状态为通过且步骤状态为失败时，就将计划状态改为失败
         print('\t')
@@ -288,86 +195,51 @@ def run_step_groups(actuator_obj, step_data, prefix_label='', cascader_level=0,
     return run_status, step_data
 
 
-"""
-执行api用例的主方法
-执行测试计划：case_data={case_id:[step1,step2,step3]}
-实时调试/步骤中计划：case_data=[step1,step2,step3]
-批量执行：case_data=[step1,step2,step3]（新增支持）
-temp_params为空的话则查询用户的参数来测试。
-"""
-def run_api_case_func(case_data, user_id, cfg_data=None, temp_params=None):
-    # 延迟导入避免循环引用
-    from .viewDef import ApiCasesActuator
-    
-    res_step_objs, res_case_objs = [], []
-    actuator_obj = ApiCasesActuator(user_id, cfg_data=cfg_data, temp_params=temp_params)
-    thread = MyThread(target=monitor_interrupt, args=[user_id, actuator_obj])
-    thread.start()
+def start_case_run(actuator_obj, case_data):
+    """
+    标记用例为执行中，返回用例id，case_data为空时返回None
+    """
+    if not (isinstance(case_data, list) and len(case_data) > 0):
+        print("警告：未识别的case_data格式或空数据")
+        return None
+    first_step = case_data[0] if case_data else {}
+    case_id = first_step.get('case_id', 'unknown')
 
-    # 开始执行case_data
-    if isinstance(case_data, list) and len(case_data) > 0:
-        first_step = case_data[0] if case_data else {}
-        case_id = first_step.get('case_id', 'unknown')
+    print(f'这是{case_id}号用例,正在执行中...')
+    case_objs = ApiCase.objects.filter(id=case_id).select_related('module').first()
+    if case_objs:
+        print('标记用例任务执行状态为running')
+        case_objs.status = RUNNING
+        case_objs.save(update_fields=['status'])
+    
+    actuator_obj.base_params_source['case_id'] = case_id
+    # 本次执行的报告，步骤执行完成时汇总结果
+    actuator_obj.report = ReportBuilder(actuator_obj.run_id, actuator_obj.user_id, actuator_obj.trigger,
+                                       actuator_obj.envir)
+    project_id = case_objs.module.project_id if case_objs else None
+    actuator_obj.report.start_case(case_id, project_id)
+    # 执行环境快照合并项目的全局环境及用例的局部环境，执行期间不再查询环境
+    actuator_obj.load_environment(case_objs.id if case_objs else None, project_id)
+    actuator_obj.step_concurrency = case_objs.step_concurrency if case_objs else 0
+    # 一次性加载用例的步骤、引用用例、循环子步骤及断言规则，执行期间不再逐步骤查库
+    actuator_obj.plan = load_execution_plan(case_data)
+    return case_id
 
-        print(f'这是{case_id}号用例,正在执行中...')
-        start_time = datetime.datetime.now()
-        case_objs = ApiCase.objects.filter(id=case_id).first()
-        if case_objs:
-            print('标记用例任务执行状态为running')
-            case_objs.status = RUNNING
-            case_objs.save(update_fields=['status'])
-        
-        actuator_obj.base_params_source['case_id'] = case_id
-        
-        # 执行步骤组
-        case_status, step_data = run_step_groups(actuator_obj, case_data)
 
+def finish_case_run(actuator_obj, user_id, case_id, case_status=None, step_data=None):
+    """
+    存储用例执行的结果并生成报告，返回报告数据
+    """
+    res_case_objs, result = [], None
+    if case_id is not None:
         print(f'开始存储用例组{case_id}所有步骤执行的结果\t')
         for step in step_data:
-            # 过滤掉不属于ApiCaseStep模型的字段
-            valid_fields = {
-                'id', 'type', 'enabled', 'step_name', 'step_order', 'status', 
-                'retried_times', 'controller_data', 'params', 'results', 
-                'timeout', 'source'
-            }
-            filtered_step = {k: v for k, v in step.items() if k in valid_fields}
-            
-            # 将执行结果(data字段)存储到results字段中
-            if 'data' in step and step['data']:
-                filtered_step['results'] = step['data']
+            # 将执行结果(data字段)存储到results字段中，引用用例、循环控制器的结果为子步骤的结果
+            # 较大的请求/响应内容与步骤执行时一样替换为制品引用
+            results = offload_artifacts(step['data'] if step.get('data') else step.get('results'))
+            # 写入结果缓冲区，与步骤执行时已写入的结果相同的不会重复写入
+            actuator_obj.result_sink.put(step.get('id'), step.get('status'), results)
 
-            # 正确设置外键关系，使用case而不是case_id
-            if 'id' in filtered_step:
-                # 如果有ID，说明是更新现有记录
-                step_obj = ApiCaseStep(id=filtered_step['id'])
-                for field, value in filtered_step.items():
-                    if field != 'id' and field != 'case_id':  # 避免设置case_id字段
-                        setattr(step_obj, field, value)
-                # 确保case关系正确
-                step_obj.case_id = case_id
-                res_step_objs.append(step_obj)
-            else:
-                # 新记录，直接设置case_id
-                step_obj = ApiCaseStep(case_id=case_id)
-                for field, value in filtered_step.items():
-                    if field != 'case_id':  # 避免重复设置case_id
-                        setattr(step_obj, field, value)
-                res_step_objs.append(step_obj)
-        
-        # 先保存步骤结果到数据库，以便后续查询统计
-        print('先保存步骤执行结果到数据库...')
-        # 创建一个临时的模型对象列表用于批量更新
-        temp_step_objs = []
-        for step_obj in res_step_objs:
-            if hasattr(step_obj, 'case_id') and step_obj.case_id == case_id:
-                temp_step_objs.append(step_obj)
-        
-        # 如果有步骤结果，立即保存
-        if temp_step_objs:
-            # 使用bulk_update批量更新步骤的状态和结果
-            ApiCaseStep.objects.bulk_update(temp_step_objs, fields=['status', 'results'])
-            print(f'成功保存 {len(temp_step_objs)} 个步骤的执行结果')
-        
         end_time = datetime.datetime.now()
         if actuator_obj.status in (INTERRUPT, FAILED_STOP):
             case_status = actuator_obj.status
@@ -378,34 +250,54 @@ def run_api_case_func(case_data, user_id, cfg_data=None, temp_params=None):
                    status=case_status, 
                    latest_run_time=end_time))
         print(f'已完成{case_id}号用例的执行')
+
+    # 关闭执行器时写入缓冲区中剩余的步骤结果
+    actuator_obj.close()
+
+    # 生成本次执行的报告，报告数据由执行过程中汇总的结果生成，不再从数据库读取
+    if actuator_obj.report and res_case_objs:
+        try:
+            actuator_obj.report.finish_case(case_id, res_case_objs[0].status, res_case_objs[0].latest_run_time)
+            result = actuator_obj.report.save()
+        except Exception as e:
+            print(f'创建执行报告失败: {str(e)}')
     
-    else:
-        print("警告：未识别的case_data格式或空数据")
-        
-    save_results(res_case_objs, user_id)
-    
-    # 确保执行状态设置为WAITING，通知监控线程可以终止
+    # 确保执行状态设置为WAITING
     UserCfg.objects.filter(user_id=user_id).update(exec_status=WAITING)
     
-    # 从最新创建的报告中获取结果
-    try:
-        latest_report = Report.objects.filter(
-            creater_id=user_id
-        ).order_by('-created').first()
-        
-        if latest_report:
-            result = latest_report.report_data
-        else:
-            # 如果没有找到报告，返回基本信息
-            result = {
-                'cases': [{
-                    'id': case_obj.id,
-                    'status': case_obj.status
-                } for case_obj in res_case_objs]
-            }
-    except Exception as e:
-        print(f'获取报告数据失败: {str(e)}')
-        result = {'error': '获取报告数据失败'}
+    if result is None:
+        # 如果没有生成报告，返回基本信息
+        result = {
+            'cases': [{
+                'id': case_obj.id,
+                'status': case_obj.status
+            } for case_obj in res_case_objs]
+        }
     
     print('执行完成，返回结果')
     return result
+
+
+"""
+执行api用例的主方法
+执行测试计划：case_data={case_id:[step1,step2,step3]}
+实时调试/步骤中计划：case_data=[step1,step2,step3]
+批量执行：case_data=[step1,step2,step3]（新增支持）
+temp_params为空的话则查询用户的参数来测试。
+"""
+def run_api_case_func(case_data, user_id, cfg_data=None, temp_params=None):
+    # 延迟导入避免循环引用
+    from .viewDef import ApiCasesActuator
+    
+    actuator_obj = ApiCasesActuator(user_id, cfg_data=cfg_data, temp_params=temp_params)
+    # 登记到中断登记表，收到中断请求时执行器会被立即标记为中断
+    with monitor_interrupt(user_id, actuator_obj, actuator_obj.job_id):
+        # 开始执行case_data
+        case_status, step_data = None, None
+        if (case_id := start_case_run(actuator_obj, case_data)) is not None:
+            # 执行步骤组，用例设置了步骤并发数时按依赖关系并发执行
+            if actuator_obj.step_concurrency > 1:
+                case_status, step_data = run_step_groups_dag(actuator_obj, case_data, actuator_obj.step_concurrency)
+            else:
+                case_status, step_data = run_step_groups(actuator_obj, case_data)
+    return finish_case_run(actuator_obj, user_id, case_id, case_status, step_data)
@@ -0,0 +1,211 @@
+"""
+批量执行的任务队列
+提交的批量执行保存为ExecutionJob后立即返回run_id，执行进程（python manage.py run_worker）从数据库队列中认领任务执行：
+认领时对排队中的任务加行锁（SELECT ... FOR UPDATE SKIP LOCKED）并通过带状态条件的UPDATE标记为执行中，
+不支持行锁的数据库（如测试使用的SQLite）只依赖带条件的UPDATE，同一任务只会被一个执行进程认领；
+执行期间定时续期任务租约，租约过期（执行进程已退出）的任务重新排队，超过最大认领次数后标记为失败；
+取消执行中的任务时标记为已取消并发送中断请求，执行进程通过中断后端（默认轮询数据库）中断该任务的用例
+"""
+import datetime
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import transaction, connection
+from django.db.models import F
+
+from apiData.models import ExecutionJob
+from .group_batch import handleGroupbatch, BatchExecutionException
+from .lease_def import get_process_owner
+from utils.cancelDef import get_cancel_registry
+
+DEFAULT_WORKER_CONCURRENCY = 2  # 未配置JOB_WORKER_CONCURRENCY时，每个执行进程同时执行的任务数
+DEFAULT_POLL_INTERVAL = 1  # 未配置JOB_POLL_INTERVAL时，队列为空时查询新任务的间隔（秒）
+DEFAULT_LEASE_TTL = 60  # 未配置JOB_LEASE_TTL时，任务执行租约的时长（秒）
+DEFAULT_MAX_ATTEMPTS = 3  # 未配置JOB_MAX_ATTEMPTS时，任务的最大认领次数
+
+
+def submit_job(batch_params, user_id):
+    """
+    提交批量执行任务，返回run_id
+    """
+    case_ids = batch_params.get('case_ids')
+    if not case_ids or not isinstance(case_ids, list):
+        raise BatchExecutionException("请选择至少一个测试用例")
+    job = ExecutionJob.objects.create(run_id=uuid.uuid4().hex, params=batch_params, creater_id=user_id)
+    print(f'已提交批量执行任务: {job.run_id}')
+    return job.run_id
+
+
+def cancel_job(run_id, user_id):
+    """
+    取消排队中或执行中的任务，返回是否取消成功；执行中的任务由执行进程中断用例后写入已执行部分的结果
+    """
+    jobs = ExecutionJob.objects.filter(run_id=run_id, creater_id=user_id)
+    if jobs.filter(status='queued').update(status='cancelled', finished=datetime.datetime.now()):
+        return True
+    if not jobs.filter(status='running').update(status='cancelled'):
+        return False
+    get_cancel_registry().cancel(job_id=run_id)
+    return True
+
+
+def compact_batch_result(result_data):
+    """
+    任务结果只保存每个用例的执行状态、报告run_id及统计信息，报告详情通过报告接口获取
+    """
+    data = []
+    for item in result_data.get('data', []):
+        item = dict(item)
+        if isinstance(result := item.pop('result', None), dict):
+            item.update(run_id=result.get('run_id'), summary=result.get('summary'))
+        data.append(item)
+    return {**result_data, 'data': data}
+
+
+def claim_job(worker, lease_ttl):
+    """
+    认领最早提交的排队中的任务，没有可执行的任务时返回None
+    """
+    now = datetime.datetime.now()
+    with transaction.atomic():
+        job = ExecutionJob.objects.select_for_update(skip_locked=True).filter(status='queued').order_by('id').first()
+        if job is None:
+            return None
+        if not ExecutionJob.objects.filter(id=job.id, status='queued').update(
+                status='running', worker=worker, started=now, attempts=F('attempts') + 1,
+                lease_expires=now + datetime.timedelta(seconds=lease_ttl)):
+            return None  # 已被其他执行进程认领
+    job.refresh_from_db()
+    return job
+
+
+def requeue_expired_jobs(max_attempts):
+    """
+    租约过期的执行中任务重新排队，超过最大认领次数的标记为失败，返回处理的任务数
+    """
+    now = datetime.datetime.now()
+    expired = ExecutionJob.objects.filter(status='running', lease_expires__lt=now)
+    failed = expired.filter(attempts__gte=max_attempts).update(
+        status='failed', finished=now, error_message='执行进程多次退出，任务执行失败', worker=None, lease_expires=None)
+    requeued = expired.filter(attempts__lt=max_attempts).update(status='queued', worker=None, lease_expires=None)
+    if failed or requeued:
+        print(f'执行进程已退出的任务：重新排队{requeued}个，执行失败{failed}个')
+    return failed + requeued
+
+
+class JobWorker:
+    """
+    执行进程：concurrency个执行线程从队列中认领任务执行，另有一个线程续期执行中任务的租约并处理租约过期的任务
+    """
+
+    def __init__(self, concurrency=None, poll_interval=None):
+        self.concurrency = concurrency or getattr(settings, 'JOB_WORKER_CONCURRENCY', DEFAULT_WORKER_CONCURRENCY)
+        self.poll_interval = poll_interval or getattr(settings, 'JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        self.lease_ttl = getattr(settings, 'JOB_LEASE_TTL', DEFAULT_LEASE_TTL)
+        self.max_attempts = getattr(settings, 'JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+        self.worker = get_process_owner()
+        self._running_jobs = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self, once=False):
+        """
+        启动执行线程，once为True时执行完队列中的任务后退出
+        """
+        print(f'执行进程已启动: {self.worker}，并发数：{self.concurrency}')
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        threads = [threading.Thread(target=self._work, args=(once,), daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            print('正在停止执行进程，等待执行中的任务结束...')
+            self.stop()
+            for thread in threads:
+                thread.join()
+        self.stop()
+        print('执行进程已停止')
+
+    def stop(self):
+        self._stop.set()
+
+    def _work(self, once):
+        """
+        执行线程：循环认领并执行任务
+        """
+        try:
+            while not self._stop.is_set():
+                try:
+                    job = claim_job(self.worker, self.lease_ttl)
+                except Exception as e:
+                    print(f'认领任务失败: {str(e)}')
+                    job = None
+                if job is None:
+                    if once:
+                        return
+                    self._stop.wait(self.poll_interval)
+                    continue
+                with self._lock:
+                    self._running_jobs.add(job.id)
+                try:
+                    self.execute(job)
+                finally:
+                    with self._lock:
+                        self._running_jobs.discard(job.id)
+        finally:
+            connection.close()  # 执行线程有独立的数据库连接，退出前关闭
+
+    def _heartbeat(self):
+        """
+        续期执行中任务的租约，并处理租约过期的任务
+        """
+        try:
+            while not self._stop.wait(self.lease_ttl / 3):
+                try:
+                    with self._lock:
+                        job_ids = list(self._running_jobs)
+                    if job_ids:
+                        ExecutionJob.objects.filter(id__in=job_ids, worker=self.worker, status='running').update(
+                            lease_expires=datetime.datetime.now() + datetime.timedelta(seconds=self.lease_ttl))
+                    requeue_expired_jobs(self.max_attempts)
+                except Exception as e:
+                    print(f'续期任务租约失败: {str(e)}')
+        finally:
+            connection.close()
+
+    def execute(self, job):
+        """
+        执行任务并写入结果，任务被取消时保留取消状态并写入已执行部分的结果，任务租约已被其他执行进程接管时不写入结果
+        """
+        print(f'开始执行任务: {job.run_id}（第{job.attempts}次）')
+        result, error_message = None, None
+        try:
+            result = compact_batch_result(handleGroupbatch(job.params, job.creater_id, job.run_id))
+        except BatchExecutionException as e:
+            error_message = e.message
+        except Exception as e:
+            error_message = f"批量执行异常：{str(e)}"
+        if not ExecutionJob.objects.filter(id=job.id, worker=self.worker, status='running').update(
+                status='failed' if error_message else 'completed', result=result, error_message=error_message,
+                finished=datetime.datetime.now(), lease_expires=None):
+            if ExecutionJob.objects.filter(id=job.id, worker=self.worker, status='cancelled').update(
+                    result=result, error_message=error_message, finished=datetime.datetime.now(), lease_expires=None):
+                print(f'任务 {job.run_id} 已取消')
+                return
+            print(f'任务 {job.run_id} 已被其他执行进程接管，不再写入本次执行结果')
+            return
+        print(f"任务 {job.run_id} 执行{'失败：' + error_message if error_message else '完成'}")
+
+
+def get_job_data(run_id, user_id):
+    """
+    查询任务状态及结果，任务不存在时返回None
+    """
+    return ExecutionJob.objects.filter(run_id=run_id, creater_id=user_id).values(
+        'run_id', 'status', 'params', 'result', 'error_message', 'attempts', 'worker', 'created', 'started',
+        'finished').first()
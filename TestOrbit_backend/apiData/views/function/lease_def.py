@@ -0,0 +1,43 @@
+"""
+基于数据库的租约
+通过带条件的UPDATE抢占租约：租约不存在、已过期或本身就是持有者时才能获取成功，多个进程同时抢占时只有一个能成功
+"""
+import datetime
+import os
+import socket
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from apiData.models import ServiceLease
+
+
+def get_process_owner():
+    """
+    当前进程的持有者标识：主机名:进程号:随机串
+    """
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def acquire_lease(name, owner, ttl):
+    """
+    获取或续期租约，ttl为租约时长（秒），返回是否持有租约
+    """
+    now = datetime.datetime.now()
+    expires = now + datetime.timedelta(seconds=ttl)
+    if ServiceLease.objects.filter(Q(owner=owner) | Q(expires__lt=now), name=name).update(owner=owner, expires=expires):
+        return True
+    try:
+        with transaction.atomic():
+            ServiceLease.objects.create(name=name, owner=owner, expires=expires)
+        return True
+    except IntegrityError:  # 租约已被其他进程持有
+        return False
+
+
+def release_lease(name, owner):
+    """
+    释放租约，其他进程可以立即获取
+    """
+    ServiceLease.objects.filter(name=name, owner=owner).delete()
@@ -1,22 +1,66 @@
-import time
-from user.models import UserCfg
-from utils.constant import RUNNING, WAITING, INTERRUPT
+import uuid
+from contextlib import contextmanager
 
-def monitor_interrupt(user_id, actuator_obj):
+from utils.cancelDef import get_cancel_registry
+from utils.constant import INTERRUPT
+
+
+@contextmanager
+def monitor_interrupt(user_id, actuator_obj, job_id=None):
+    """
+    监控中断请求：执行期间登记到中断登记表，收到中断请求时立即把执行器标记为中断，执行结束后注销
+    job_id：执行所属的批量执行任务，取消该任务时一并中断
+    """
+    run_id = actuator_obj.run_id
+
+    def on_cancel():
+        print('收到中断请求，状态:', actuator_obj.status)
+        actuator_obj.status = INTERRUPT
+
+    registry = get_cancel_registry()
+    registry.register(run_id, user_id, on_cancel, job_id)
+    try:
+        yield run_id
+    finally:
+        registry.unregister(run_id)
+
+
+@contextmanager
+def monitor_interrupt_batch(user_id, batch_state, job_id=None):
     """
-    监控线程：检查用例执行状态，处理中断请求
+    异步执行模式下整个批次只登记一次，中断时标记所有执行中的用例
+    batch_state：{'actuators': 执行中的执行器集合, 'interrupted': 是否已中断}
     """
-    while True:
-        time.sleep(3)
-        # 检查执行器状态和用户配置
-        exec_status = UserCfg.objects.filter(user_id=user_id).values_list('exec_status', flat=True).first()
-        
-        # 如果执行器已完成或用户要求中断，则停止监控
-        if actuator_obj.status not in (RUNNING, WAITING) or exec_status in (INTERRUPT, WAITING):
-            print('监控线程结束，状态:', actuator_obj.status)
-            if exec_status == INTERRUPT:
-                actuator_obj.status = INTERRUPT
-            break
-            
-        # 只有在调试模式或需要时输出状态
-        # print('monitor_interrupt', actuator_obj.status)
+    run_id = uuid.uuid4().hex
+
+    def on_cancel():
+        print('收到中断请求，中断所有执行中的用例')
+        batch_state['interrupted'] = True
+        for actuator_obj in list(batch_state['actuators']):
+            actuator_obj.status = INTERRUPT
+
+    registry = get_cancel_registry()
+    registry.register(run_id, user_id, on_cancel, job_id)
+    try:
+        yield run_id
+    finally:
+        registry.unregister(run_id)
+
+
+@contextmanager
+def monitor_interrupt_event(user_id, cancel_event, job_id=None):
+    """
+    多进程执行模式下由父进程登记，中断时设置进程间共享的cancel_event，子进程收到后中断各自执行中的用例
+    """
+    run_id = uuid.uuid4().hex
+
+    def on_cancel():
+        print('收到中断请求，通知所有执行进程中断')
+        cancel_event.set()
+
+    registry = get_cancel_registry()
+    registry.register(run_id, user_id, on_cancel, job_id)
+    try:
+        yield run_id
+    finally:
+        registry.unregister(run_id)
@@ -0,0 +1,124 @@
+"""
+用例执行计划
+执行前一次性加载用例的步骤、循环控制器子步骤、引用的用例、引用的接口步骤及断言规则，执行期间直接从内存中的计划取数据，不再逐步骤查库
+"""
+import copy
+from collections import defaultdict
+
+from apiData.models import ApiCaseStep, ApiForeachStep, AssertionRule
+from utils.constant import API_CASE, API_FOREACH
+
+
+class ExecutionPlan:
+    """
+    内存中的执行计划
+    cases：{case_id: [step, step]}，被引用的用例的步骤
+    foreach_steps：{step_id: [foreach_step, foreach_step]}，循环控制器的子步骤（数据库原始数据）
+    assertions：{step_id: [AssertionRule, AssertionRule]}，步骤启用的断言规则
+    quote_steps：{step_id: params}，接口步骤引用（quote_step_id）的步骤的参数，引用的步骤不存在时为None
+    """
+
+    def __init__(self):
+        self.cases = {}
+        self.foreach_steps = {}
+        self.assertions = {}
+        self.quote_steps = {}
+
+    def get_case_steps(self, case_id):
+        """
+        获取引用用例的步骤，每次返回副本，避免多次引用同一用例时执行结果互相覆盖，未加载时返回None
+        """
+        steps = self.cases.get(int(case_id))
+        return copy.deepcopy(steps) if steps is not None else None
+
+    def get_foreach_steps(self, step_id):
+        """
+        获取循环控制器的子步骤，未加载时返回None
+        """
+        steps = self.foreach_steps.get(step_id)
+        return copy.deepcopy(steps) if steps is not None else None
+
+    def get_assertions(self, step_id):
+        """
+        获取步骤的断言规则，不在计划中的步骤（如循环控制器的子步骤）没有断言规则
+        """
+        return self.assertions.get(step_id, [])
+
+
+def get_quote_case_id(step):
+    """
+    获取引用用例步骤引用的用例id
+    """
+    if step.get('quote_case_id'):
+        return int(step['quote_case_id'])
+    case_related = (step.get('params') or {}).get('case_related')
+    return int(case_related[-1]) if case_related else None
+
+
+def get_plan_children(step):
+    """
+    获取调试时直接传递在params中的循环控制器子步骤
+    """
+    if step.get('type') == API_FOREACH:
+        return (step.get('params') or {}).get('steps') or []
+    return []
+
+
+def load_execution_plan(case_data):
+    """
+    按层级（广度优先）加载执行计划：每一层只查询一次循环子步骤和引用用例，最后一次性查询所有步骤的断言规则
+    case_data：parse_api_case_steps获取的步骤列表
+    """
+    plan = ExecutionPlan()
+    step_ids, quote_step_ids = set(), set()
+    for step in case_data:  # 用例可能引用自身，执行中的步骤会被写入结果，所以存储副本
+        if step.get('case_id'):
+            plan.cases.setdefault(step['case_id'], []).append(copy.deepcopy(step))
+    loaded_case_ids = set(plan.cases)
+    level_steps = list(case_data)
+    while level_steps:
+        step_ids |= {step['id'] for step in level_steps if step.get('id')}
+        foreach_ids, quote_case_ids = [], set()
+        pending = list(level_steps)
+        while pending:
+            step = pending.pop()
+            pending.extend(get_plan_children(step))
+            if isinstance(quote_step_id := step.get('quote_step_id'), int):
+                quote_step_ids.add(quote_step_id)
+            if step.get('type') == API_FOREACH and step.get('id') and 'steps' not in (step.get('params') or {}):
+                foreach_ids.append(step['id'])
+            elif step.get('type') == API_CASE and (quote_case_id := get_quote_case_id(step)):
+                quote_case_ids.add(quote_case_id)
+
+        next_steps = []
+        if foreach_ids:
+            foreach_steps = defaultdict(list)
+            for foreach_step in ApiForeachStep.objects.filter(step_id__in=foreach_ids).values().order_by('id'):
+                foreach_steps[foreach_step['step_id']].append(foreach_step)
+                if foreach_step['type'] == API_CASE and (quote_case_id := get_quote_case_id(foreach_step)):
+                    quote_case_ids.add(quote_case_id)
+            plan.foreach_steps.update({step_id: foreach_steps.get(step_id, []) for step_id in foreach_ids})
+
+        if new_case_ids := quote_case_ids - loaded_case_ids:
+            loaded_case_ids |= new_case_ids
+            case_steps = {case_id: [] for case_id in new_case_ids}
+            for step in ApiCaseStep.objects.filter(case__in=new_case_ids).values(
+                    'case_id', 'step_order', 'step_name', 'type', 'status', 'results', 'id',
+                    'controller_data', 'enabled', 'params').order_by('case_id', 'step_order'):
+                case_steps[step['case_id']].append(step)
+                next_steps.append(step)
+            plan.cases.update(case_steps)
+        level_steps = next_steps
+
+    if quote_step_ids:
+        quote_params = dict(ApiCaseStep.objects.filter(id__in=quote_step_ids).values_list('id', 'params'))
+        plan.quote_steps = {step_id: quote_params[step_id] or {} if step_id in quote_params else None
+                            for step_id in quote_step_ids}
+    if step_ids:
+        assertions = {step_id: [] for step_id in step_ids}
+        for rule in AssertionRule.objects.filter(step_id__in=step_ids, enabled=True).order_by('id'):
+            assertions[rule.step_id].append(rule)
+        plan.assertions = assertions
+    print(f'执行计划加载完成：用例{len(plan.cases)}个，循环控制器{len(plan.foreach_steps)}个，'
+          f'断言步骤{sum(1 for v in plan.assertions.values() if v)}个，引用的接口步骤{len(plan.quote_steps)}个')
+    return plan
@@ -0,0 +1,182 @@
+"""
+多进程分片执行引擎
+大批量用例按历史执行耗时（最长的优先，LPT）分配到N个分片，每个分片在独立的子进程中串行执行，
+各用例的执行过程、结果及报告与 run_api_case_func 一致，父进程汇总所有分片的结果后作为同一次批量执行返回。
+子进程不能沿用父进程的数据库连接：创建进程池前父进程先关闭当前线程的连接，子进程启动时再关闭继承的连接，
+执行结束后关闭自己打开的连接；中断登记表在子进程中重新创建，父进程收到中断请求后设置进程间共享的Event，
+子进程的监听线程收到后中断执行中的用例，分片中尚未执行的用例不再执行，不依赖CANCEL_BACKEND的配置。
+spawn方式启动的子进程导入本模块时Django尚未初始化，因此模型及执行函数均在函数内导入。
+"""
+import concurrent.futures
+import datetime
+import heapq
+import multiprocessing
+import os
+import threading
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+from utils.constant import BATCH_TRIGGER
+
+DEFAULT_STEP_SECONDS = 1  # 没有任何历史耗时可参考时，按每个步骤1秒估算用例耗时
+# 汇总到批量执行结果中的报告统计字段
+SUMMARY_SUM_FIELDS = ('total_cases', 'success_cases', 'failed_cases', 'total_steps', 'success_steps')
+_cancel_event = None  # 子进程中父进程传入的中断Event
+
+
+def get_case_durations(cases_to_run):
+    """
+    估算每个用例的执行耗时（秒）：有历史报告的取平均耗时，没有的按历史每步骤平均耗时×步骤数估算
+    """
+    # 延迟导入避免循环引用
+    from django.db.models import Avg, Sum
+    from apiData.models import ReportSummary
+
+    history = {row['case_id']: row for row in ReportSummary.objects.filter(
+        case_id__in=list(cases_to_run), duration__gt=0).values('case_id').annotate(
+        avg_duration=Avg('duration'), sum_duration=Sum('duration'), sum_steps=Sum('total_steps'))}
+    total_duration = sum(row['sum_duration'] for row in history.values())
+    total_steps = sum(row['sum_steps'] for row in history.values())
+    step_seconds = total_duration / total_steps if total_steps else DEFAULT_STEP_SECONDS
+    return {case_id: history[case_id]['avg_duration'] if case_id in history
+            else max(len(case_info['case_data']), 1) * step_seconds
+            for case_id, case_info in cases_to_run.items()}
+
+
+def assign_shards(durations, shard_count):
+    """
+    最长处理时间优先（LPT）：用例按耗时从长到短依次分配给当前总耗时最短的分片
+    返回 [(估算总耗时, [case_id, ...]), ...]
+    """
+    shards = [[0, []] for _ in range(shard_count)]
+    heap = [(0, i) for i in range(shard_count)]
+    for case_id in sorted(durations, key=durations.get, reverse=True):
+        load, i = heapq.heappop(heap)
+        shards[i][0] = load + durations[case_id]
+        shards[i][1].append(case_id)
+        heapq.heappush(heap, (shards[i][0], i))
+    return [(round(load, 2), case_ids) for load, case_ids in shards if case_ids]
+
+
+def watch_cancel_event(cancel_event, user_id):
+    """
+    子进程的监听线程：等待父进程设置中断Event，中断本进程中该用户执行中的用例
+    """
+    # 延迟导入避免循环引用
+    from utils.cancelDef import get_cancel_registry
+
+    cancel_event.wait()
+    get_cancel_registry().handle({'run_id': None, 'user_id': user_id})
+
+
+def init_shard_process(cancel_event=None, user_id=None):
+    """
+    子进程初始化：spawn方式需要先初始化Django；关闭从父进程继承的数据库连接，重新创建中断登记表及SQL步骤的连接池，
+    启动监听父进程中断Event的线程
+    """
+    global _cancel_event
+    if not apps.ready:
+        django.setup()
+    # 延迟导入避免循环引用
+    from utils.cancelDef import reset_cancel_registry
+    from utils.dbPoolDef import reset_db_pool
+
+    connections.close_all()
+    reset_cancel_registry()
+    reset_db_pool()
+    _cancel_event = cancel_event
+    if cancel_event is not None:
+        threading.Thread(target=watch_cancel_event, args=(cancel_event, user_id), daemon=True).start()
+
+
+def run_shard(shard_cases, user_id, trigger, job_id=None):
+    """
+    在子进程中串行执行一个分片的用例，返回与handleGroupbatch串行模式相同格式的结果列表及分片的执行耗时
+    shard_cases：[(case_id, case_info), ...]
+    """
+    # 延迟导入避免循环引用
+    from .group_def import run_api_case_func
+
+    start_time = datetime.datetime.now()
+    results = []
+    try:
+        for case_id, case_info in shard_cases:
+            item = {'case_id': case_id, 'case_name': case_info['case_name'], 'env_id': case_info['env_id']}
+            if _cancel_event is not None and _cancel_event.is_set():
+                item.update({'status': 'failed', 'error': '执行已中断'})
+                results.append(item)
+                continue
+            try:
+                print(f"进程{os.getpid()}开始执行用例ID {case_id} - {case_info['case_name']}")
+                result = run_api_case_func(case_info['case_data'], user_id, {
+                    'envir_id': case_info['env_id'], 'failed_stop': False, 'trigger': trigger, 'job_id': job_id})
+                item.update({'status': 'success', 'result': result})
+            except Exception as e:
+                item.update({'status': 'failed', 'error': str(e)})
+            results.append(item)
+    finally:
+        connections.close_all()  # 子进程会被进程池复用，执行完一个分片后关闭打开的数据库连接
+    return results, round((datetime.datetime.now() - start_time).total_seconds(), 2)
+
+
+def merge_summaries(results):
+    """
+    汇总各用例报告的统计数据
+    """
+    summary = dict.fromkeys(SUMMARY_SUM_FIELDS, 0)
+    for item in results:
+        if isinstance(result := item.get('result'), dict) and isinstance(result.get('summary'), dict):
+            for key in SUMMARY_SUM_FIELDS:
+                summary[key] += result['summary'].get(key) or 0
+        elif item['status'] == 'failed':
+            summary['total_cases'] += 1
+            summary['failed_cases'] += 1
+    success_rate = round(summary['success_cases'] / summary['total_cases'] * 100, 2) if summary['total_cases'] else 0
+    summary.update(success_rate=success_rate, success_rate_str=f'{success_rate}%')
+    return summary
+
+
+def run_cases_in_processes(cases_to_run, user_id, processes=None, trigger=BATCH_TRIGGER, job_id=None):
+    """
+    以多进程分片执行多个用例
+    cases_to_run：{case_id: {'case_data': 步骤列表, 'env_id': 环境id, 'case_name': 用例名称}}
+    返回 (与handleGroupbatch其他模式相同格式的结果列表, 各分片的执行信息)
+    """
+    processes = int(processes or getattr(settings, 'PROCESS_RUN_WORKERS', None) or os.cpu_count() or 1)
+    durations = get_case_durations(cases_to_run)
+    shards = assign_shards(durations, max(min(processes, len(cases_to_run)), 1))
+    print(f'采用多进程模式执行测试用例，进程数：{len(shards)}，各分片估算耗时：{[load for load, _ in shards]}')
+
+    # 延迟导入避免循环引用
+    from .monitor_def import monitor_interrupt_event
+
+    context = multiprocessing.get_context(getattr(settings, 'PROCESS_RUN_START_METHOD', None))
+    cancel_event = context.Event()
+    # 子进程不能与父进程共用数据库连接，fork前关闭当前线程的连接，父进程后续查询时会重新连接
+    connections.close_all()
+    outcomes, shard_info = {}, []
+    with monitor_interrupt_event(user_id, cancel_event, job_id), concurrent.futures.ProcessPoolExecutor(
+            max_workers=len(shards), mp_context=context, initializer=init_shard_process,
+            initargs=(cancel_event, user_id)) as executor:
+        future_to_shard = {
+            executor.submit(run_shard, [(case_id, cases_to_run[case_id]) for case_id in case_ids], user_id, trigger,
+                            job_id):
+                (load, case_ids) for load, case_ids in shards}
+        for future in concurrent.futures.as_completed(future_to_shard):
+            load, case_ids = future_to_shard[future]
+            try:
+                shard_results, execution_time = future.result()
+            except Exception as e:
+                # 子进程异常退出时，该分片的用例都标记为失败
+                print(f'分片{case_ids}执行异常: {str(e)}')
+                shard_results, execution_time = [{
+                    'case_id': case_id, 'case_name': cases_to_run[case_id]['case_name'],
+                    'env_id': cases_to_run[case_id]['env_id'], 'status': 'failed', 'error': f'执行进程异常：{str(e)}'
+                } for case_id in case_ids], None
+            outcomes.update((item['case_id'], item) for item in shard_results)
+            shard_info.append({'case_ids': case_ids, 'estimated_time': load, 'execution_time': execution_time})
+    # 按提交的用例顺序返回结果
+    return [outcomes[case_id] for case_id in cases_to_run], shard_info
@@ -0,0 +1,138 @@
+"""
+单次执行的报告
+顶层步骤执行完成时即汇总到报告中，执行结束后生成一条带run_id的报告并直接返回，不再从数据库重新读取用例和步骤的执行结果
+报告的统计数据同时写入ReportSummary，报告列表只查询摘要表；用例、步骤详情按需从report_data中分页读取
+"""
+import datetime
+
+from django.db import transaction
+
+from apiData.models import Report, ReportSummary
+from utils.artifactDef import offload_artifacts
+from utils.constant import SUCCESS, FAILED, MANUAL_TRIGGER
+
+# 报告摘要中与report_data['summary']同名的统计字段
+SUMMARY_COUNT_FIELDS = ('total_cases', 'success_cases', 'failed_cases', 'total_steps', 'success_steps', 'success_rate')
+
+
+class ReportBuilder:
+    """
+    报告生成器，每次执行（run_api_case_func）创建一个
+    cases：{case_id: {'steps': [步骤结果], 'status': 用例状态, 'start_time': 开始时间, 'end_time': 结束时间}}
+    """
+
+    def __init__(self, run_id, user_id, trigger=MANUAL_TRIGGER, env_id=None):
+        self.run_id = run_id
+        self.user_id = user_id
+        self.trigger = trigger
+        self.env_id = env_id
+        self.project_id = None
+        self.cases = {}
+        self.start_time = datetime.datetime.now()
+
+    def start_case(self, case_id, project_id=None):
+        self.project_id = self.project_id or project_id
+        self.cases[case_id] = {'steps': [], 'status': None, 'start_time': datetime.datetime.now(), 'end_time': None}
+
+    def add_step(self, case_id, step):
+        """
+        记录执行完成的顶层步骤，结果与写入ApiCaseStep的结果一致
+        """
+        if case_id not in self.cases:
+            self.start_case(case_id)
+        self.cases[case_id]['steps'].append({
+            'id': step.get('id'),
+            'name': step.get('step_name'),
+            'order': step.get('step_order'),
+            'type': step.get('type'),
+            'enabled': step.get('enabled'),
+            'status': step.get('status'),
+            'results': step['data'] if step.get('data') else step.get('results')
+        })
+
+    def set_dag(self, case_id, dag):
+        """
+        记录步骤并发执行时的依赖图及关键路径
+        """
+        if case_id not in self.cases:
+            self.start_case(case_id)
+        self.cases[case_id]['dag'] = dag
+
+    def finish_case(self, case_id, status, end_time=None):
+        if case_id not in self.cases:
+            self.start_case(case_id)
+        self.cases[case_id].update({'status': status, 'end_time': end_time or datetime.datetime.now()})
+
+    def build(self):
+        """
+        生成报告数据
+        """
+        report_data = {
+            'run_id': self.run_id,
+            'execution_time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'cases': [],
+            'summary': {
+                'total_cases': len(self.cases),
+                'success_cases': 0,
+                'failed_cases': 0,
+                'total_steps': 0,
+                'success_steps': 0,
+                'success_rate': 0,
+                'duration': round((datetime.datetime.now() - self.start_time).total_seconds(), 2)
+            }
+        }
+        for case_id, case in self.cases.items():
+            steps_info = case['steps']
+            enabled_steps = len([s for s in steps_info if s['enabled']])
+            success_steps = len([s for s in steps_info if s['status'] == SUCCESS and s['enabled']])
+            success_rate = round((success_steps / enabled_steps * 100) if enabled_steps > 0 else 0, 2)
+            # 执行时间(秒)
+            spend_time = round((case['end_time'] - case['start_time']).total_seconds(), 2) if case['end_time'] else 0
+            report_data['summary']['total_steps'] += len(steps_info)
+            report_data['summary']['success_steps'] += success_steps
+            report_data['cases'].append({
+                'id': case_id,
+                'status': case['status'],
+                'statistics': {
+                    'total_steps': len(steps_info),
+                    'enabled_steps': enabled_steps,
+                    'success_steps': success_steps,
+                    'success_rate': success_rate,
+                    'success_rate_str': f'{success_rate}%'
+                },
+                'steps': steps_info,
+                'spend_time': spend_time
+            })
+            if 'dag' in case:
+                report_data['cases'][-1]['dag'] = case['dag']
+            if case['status'] == SUCCESS:
+                report_data['summary']['success_cases'] += 1
+            elif case['status'] == FAILED:
+                report_data['summary']['failed_cases'] += 1
+
+        if total_cases := report_data['summary']['total_cases']:
+            success_rate = round(report_data['summary']['success_cases'] / total_cases * 100, 2)
+            report_data['summary']['success_rate'] = success_rate
+            report_data['summary']['success_rate_str'] = f"{success_rate}%"
+        return report_data
+
+    def save(self):
+        """
+        写入本次执行的报告，返回报告数据，没有执行任何用例时返回None
+        写入数据库的报告中较大的请求/响应内容替换为制品引用，返回的报告数据仍为原内容
+        """
+        if not self.cases:
+            return None
+        report_data = self.build()
+        report_name = f"API测试报告 - {datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        summary = report_data['summary']
+        with transaction.atomic():
+            report = Report.objects.create(name=report_name, run_id=self.run_id,
+                                           report_data=offload_artifacts(report_data), creater_id=self.user_id, project_id=self.project_id)
+            ReportSummary.objects.create(
+                report=report, name=report_name, run_id=self.run_id, trigger=self.trigger, env_id=self.env_id,
+                case_id=next(iter(self.cases)) if len(self.cases) == 1 else None,
+                creater_id=self.user_id, project_id=self.project_id, duration=summary['duration'],
+                **{key: summary[key] for key in SUMMARY_COUNT_FIELDS})
+        print(f'成功创建执行报告: {report_name}')
+        return report_data
@@ -8,20 +8,49 @@
 """
 
 import datetime
+import heapq
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
-from django.db import transaction
+
+from django.conf import settings
+from django.db import transaction, connection
+from django.db.models import F, Q
 
 from apiData.models import ScheduledTask, ApiCase
 from user.models import ExpendUser
+from utils.constant import SCHEDULED_TRIGGER
+from utils.cronDef import get_cron_expression
 from .group_batch import handleGroupbatch, BatchExecutionException
+from .lease_def import get_process_owner, acquire_lease, release_lease
+
+DEFAULT_MAX_WORKERS = 4  # 未配置SCHEDULER_MAX_WORKERS时，同时执行的定时任务数
+DEFAULT_SYNC_INTERVAL = 10  # 未配置SCHEDULER_SYNC_INTERVAL时，从数据库全量同步任务的间隔（秒）
+DEFAULT_LEASE_TTL = 30  # 未配置SCHEDULER_LEASE_TTL时，主节点租约及任务执行租约的时长（秒），每1/3时长续期一次
+SCHEDULER_LEASE_NAME = 'task_scheduler'
+
+
+def get_next_run_time(task, now):
+    """
+    周期任务返回now之后的下一次预定时间，错过的多次执行合并为一次；一次性任务返回None
+    """
+    if task.cron_expression:
+        return get_cron_expression(task.cron_expression).get_next(now)
+    if task.is_recurring and task.recurring_interval:
+        interval = datetime.timedelta(minutes=task.recurring_interval)
+        missed = (now - task.scheduled_time) // interval + 1 if now >= task.scheduled_time else 1
+        return task.scheduled_time + interval * missed
+    return None
 
 
 class TaskScheduler:
     """
     定时任务调度器
-    负责管理和执行定时任务
+    按预定时间维护最小堆，调度线程休眠到最近一个任务的预定时间，到期的任务交给有上限的线程池执行，慢任务不会推迟其他任务；
+    任务创建、修改后通过notify加入堆中并唤醒调度线程，另外每隔SCHEDULER_SYNC_INTERVAL秒从数据库全量同步一次（兼容其他进程修改的任务）
+    多进程部署时每个进程都会启动调度器，通过数据库租约选举唯一的主节点负责调度，主节点退出后其他进程在租约过期后接管；
+    任务通过带预定时间条件的UPDATE认领，执行期间定时续期任务的执行租约，租约过期的执行中任务由主节点接管
     """
     
     _instance = None
@@ -42,71 +71,231 @@ class TaskScheduler:
         self._initialized = True
         self._running = False
         self._scheduler_thread = None
+        self._executor = None
+        self._heap = []  # [(预定时间, 任务id)]，任务修改后旧的记录在出堆时被丢弃
+        self._cond = threading.Condition()
+        self._next_sync = 0
+        self._running_tasks = {}  # {任务id: 执行中的次数}
+        self._queued_tasks = set()  # 等待上次执行结束后再执行的任务
+        self.owner = get_process_owner()
+        self.lease_ttl = getattr(settings, 'SCHEDULER_LEASE_TTL', DEFAULT_LEASE_TTL)
+        self._is_leader = False
+        self._next_renew = 0
     
     def start(self):
         """启动任务调度器"""
         if not self._running:
             self._running = True
+            self._executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'SCHEDULER_MAX_WORKERS', DEFAULT_MAX_WORKERS),
+                thread_name_prefix='scheduled-task')
             self._scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
             self._scheduler_thread.start()
             print("定时任务调度器已启动")
     
     def stop(self):
         """停止任务调度器"""
-        self._running = False
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
         if self._scheduler_thread:
             self._scheduler_thread.join()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        if self._is_leader:
+            release_lease(SCHEDULER_LEASE_NAME, self.owner)
+            self._is_leader = False
         print("定时任务调度器已停止")
     
+    def notify(self, task_id):
+        """
+        任务创建或修改后调用：把任务的预定时间加入堆中，并唤醒调度线程重新计算休眠时间
+        """
+        if not self._running or not self._is_leader:  # 非主节点不调度，由主节点定时同步
+            return
+        task = ScheduledTask.objects.filter(id=task_id, status='pending').values('scheduled_time').first()
+        with self._cond:
+            if task:
+                heapq.heappush(self._heap, (task['scheduled_time'], task_id))
+            self._cond.notify()
+    
+    def _sync_tasks(self):
+        """
+        从数据库重新加载所有待执行的任务
+        """
+        heap = list(ScheduledTask.objects.filter(status='pending').values_list('scheduled_time', 'id'))
+        heapq.heapify(heap)
+        with self._cond:
+            self._heap = heap
+        self._next_sync = time.monotonic() + getattr(settings, 'SCHEDULER_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL)
+    
+    def _renew(self):
+        """
+        获取或续期主节点租约，续期本进程执行中任务的租约，主节点同时接管租约过期的任务
+        """
+        try:
+            is_leader = acquire_lease(SCHEDULER_LEASE_NAME, self.owner, self.lease_ttl)
+        except Exception as e:
+            print(f"❌ 续期调度主节点租约失败: {str(e)}")
+            is_leader = False
+        if is_leader and not self._is_leader:
+            print(f"👑 当前进程成为定时任务调度主节点: {self.owner}")
+            self._next_sync = 0
+        elif self._is_leader and not is_leader:
+            print("⚠️ 当前进程已不是定时任务调度主节点，停止调度")
+            with self._cond:
+                self._heap = []
+        self._is_leader = is_leader
+        self._next_renew = time.monotonic() + self.lease_ttl / 3
+        
+        with self._cond:
+            running_ids = list(self._running_tasks)
+        if running_ids:
+            ScheduledTask.objects.filter(id__in=running_ids, lease_owner=self.owner).update(
+                lease_expires=datetime.datetime.now() + datetime.timedelta(seconds=self.lease_ttl))
+        if self._is_leader:
+            self._take_over_orphans(running_ids)
+    
+    def _take_over_orphans(self, running_ids):
+        """
+        接管执行租约已过期（执行进程已退出）的任务：一次性任务重新执行，周期任务清除租约后按预定时间继续调度
+        """
+        now = datetime.datetime.now()
+        orphans = ScheduledTask.objects.filter(
+            Q(lease_expires__lt=now) | Q(status='running', lease_owner=None)).exclude(id__in=running_ids).values(
+            'id', 'status', 'lease_owner', 'lease_expires')
+        for task in orphans:
+            # 租约未被修改时才接管，避免与续期或执行结束同时发生
+            task_query = ScheduledTask.objects.filter(**task)
+            if task['status'] == 'running':
+                if task_query.update(status='pending', scheduled_time=now, lease_owner=None, lease_expires=None,
+                                     error_message='执行进程已退出，重新执行'):
+                    print(f"🔁 接管任务 {task['id']}，原执行进程 {task['lease_owner']} 已退出，重新执行")
+                    with self._cond:
+                        heapq.heappush(self._heap, (now, task['id']))
+            else:
+                task_query.update(lease_owner=None, lease_expires=None)
+    
+    def _get_wait_seconds(self):
+        """
+        距离下次续期租约、最近一个任务的预定时间或下次全量同步的秒数
+        """
+        wait = self._next_renew - time.monotonic()
+        if self._is_leader:
+            wait = min(wait, self._next_sync - time.monotonic())
+            if self._heap:
+                wait = min(wait, (self._heap[0][0] - datetime.datetime.now()).total_seconds())
+        return wait
+    
     def _run_scheduler(self):
         """调度器主循环"""
         while self._running:
             try:
-                # 检查待执行的任务
-                current_time = datetime.datetime.now()
-                # print(f"🕐 [{current_time.strftime('%Y-%m-%d %H:%M:%S')}] 定时任务调度器正在检查待执行任务...")
-                
-                pending_tasks = ScheduledTask.objects.filter(
-                    status='pending',
-                    scheduled_time__lte=current_time
-                )
-                
-                # print(f"📊 发现 {pending_tasks.count()} 个待执行任务")
-                
-                for task in pending_tasks:
-                    print(f"⏰ 准备执行任务 {task.id}: {task.task_name}")
-                    print(f"   预定时间: {task.scheduled_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                    print(f"   当前时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                    print(f"   时间差: {(current_time - task.scheduled_time).total_seconds():.1f}秒")
-                    self._execute_task(task)
-                
-                # if pending_tasks.count() == 0:
-                #     print("✅ 当前没有待执行的任务")
-                
-                # 每1分钟检查一次（60秒） - 为了测试方便
-                # print(f"💤 调度器休眠1分钟，下次检查时间: {(current_time + datetime.timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S')}")
-                time.sleep(60)  # 1分钟 = 60秒
+                if time.monotonic() >= self._next_renew:
+                    self._renew()
+                if self._is_leader and time.monotonic() >= self._next_sync:
+                    self._sync_tasks()
+                with self._cond:
+                    if (wait := self._get_wait_seconds()) > 0:
+                        self._cond.wait(wait)
+                        continue
+                    if not self._is_leader or not self._heap:
+                        continue
+                    scheduled_time, task_id = heapq.heappop(self._heap)
+                self._dispatch(task_id, scheduled_time)
             except Exception as e:
                 print(f"❌ 调度器错误: {str(e)}")
-                time.sleep(60)
+                time.sleep(1)
+        connection.close()
+    
+    def _dispatch(self, task_id, scheduled_time):
+        """
+        认领到期的任务并提交到线程池执行，周期任务同时计算下一次预定时间
+        """
+        task = ScheduledTask.objects.filter(id=task_id, status='pending', scheduled_time=scheduled_time).first()
+        if not task:  # 任务已被取消、修改或已由其他进程执行
+            return
+        now = datetime.datetime.now()
+        delay = (now - scheduled_time).total_seconds()
+        misfired = delay > task.misfire_grace_time and task.misfire_policy == 'skip'
+        next_time = get_next_run_time(task, now) if task.is_periodic else None
+        # 上次执行还未结束（本进程执行中，或其他进程持有未过期的执行租约）
+        with self._cond:
+            local_running = bool(self._running_tasks.get(task_id))
+        overlapping = task.is_periodic and task.overlap_policy != 'allow' and (
+            local_running or bool(task.lease_expires and task.lease_expires > now))
+        run = not misfired and not overlapping
+        
+        if task.is_periodic:
+            # 周期任务保持待执行状态，预定时间更新为下一次；cron表达式不会再触发时结束任务
+            update_data = {'scheduled_time': next_time} if next_time else {'status': 'completed'}
+        elif run:
+            update_data = {'status': 'running'}
+        else:
+            update_data = {'status': 'failed', 'error_message': f'已错过预定执行时间{delay:.0f}秒，跳过执行'}
+        if run:
+            update_data.update(lease_owner=self.owner, lease_expires=now + datetime.timedelta(seconds=self.lease_ttl))
+        if not ScheduledTask.objects.filter(id=task_id, status='pending', scheduled_time=scheduled_time).update(
+                **update_data):
+            return
+        if next_time:
+            with self._cond:
+                heapq.heappush(self._heap, (next_time, task_id))
+        
+        if misfired:
+            print(f"⏭️ 任务 {task_id} 错过预定时间{delay:.0f}秒，按策略跳过本次执行")
+            return
+        with self._cond:
+            if overlapping:
+                if task.overlap_policy == 'queue' and local_running:
+                    self._queued_tasks.add(task_id)
+                    print(f"⏳ 任务 {task_id} 上次执行还未结束，结束后再执行")
+                else:
+                    print(f"⏭️ 任务 {task_id} 上次执行还未结束，跳过本次执行")
+                return
+            self._running_tasks[task_id] = self._running_tasks.get(task_id, 0) + 1
+        print(f"⏰ 准备执行任务 {task.id}: {task.task_name}")
+        print(f"   预定时间: {scheduled_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"   时间差: {delay:.1f}秒")
+        self._executor.submit(self._run_task, task)
+    
+    def _run_task(self, task):
+        """
+        线程池中执行任务，执行结束后处理等待执行的同一任务
+        """
+        try:
+            while True:
+                try:
+                    self._execute_task(task)
+                except Exception as e:
+                    print(f"💥 定时任务执行异常: {task.task_name} - {str(e)}")
+                with self._cond:
+                    if task.id not in self._queued_tasks or not self._running:
+                        self._running_tasks[task.id] -= 1
+                        if not self._running_tasks[task.id]:
+                            del self._running_tasks[task.id]
+                        return
+                    self._queued_tasks.discard(task.id)
+        finally:
+            connection.close()  # 线程池中的线程有独立的数据库连接，执行结束后关闭
     
     def _execute_task(self, task: ScheduledTask):
         """执行单个定时任务"""
+        # 只更新执行相关的字段，避免覆盖调度线程已更新的下一次预定时间
+        start_time = datetime.datetime.now()
+        ScheduledTask.objects.filter(id=task.id).update(
+            actual_start_time=start_time, actual_end_time=None, execution_count=F('execution_count') + 1,
+            lease_owner=self.owner, lease_expires=start_time + datetime.timedelta(seconds=self.lease_ttl))
+        result_data, error_message = None, None
         try:
-            # 更新任务状态为执行中
-            task.status = 'running'
-            task.actual_start_time = datetime.datetime.now()
-            task.execution_count += 1
-            task.save()
-            
             print(f"🚀 开始执行定时任务: {task.task_name} (ID: {task.id})")
-            print(f"   预定时间: {task.scheduled_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"   实际开始: {task.actual_start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"   实际开始: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
             
             # 准备批量执行参数
             batch_params = {
                 'case_ids': task.case_ids,
-                'parallel': task.parallel
+                'parallel': task.parallel,
+                'trigger': SCHEDULED_TRIGGER
             }
             
             # 使用第一个负责人的ID作为执行用户（实际项目中可能需要更复杂的逻辑）
@@ -114,32 +303,113 @@ class TaskScheduler:
             
             # 执行批量任务
             result_data = handleGroupbatch(batch_params, user_id)
-            
-            # 更新任务完成状态
-            task.status = 'completed'
-            task.actual_end_time = datetime.datetime.now()
-            task.execution_result = result_data
-            task.save()
-            
-            execution_duration = (task.actual_end_time - task.actual_start_time).total_seconds()
-            print(f"✅ 定时任务执行完成: {task.task_name}")
-            print(f"   执行耗时: {execution_duration:.2f}秒")
-            
         except BatchExecutionException as e:
             # 处理批量执行异常
-            task.status = 'failed'
-            task.actual_end_time = datetime.datetime.now()
-            task.error_message = e.message
-            task.save()
+            error_message = e.message
             print(f"❌ 定时任务执行失败: {task.task_name} - {e.message}")
-            
         except Exception as e:
             # 处理其他异常
-            task.status = 'failed'
-            task.actual_end_time = datetime.datetime.now()
-            task.error_message = str(e)
-            task.save()
+            error_message = str(e)
             print(f"💥 定时任务执行异常: {task.task_name} - {str(e)}")
+        
+        end_time = datetime.datetime.now()
+        update_data = {'actual_end_time': end_time, 'execution_result': result_data, 'error_message': error_message,
+                       'lease_owner': None, 'lease_expires': None}
+        if not task.is_periodic:  # 周期任务执行结束后保持待执行状态
+            update_data['status'] = 'failed' if error_message else 'completed'
+        # 执行租约仍属于本进程时才写入结果，租约过期被接管的任务由接管后的执行写入
+        expected_status = 'pending' if task.is_periodic else 'running'
+        if not ScheduledTask.objects.filter(
+                Q(lease_owner=self.owner) | Q(lease_owner=None, status=expected_status), id=task.id).update(
+                **update_data):
+            print(f"⚠️ 定时任务 {task.task_name} 已被其他进程接管，不再写入本次执行结果")
+            return
+        if not error_message:
+            print(f"✅ 定时任务执行完成: {task.task_name}")
+            print(f"   执行耗时: {(end_time - start_time).total_seconds():.2f}秒")
+
+
+def parse_schedule_options(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    解析周期执行相关的参数
+    
+    Args:
+        request_data: 请求数据，可选参数：cron（cron表达式）、recurring_interval（重复间隔，分钟）、
+            misfire_policy、misfire_grace_time、overlap_policy
+        
+    Returns:
+        Dict: ScheduledTask对应字段的值
+        
+    Raises:
+        ValueError: 参数验证失败
+    """
+    cron_expression = (request_data.get('cron') or '').strip() or None
+    if cron_expression:
+        get_cron_expression(cron_expression)  # 表达式错误时抛出ValueError
+    
+    recurring_interval = request_data.get('recurring_interval')
+    if recurring_interval is not None and (not isinstance(recurring_interval, int) or recurring_interval <= 0):
+        raise ValueError("recurring_interval必须是正整数（分钟）")
+    
+    misfire_policy = request_data.get('misfire_policy', 'run_once')
+    if misfire_policy not in dict(ScheduledTask.MISFIRE_POLICY_CHOICES):
+        raise ValueError(f"misfire_policy必须是{list(dict(ScheduledTask.MISFIRE_POLICY_CHOICES))}之一")
+    
+    overlap_policy = request_data.get('overlap_policy', 'skip')
+    if overlap_policy not in dict(ScheduledTask.OVERLAP_POLICY_CHOICES):
+        raise ValueError(f"overlap_policy必须是{list(dict(ScheduledTask.OVERLAP_POLICY_CHOICES))}之一")
+    
+    misfire_grace_time = request_data.get('misfire_grace_time', 60)
+    if not isinstance(misfire_grace_time, int) or misfire_grace_time < 0:
+        raise ValueError("misfire_grace_time必须是非负整数（秒）")
+    
+    return {
+        'cron_expression': cron_expression,
+        'is_recurring': bool(cron_expression or recurring_interval),
+        'recurring_interval': recurring_interval,
+        'misfire_policy': misfire_policy,
+        'misfire_grace_time': misfire_grace_time,
+        'overlap_policy': overlap_policy
+    }
+
+
+def parse_scheduled_time(request_data: Dict[str, Any], cron_expression: str = None) -> datetime.datetime:
+    """
+    解析预定执行时间
+    设置了cron表达式时startTime可选，预定时间为startTime（未传时为当前时间）之后第一个满足表达式的时间
+    
+    Raises:
+        ValueError: 参数验证失败
+    """
+    start_time_str = request_data.get('startTime')
+    if not start_time_str and not cron_expression:
+        raise ValueError("缺少必要参数: startTime")
+    
+    current_time = datetime.datetime.now()
+    scheduled_time = current_time
+    if start_time_str:
+        # 解析时间字符串，使用ISO 8601格式：2025-08-26T11:00:00
+        try:
+            scheduled_time = datetime.datetime.fromisoformat(start_time_str)
+            
+            # 由于项目设置USE_TZ=False，使用naive datetime
+            if scheduled_time.tzinfo is not None:
+                # 如果有时区信息，转换为本地时间并移除时区信息
+                scheduled_time = scheduled_time.replace(tzinfo=None)
+                
+        except ValueError:
+            raise ValueError("startTime格式错误，请使用ISO 8601格式：'YYYY-MM-DDTHH:MM:SS'，例如：'2025-08-26T11:00:00'")
+        
+        # 检查时间是否在未来
+        if scheduled_time <= current_time:
+            raise ValueError("预定时间必须是未来时间")
+    
+    if cron_expression:
+        scheduled_time = get_cron_expression(cron_expression).get_next(
+            scheduled_time - datetime.timedelta(seconds=1))
+        if scheduled_time is None:
+            raise ValueError("cron表达式没有可执行的时间")
+    return scheduled_time
 
 
 def create_scheduled_task(request_data: Dict[str, Any], creator_id: int) -> Dict[str, Any]:
@@ -157,8 +427,8 @@ def create_scheduled_task(request_data: Dict[str, Any], creator_id: int) -> Dict
         ValueError: 参数验证失败
     """
     
-    # 验证必要参数
-    required_fields = ['case_ids', 'parallel', 'owner_ids', 'startTime']
+    # 验证必要参数，设置了cron表达式时startTime可选
+    required_fields = ['case_ids', 'parallel', 'owner_ids']
     for field in required_fields:
         if field not in request_data:
             raise ValueError(f"缺少必要参数: {field}")
@@ -166,7 +436,6 @@ def create_scheduled_task(request_data: Dict[str, Any], creator_id: int) -> Dict
     case_ids = request_data['case_ids']
     parallel = request_data['parallel']
     owner_ids = request_data['owner_ids']
-    start_time_str = request_data['startTime']
     
     # 验证参数类型和值
     if not isinstance(case_ids, list) or not case_ids:
@@ -178,22 +447,9 @@ def create_scheduled_task(request_data: Dict[str, Any], creator_id: int) -> Dict
     if not isinstance(owner_ids, list) or not owner_ids:
         raise ValueError("owner_ids必须是非空列表")
     
-    # 解析时间字符串，使用ISO 8601格式：2025-08-26T11:00:00
-    try:
-        scheduled_time = datetime.datetime.fromisoformat(start_time_str)
-        
-        # 由于项目设置USE_TZ=False，使用naive datetime
-        if scheduled_time.tzinfo is not None:
-            # 如果有时区信息，转换为本地时间并移除时区信息
-            scheduled_time = scheduled_time.replace(tzinfo=None)
-            
-    except ValueError:
-        raise ValueError("startTime格式错误，请使用ISO 8601格式：'YYYY-MM-DDTHH:MM:SS'，例如：'2025-08-26T11:00:00'")
-    
-    # 检查时间是否在未来
-    current_time = datetime.datetime.now()
-    if scheduled_time <= current_time:
-        raise ValueError("预定时间必须是未来时间")
+    # 解析周期执行参数及预定执行时间
+    schedule_options = parse_schedule_options(request_data)
+    scheduled_time = parse_scheduled_time(request_data, schedule_options['cron_expression'])
     
     # 验证测试用例是否存在
     existing_cases = ApiCase.objects.filter(id__in=case_ids)
@@ -219,8 +475,10 @@ def create_scheduled_task(request_data: Dict[str, Any], creator_id: int) -> Dict
             parallel=parallel,
             owner_ids=owner_ids,
             scheduled_time=scheduled_time,
-            creater_id=creator_id
+            creater_id=creator_id,
+            **schedule_options
         )
+        transaction.on_commit(lambda: TaskScheduler().notify(task.id))
     
     return {
         'task_id': task.id,
@@ -228,7 +486,9 @@ def create_scheduled_task(request_data: Dict[str, Any], creator_id: int) -> Dict
         'scheduled_time': task.scheduled_time.strftime('%Y-%m-%d %H:%M:%S'),
         'case_count': len(case_ids),
         'execution_mode': '并行' if parallel == 1 else '串行',
-        'owners': list(existing_users.values_list('username', flat=True))
+        'owners': list(existing_users.values_list('username', flat=True)),
+        'cron_expression': task.cron_expression,
+        'recurring_interval': task.recurring_interval
     }
 
 
@@ -273,6 +533,12 @@ def get_scheduled_tasks(user_id: int, status_filter: str = None) -> List[Dict[st
             'status': task.status,
             'status_display': dict(ScheduledTask.TASK_STATUS_CHOICES)[task.status],
             'execution_count': task.execution_count,
+            'is_recurring': task.is_recurring,
+            'recurring_interval': task.recurring_interval,
+            'cron_expression': task.cron_expression,
+            'misfire_policy': task.misfire_policy,
+            'misfire_grace_time': task.misfire_grace_time,
+            'overlap_policy': task.overlap_policy,
             'created': task.created.strftime('%Y-%m-%d %H:%M:%S'),
             'creater': task.creater.username if task.creater else '未知'
         }
@@ -316,14 +582,14 @@ def cancel_scheduled_task(task_id: int, user_id: int) -> Dict[str, Any]:
             owner_ids__contains=[user_id]
         )
         task_name = task.task_name
-        # 只能取消pending状态的任务
-        if task.status in ['pending']:
-            task.delete()
+        # 只能取消pending状态的任务，带状态条件删除，避免删除调度器刚开始执行的任务
+        if task.status in ['pending'] and ScheduledTask.objects.filter(id=task.id, status='pending').delete()[0]:
             return {
             'success': True,
             'message': f"任务 '{task_name}' 已取消"
         }
         else:
+            task.refresh_from_db(fields=['status'])
             raise ValueError(f"任务状态为 {task.get_status_display()}，无法取消")
     except ScheduledTask.DoesNotExist:
         raise ValueError("任务不存在或无权限操作")
@@ -346,7 +612,7 @@ def update_scheduled_task(task_id: int, user_id: int, update_data: Dict[str, Any
     """
     
     # 验证必要参数
-    required_fields = ['case_ids', 'parallel', 'owner_ids', 'startTime']
+    required_fields = ['case_ids', 'parallel', 'owner_ids']
     missing_fields = []
     
     for field in required_fields:
@@ -371,7 +637,6 @@ def update_scheduled_task(task_id: int, user_id: int, update_data: Dict[str, Any
         case_ids = update_data['case_ids']
         parallel = update_data['parallel']
         owner_ids = update_data['owner_ids']
-        start_time_str = update_data['startTime']
         
         # 验证测试用例ID列表
         if not isinstance(case_ids, list) or not case_ids:
@@ -397,32 +662,27 @@ def update_scheduled_task(task_id: int, user_id: int, update_data: Dict[str, Any
             missing_ids = set(owner_ids) - set(existing_users.values_list('id', flat=True))
             raise ValueError(f"以下用户不存在或已被禁用: {list(missing_ids)}")
         
-        # 验证预定时间
-        try:
-            scheduled_time = datetime.datetime.fromisoformat(start_time_str)
-            
-            # 移除时区信息（如果有）
-            if scheduled_time.tzinfo is not None:
-                scheduled_time = scheduled_time.replace(tzinfo=None)
-                
-        except ValueError:
-            raise ValueError("startTime格式错误，请使用ISO 8601格式：'YYYY-MM-DDTHH:MM:SS'")
-        
-        # 检查时间是否在未来
-        current_time = datetime.datetime.now()
-        if scheduled_time <= current_time:
-            raise ValueError("预定时间必须是未来时间")
+        # 验证周期执行参数及预定时间
+        schedule_options = parse_schedule_options(update_data)
+        scheduled_time = parse_scheduled_time(update_data, schedule_options['cron_expression'])
         
-        # 执行更新
+        # 执行更新，带状态及预定时间条件更新，调度器已开始执行该任务时不允许修改
+        old_scheduled_time = task.scheduled_time
         task.case_ids = case_ids
         task.parallel = parallel
-        task.execution_mode = 'parallel' if parallel == 1 else 'serial'
         task.owner_ids = owner_ids
         task.scheduled_time = scheduled_time
         task.task_name = f"API用例定时任务_{scheduled_time.strftime('%Y-%m-%d %H:%M:%S')}"
         
-        # 保存更新
-        task.save()
+        for field, value in schedule_options.items():
+            setattr(task, field, value)
+        
+        update_fields = ['case_ids', 'parallel', 'owner_ids', 'scheduled_time', 'task_name', *schedule_options]
+        if not ScheduledTask.objects.filter(id=task.id, status='pending', scheduled_time=old_scheduled_time).update(
+                **{field: getattr(task, field) for field in update_fields}):
+            raise ValueError("任务已开始执行，请稍后再修改")
+        # 通知调度器按新的预定时间调度
+        TaskScheduler().notify(task.id)
         
         # 获取关联信息用于返回
         cases = ApiCase.objects.filter(id__in=task.case_ids)
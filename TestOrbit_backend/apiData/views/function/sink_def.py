@@ -0,0 +1,102 @@
+"""
+步骤结果的延迟批量写入（write-behind）
+步骤执行完成后只把结果放入缓冲区，由后台写入线程定时或在用例结束时批量写入数据库，不再在执行过程中逐条UPDATE
+"""
+import atexit
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from apiData.models import ApiCaseStep
+
+DEFAULT_FLUSH_INTERVAL = 2  # 未配置STEP_RESULT_FLUSH_INTERVAL时，后台定时写入的间隔（秒）
+DEFAULT_BATCH_SIZE = 200  # 单条bulk_update语句更新的最大行数
+
+
+class StepResultSink:
+    """
+    步骤结果缓冲区
+    同一步骤多次写入（循环、重试）时只保留最后一次结果；与已写入数据库的结果相同时不会重复写入
+    durable：开启后每次写入都会立即唤醒后台线程落库，并在进程退出时写入剩余的结果，执行中途崩溃也能保留已执行步骤的结果
+    """
+
+    def __init__(self, flush_interval=None, durable=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(
+            settings, 'STEP_RESULT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        self.durable = durable if durable is not None else getattr(settings, 'STEP_RESULT_DURABLE', False)
+        self.batch_size = batch_size
+        self._pending = {}  # {step_id: (status, results)} 等待写入的结果
+        self._written = {}  # {step_id: (status, results)} 已写入数据库的结果
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer = None
+
+    def put(self, step_id, status, results):
+        """
+        缓存步骤的执行结果
+        """
+        if not step_id:
+            return
+        with self._lock:
+            last = self._pending.get(step_id) or self._written.get(step_id)
+            if last and last[0] == status and (last[1] is results or last[1] == results):
+                return
+            self._pending[step_id] = (status, results)
+            if self._writer is None and not self._closed:
+                self._writer = threading.Thread(target=self._run_writer, daemon=True)
+                self._writer.start()
+                if self.durable:
+                    atexit.register(self.close)
+        if self.durable:
+            self._wake.set()
+
+    def _run_writer(self):
+        """
+        后台写入线程：按间隔（durable模式下有结果即写入）批量写入缓冲区中的结果
+        """
+        try:
+            while not self._closed:
+                self._wake.wait(self.flush_interval or None)
+                self._wake.clear()
+                self.flush()
+        finally:
+            connection.close()  # 写入线程有独立的数据库连接，退出前关闭
+
+    def flush(self):
+        """
+        把缓冲区中的结果批量写入数据库，写入失败的结果会放回缓冲区等待下次写入
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            ApiCaseStep.objects.bulk_update(
+                [ApiCaseStep(id=step_id, status=status, results=results)
+                 for step_id, (status, results) in pending.items()],
+                fields=['status', 'results'], batch_size=self.batch_size)
+        except Exception as e:
+            print(f'批量写入步骤结果失败，等待下次写入: {str(e)}')
+            with self._lock:
+                self._pending = {**pending, **self._pending}
+            return 0
+        with self._lock:
+            self._written.update(pending)
+        print(f'已批量写入 {len(pending)} 个步骤的执行结果')
+        return len(pending)
+
+    def close(self):
+        """
+        停止后台写入线程，并在当前线程写入剩余的结果
+        """
+        with self._lock:
+            self._closed = True
+            writer = self._writer
+        self._wake.set()
+        if writer is not None and writer is not threading.current_thread():
+            writer.join()
+        if self.durable:
+            atexit.unregister(self.close)
+        self.flush()
@@ -107,7 +107,7 @@ def save_assert(step_id, assert_data):
 断言执行器模块
 负责在API执行过程中进行断言规则的验证
 """
-def execute_assertions(step_id, response, status_code=None, headers=None):
+def execute_assertions(step_id, response, status_code=None, headers=None, assertion_rules=None):
     """
     执行API断言规则
     
@@ -116,6 +116,7 @@ def execute_assertions(step_id, response, status_code=None, headers=None):
         response: 响应体数据（主要的断言目标）
         status_code (int, optional): HTTP状态码
         headers (dict, optional): 响应头信息
+        assertion_rules (list, optional): 执行计划中预加载的断言规则，不传时从数据库查询
         
     Returns:
         dict: 断言执行结果
@@ -128,32 +129,22 @@ def execute_assertions(step_id, response, status_code=None, headers=None):
     # print("\n🔍 执行断言规则...")
     # print(f"当前步骤ID: {step_id}")
     # print(f'response:{response}')
-    # 如果step_id没有关联断言，则跳过
-    # 查找当前step_id的所有断言规则
-    assertion_rules = AssertionRule.objects.filter(step_id=step_id, enabled=True)
-    if not assertion_rules:
-        # print("ℹ️ 没有找到断言规则，跳过断言验证")
-        return {
-            'passed': True,
-            'results': [],
-            'summary': '无断言规则'
-        }
-
     # 查询该步骤的所有启用的断言规则
-    assertion_rules = AssertionRule.objects.filter(
-        step_id=step_id, 
-        enabled=True
-    ).order_by('id')  # 使用id排序
+    if assertion_rules is None:
+        assertion_rules = list(AssertionRule.objects.filter(
+            step_id=step_id, 
+            enabled=True
+        ).order_by('id'))  # 使用id排序
     
     if not assertion_rules:
-        print("ℹ️ 没有找到断言规则，跳过断言验证")
+        # print("ℹ️ 没有找到断言规则，跳过断言验证")
         return {
             'passed': True,
             'results': [],
             'summary': '无断言规则'
         }
         
-    print(f"✅ 找到 {assertion_rules.count()} 条断言规则")
+    print(f"✅ 找到 {len(assertion_rules)} 条断言规则")
     
     # 准备断言数据，主要针对响应体
     assertion_data = {
@@ -1,4 +1,3 @@
-import copy
 import time
 
 from apiData.models import ApiCaseStep, ApiCase, ApiForeachStep
@@ -8,6 +7,8 @@ from utils.constant import USER_API, VAR_PARAM, HEADER_PARAM, HOST_PARAM, RUNNIN
     CONTAIN, NOT_CONTAIN, TEXT_MODE, API, FORM_FILE_TYPE, FORM_TEXT_TYPE, API_SQL, RES_BODY
 from utils.diyException import DiyBaseException, NotFoundFileError
 from utils.paramsDef import parse_param_value, run_params_code, parse_temp_params, get_parm_v_by_temp
+from utils.scopeDef import VarScope
+from utils.artifactDef import offload_artifacts
 # 移除对 ProjectEnvirData 的导入，使用 Environment
 from .step_assert import save_assert
 
@@ -69,27 +70,107 @@ def save_step(step, step_id, env_id, case_id):
     return step_id
 
 
+def get_step_data(step):
+    """
+    获取步骤执行时需要的数据
+    step为步骤数据（执行计划中的步骤、调试时传递的步骤）时直接使用，为步骤id时从数据库查询
+    """
+    if isinstance(step, dict):
+        step_id = step.get('id') or step.get('step_id')
+        return {'id': step_id, 'step_id': step_id, 'params': step.get('params'),
+                'controller_data': step.get('controller_data'), 'type': step.get('type'),
+                'step_name': step.get('step_name') or "未命名步骤"}
+    step_id = step
+    case_step_obj = ApiCaseStep.objects.filter(id=step_id).first()
+    # 初始化step
+    step = {}
+    step['id'] = step['step_id'] = step_id  # 添加步骤ID
+    step['params'] = case_step_obj.params if case_step_obj else {}
+    step['controller_data'] = case_step_obj.controller_data if case_step_obj else {}
+    # 获取步骤类型
+    step['type'] = case_step_obj.type if case_step_obj else None
+    step['step_name'] = case_step_obj.step_name if case_step_obj else "未命名步骤"
+    return step
+
+
+def check_step_condition(actuator_obj, execute_on, i):
+    """
+    检查步骤的执行条件，条件不满足或出错时返回对应的结果，满足时返回None
+    """
+    print("🔍 检查执行条件...")
+    try:
+        condition_result = run_params_code(execute_on, VarScope(actuator_obj.default_var), i)
+        if not condition_result:
+            print("⚠️ 执行条件不满足，跳过执行")
+            return {'status': SKIP, 'data': '【控制器】执行条件不满足！'}
+        print("✅ 执行条件满足，继续执行")
+    except Exception as e:
+        print(f"❌ 执行条件检查出错: {str(e)}")
+        if actuator_obj.failed_stop:
+            actuator_obj.running_status = INTERRUPT
+            print("⛔ 已设置中断标志")
+        return {'status': FAILED, 'data': '【控制器】' + str(e)}
+    return None
+
+
+def get_method_result(s_type, method_result):
+    """
+    格式化步骤方法的返回结果
+    """
+    res = method_result or {'status': SUCCESS}
+    # 对于SQL类型特殊处理
+    if s_type == API_SQL and 'data' in res:
+        print("🗄️ SQL执行结果中移除data字段")
+        res.pop('data', None)
+    return res
+
+
+def save_step_result(actuator_obj, step_id, s_type, res, j):
+    """
+    记录重试次数，并按执行器配置保存步骤的运行结果
+    """
+    # 记录重试次数
+    res['retried_times'] = j
+    print(f"📝 总执行次数: {j+1}")
+    
+    # 日志处理逻辑
+    if actuator_obj.only_failed_log and res['status'] in (SUCCESS, SKIP) and s_type != API_CASE:
+        print("📝 仅记录失败日志模式，不记录本次成功执行")
+        return {'status': res['status'], 'retried_times': res['retried_times']}
+    
+    # 失败处理逻辑
+    if res['status'] == FAILED:
+        print("❌ 步骤执行失败")
+        if actuator_obj.failed_stop:
+            actuator_obj.status = FAILED_STOP
+            print("⛔ 设置执行器状态为失败中断")
+
+    # 较大的请求/响应内容保存到制品存储，写入数据库的步骤结果中只保留引用，返回的结果仍为原内容
+    data = offload_artifacts(res.get('data', {}))
+
+    # 保存运行结果
+    print("💾 保存步骤执行结果到结果缓冲区...")
+    # 更新对应步骤的result和status，由结果缓冲区批量写入ApiCaseStep
+    actuator_obj.result_sink.put(step_id, res['status'], data)
+
+    print(f"🏁 go_step函数执行完成，返回状态: {res['status']}")
+    print("-"*50 + "\n")
+    return res
+
+
 # 步骤执行函数,调用ApiCasesActuator.api方法运行具体用例
-def go_step(actuator_obj, step_id, i=0, prefix_label='', **extra_params):
+# step：步骤数据或步骤id，执行用例时直接传递执行计划中的步骤数据，不再逐步骤查库
+def go_step(actuator_obj, step, i=0, prefix_label='', **extra_params):
     print("\n" + "-"*50)
     print("🔍 go_step函数开始执行")
 
     # 检查步骤ID是否存在
-    if not step_id:
+    if not step:
         print("⚠️ 步骤ID不存在，无法执行")
         return {'status': FAILED, 'data': '步骤ID不存在'}
 
-    else:
-        case_step_obj = ApiCaseStep.objects.filter(id=step_id).first()
-        # 初始化step
-        step = {}
-        step['step_id'] = step_id  # 添加步骤ID
-        step['params'] = case_step_obj.params if case_step_obj else {}
-        step['controller_data'] = case_step_obj.controller_data if case_step_obj else {}
-        # 获取步骤类型
-        s_type = case_step_obj.type if case_step_obj else None
-        step['type'] = s_type
-        step['step_name'] = case_step_obj.step_name if case_step_obj else "未命名步骤"
+    step = get_step_data(step)
+    step_id, s_type = step['step_id'], step['type']
 
     # 检查是否需要中断执行
     if actuator_obj.status in (INTERRUPT, FAILED_STOP):
@@ -111,20 +192,8 @@ def go_step(actuator_obj, step_id, i=0, prefix_label='', **extra_params):
     res = {'status': SUCCESS, 'data': ''}
 
     # 检查是否有执行条件
-    if execute_on:
-        print("🔍 检查执行条件...")
-        try:
-            condition_result = run_params_code(execute_on, copy.deepcopy(actuator_obj.default_var), i)
-            if not condition_result:
-                print("⚠️ 执行条件不满足，跳过执行")
-                return {'status': SKIP, 'data': '【控制器】执行条件不满足！'}
-            print("✅ 执行条件满足，继续执行")
-        except Exception as e:
-            print(f"❌ 执行条件检查出错: {str(e)}")
-            if actuator_obj.failed_stop:
-                actuator_obj.running_status = INTERRUPT
-                print("⛔ 已设置中断标志")
-            return {'status': FAILED, 'data': '【控制器】' + str(e)}
+    if execute_on and (condition_res := check_step_condition(actuator_obj, execute_on, i)):
+        return condition_res
     
     # 执行前等待
     if sleep_time:
@@ -134,21 +203,12 @@ def go_step(actuator_obj, step_id, i=0, prefix_label='', **extra_params):
     # 执行步骤（包含重试逻辑）
     print("\n🚀 开始执行步骤...")
     for j in range(retry_times + 1):
-        # print(f"🔄 第 {j+1}/{retry_times+1} 次尝试执行: {step.get('step_name', '未命名步骤')}")
         try:
             # 通过反射调用对应类型的方法
             print(f"📡 调用 actuator_obj.{s_type} 方法")
 
             # 使用getters动态获取方法,执行actuator_obj.{s_type} 方法获取返回结果
-            method_result = getattr(actuator_obj, s_type)(**params)
-            res = method_result or {'status': SUCCESS}
-            
-            # 对于SQL类型特殊处理
-            if s_type == API_SQL and 'data' in res:
-                print("🗄️ SQL执行结果中移除data字段")
-                res.pop('data', None)
-                
-            
+            res = get_method_result(s_type, getattr(actuator_obj, s_type)(**params))
         except Exception as e:
             # 捕获执行异常
             print(f"❌ 执行出错: {str(e)}")
@@ -165,27 +225,4 @@ def go_step(actuator_obj, step_id, i=0, prefix_label='', **extra_params):
             print("✅ 执行成功")
             break
     
-    # 记录重试次数
-    res['retried_times'] = j
-    print(f"📝 总执行次数: {j+1}")
-    
-    # 日志处理逻辑
-    if actuator_obj.only_failed_log and res['status'] in (SUCCESS, SKIP) and s_type != API_CASE:
-        print("📝 仅记录失败日志模式，不记录本次成功执行")
-        return {'status': res['status'], 'retried_times': res['retried_times']}
-    
-    # 失败处理逻辑
-    if res['status'] == FAILED:
-        print("❌ 步骤执行失败")
-        if actuator_obj.failed_stop:
-            actuator_obj.status = FAILED_STOP
-            print("⛔ 设置执行器状态为失败中断")
-
-    # 保存运行结果
-    print("💾 保存步骤执行结果到ApiCaseStep.results...")
-    # 更新对应步骤的result和status
-    ApiCaseStep.objects.filter(id=step_id).update(results=res.get('data', {}), status=res['status'])
-
-    print(f"🏁 go_step函数执行完成，返回状态: {res['status']}")
-    print("-"*50 + "\n")
-    return res
+    return save_step_result(actuator_obj, step_id, s_type, res, j)
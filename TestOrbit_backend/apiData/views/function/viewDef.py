@@ -1,30 +1,38 @@
 import copy
 import datetime
+import itertools
 import json
 import os
 import time
+import uuid
 from urllib.parse import urlencode
 
 import requests
 from django.db.models import Max, F
 from django.db.models.functions import JSONObject
-from openpyxl import load_workbook
 from requests import ReadTimeout
 from rest_framework.response import Response
 
 from apiData.models import ApiCaseStep, ApiCase, ApiForeachStep
-from utils.comDef import get_proj_envir_db_data, db_connect, execute_sql_func, \
-    close_db_con, json_dumps, JSONEncoder, MyThread, json_loads, format_parm_type_v
+from utils.comDef import get_proj_envir_db_data, execute_sql_func, json_dumps, JSONEncoder, MyThread, \
+    json_loads, format_parm_type_v, json_dumps_bytes
 from utils.constant import USER_API, VAR_PARAM, HEADER_PARAM, HOST_PARAM, RUNNING, SUCCESS, FAILED, DISABLED, \
     INTERRUPT, SKIP, API_CASE, API_FOREACH, TABLE_MODE, STRING, DIY_CFG, JSON_MODE, PY_TO_CONF_TYPE, CODE_MODE, \
     OBJECT, FAILED_STOP, WAITING, PRO_CFG, FORM_MODE, EQUAL, API_VAR, NOT_EQUAL, \
-    CONTAIN, NOT_CONTAIN, TEXT_MODE, API, FORM_FILE_TYPE, FORM_TEXT_TYPE, API_SQL, RES_BODY
-from utils.diyException import DiyBaseException, NotFoundFileError
+    CONTAIN, NOT_CONTAIN, TEXT_MODE, API, FORM_FILE_TYPE, FORM_TEXT_TYPE, API_SQL, RES_BODY, MANUAL_TRIGGER
+from utils.dbPoolDef import get_db_pool
+from utils.diyException import DiyBaseException
+from utils.envDef import get_env_snapshot
+from utils.excelTemplateDef import render_excel_file
+from utils.fileCacheDef import upload_file_cache
 from utils.paramsDef import parse_param_value, run_params_code, parse_temp_params, get_parm_v_by_temp
-from config.models import Environment
+from utils.pathDef import get_path_accessor
+from utils.scopeDef import VarScope
+from utils.sessionDef import HttpSessionPool
 from user.models import UserCfg, UserTempParams
 
 # 功能函数切分保存位置,变更到其他位置
+from .sink_def import StepResultSink
 
 
 
@@ -45,6 +53,9 @@ class ApiCasesActuator:
         self.envir = cfg_data['envir_id']
         self.failed_stop = cfg_data['failed_stop']
         self.only_failed_log = cfg_data['only_failed_log']
+        self.trigger = cfg_data.get('trigger', MANUAL_TRIGGER)  # 触发方式：手动、批量、定时任务
+        self.job_id = cfg_data.get('job_id')  # 所属的批量执行任务（ExecutionJob.run_id），取消任务时中断执行
+        self._run_state = {}  # 执行状态，循环控制器并行执行时各次循环的执行器共享
         self.status = SUCCESS
         self.cascader_error = False
         temp_params = temp_params or UserTempParams.objects.filter(user_id=user_id).values()
@@ -53,17 +64,50 @@ class ApiCasesActuator:
         self.params_source = params['params_source']
         self.user_id = user_id  # 执行计划的用户，传递了user_id时才会进行中断判断
         self.status = RUNNING  # 初始化执行状态为执行中
-        self.api_data = {}  # 执行过的接口信息会存在这，避免频繁查库，示例:{id:{'path':/xx,'method':'GET','timeout':10}}
+        self.api_data = {}  # 引用过的接口步骤会存在这，避免频繁查库，示例:{id:{'params':{},'path':/xx,'method':'GET','timeout':10}}
         self.api_process = ''
+        self.environment = get_env_snapshot(self.envir)  # 执行环境的快照(EnvSnapshot)，执行用例时合并项目及用例的环境变量
+        # 本次执行的HTTP连接池，同一主机的请求复用长连接
+        self.http_pool = HttpSessionPool(self.environment.http_cfg if self.environment else None)
+        self.plan = None  # 执行计划(ExecutionPlan)，加载后步骤执行时不再查库
+        self.result_sink = StepResultSink()  # 步骤结果缓冲区，批量写入数据库
+        self.run_id = uuid.uuid4().hex  # 本次执行的id，用于中断登记及关联报告
+        self.report = None  # 本次执行的报告(ReportBuilder)，执行用例时创建
+        self.step_concurrency = 0  # 用例步骤的并发数，大于1时按步骤间的依赖关系并发执行，执行用例时设置
+
+    def load_environment(self, case_id, project_id):
+        """
+        加载合并了项目全局环境及用例局部环境的快照，环境变量作为默认变量，同名时以用户的临时参数为准
+        """
+        self.environment = get_env_snapshot(self.envir, case_id, project_id)
+        if self.environment:
+            self.default_var = {**self.environment.variables, **self.default_var}
+
+    @property
+    def status(self):
+        """
+        执行状态，循环控制器并行执行时各次循环的执行器共享同一状态，中断、失败中止对所有循环生效
+        """
+        return self._run_state['status']
+
+    @status.setter
+    def status(self, value):
+        self._run_state['status'] = value
+
+    def close(self):
+        """
+        执行结束后释放执行器占用的资源，并写入缓冲区中剩余的步骤结果
+        """
+        self.http_pool.close()
+        self.result_sink.close()
 
     @staticmethod
     def clear_upload_files(upload_files_list):
         """
-        清除请求中上传的临时文件
+        关闭请求中上传文件的文件对象
         """
         for file in upload_files_list:
             file['file'] and file['file'].close()
-            os.remove(file['name'])
 
     def parse_api_step_output(self, params, prefix_label, step_name, response, res_headers, i):
         """
@@ -97,7 +141,7 @@ class ApiCasesActuator:
                         # 如果locate_v是其他类型或不包含点的字符串，直接作为整体使用
                         value_location_list = [parse_param_value(locate_v, self.default_var, i)]
                     try:
-                        res = get_parm_v_by_temp(value_location_list, res_source)
+                        res = get_path_accessor(value_location_list).get(res_source)
                     except Exception as e:
                         if is_assert:
                             return {'status': FAILED, 'results': str(e)}
@@ -133,7 +177,8 @@ class ApiCasesActuator:
         """
         处理api步骤的期望
         """
-        old_default_var = copy.deepcopy(self.default_var)
+        # 表格模式只读取变量，代码模式在变量作用域中执行，都不会修改default_var
+        old_default_var = self.default_var
         if expect := params.get('expect_source'):
             self.api_process = '【预期结果】'
             if params['expect_mode'] == TABLE_MODE:
@@ -144,7 +189,7 @@ class ApiCasesActuator:
                     rule = ext.get('rule', EQUAL)
                     # 使用str(parse_param_value(var, var_dict))是确保键为数字时能够转换为字符串数字进行匹配
                     ext_name_list = [str(parse_param_value(name, old_default_var, i)) for name in ext_name.split('.')]
-                    res = get_parm_v_by_temp(ext_name_list, response)
+                    res = get_path_accessor(ext_name_list).get(response)
                     if res:
                         res_v = res['value']
                         # res_v = str(res['value']) if ext_v_type == STRING else json_loads(res['value'])
@@ -163,7 +208,7 @@ class ApiCasesActuator:
                     else:
                         return {'status': FAILED, 'results': '未在响应中找到字段：' + ext_name + '\n'}
             else:  # 代码模式
-                res = run_params_code(expect, old_default_var, i, response, res_headers)
+                res = run_params_code(expect, VarScope(old_default_var), i, response, res_headers)
                 if res is not None:
                     if isinstance(res, tuple) and res[0] is False:
                         return {'status': FAILED, 'results': res[1]}
@@ -171,19 +216,26 @@ class ApiCasesActuator:
                         return {'status': FAILED, 'results': '不符合预期！'}
         return {'status': SUCCESS}
 
-    def parse_excel_var_params(self, file_name):
+    def parse_excel_var_params(self, file):
         """
-        解析form-data中excel存在的变量
+        解析form-data中excel存在的变量，返回替换变量后的文件对象，缓存的原文件不会被修改
         """
-        workbook = load_workbook(file_name)
-        sheets = workbook.sheetnames
-        for sheet in sheets:
-            ws = workbook[sheet]
-            for row in range(1, ws.max_row + 1):
-                for col in range(1, ws.max_column + 1):
-                    cell = ws.cell(row, col)
-                    cell.value = parse_param_value(cell.value, self.default_var)
-        workbook.save(file_name)
+        return render_excel_file(file, self.default_var)
+
+    def open_upload_file(self, file_name, file_url, files_list):
+        """
+        从上传文件缓存中打开form-data上传的文件，名称包含“有变量”的excel文件替换其中的变量
+        """
+        file = upload_file_cache.open(file_name, file_url)
+        files_list.append({'name': file_name, 'file': file})
+        file_type = os.path.splitext(file_name)[-1]
+        if file_type in ['.xlsx'] and '有变量' in file_name:
+            try:
+                file = self.parse_excel_var_params(file)
+            except Exception as e:
+                raise Exception('导入报错：' + str(e))
+            files_list.append({'name': file_name, 'file': file})
+        return file
 
     def parse_form_data_params(self, body, files_list):
         """
@@ -195,22 +247,8 @@ class ApiCasesActuator:
             if isinstance(field_data, dict) and 'type' in field_data:
                 if field_data['type'] == FORM_FILE_TYPE:
                     file_name, file_url = field_data['name'], field_data['value']
-                    r = requests.get(file_url)
-                    if r.status_code == 404:
-                        raise NotFoundFileError('未找到上传的文件：' + file_name)
-                    with open(file_name, 'wb') as f:
-                        f.write(r.content)
-                    file_type = os.path.splitext(file_name)[-1]
-                    if file_type in ['.xlsx'] and '有变量' in file_name:
-                        try:
-                            self.parse_excel_var_params(file_name)
-                        except Exception as e:
-                            files_list.append({'name': file_name, 'file': None})
-                            raise Exception('导入报错：' + str(e))
-                    file = open(file_name, 'rb')
-                    req_data[key] = (file_name, file)
+                    req_data[key] = (file_name, self.open_upload_file(file_name, file_url, files_list))
                     body_log[key] = file_name
-                    files_list.append({'name': file_name, 'file': file})
                 else:
                     body_log[key] = field_data['value']
                     req_data[key] = (None, field_data['value'])
@@ -219,237 +257,229 @@ class ApiCasesActuator:
                 break
         return req_data, body_log
 
-    def api(self, step, prefix_label, i=0):
+    def get_quote_api(self, quote_step_id):
         """
-        执行类型为接口的步骤
-        优化后：参数通过关联的ApiData获取，不再使用step['params']
+        获取引用的接口步骤的参数，优先从执行计划中获取，调试等没有执行计划时查询一次后缓存，步骤不存在时返回None
         """
-        print("\n" + "="*60)
-        print("🌐 API方法开始执行")
-        # print(f"📋 步骤名称: {step.get('step_name', '未命名')}")
+        if (api_base := self.api_data.get(quote_step_id)) is None:
+            if self.plan and quote_step_id in self.plan.quote_steps:
+                params = self.plan.quote_steps[quote_step_id]
+            else:
+                quote_step = ApiCaseStep.objects.filter(id=quote_step_id).values('params').first()
+                params = quote_step['params'] or {} if quote_step else None
+            if params is None:
+                return None
+            api_base = self.api_data[quote_step_id] = {
+                'params': params, 'path': params.get('path', ''), 'method': params.get('method', 'GET'),
+                'timeout': params.get('timeout', self.timeout)}
+        return api_base
+
+    def get_api_target(self, step):
+        """
+        获取接口步骤的请求参数及请求地址，引用了接口步骤（quote_step_id）时使用被引用步骤的参数
+        返回 (params, url, method, timeout)，引用的步骤不存在时返回失败结果
+        """
+        if (quote_step_id := step.get('quote_step_id')) and isinstance(quote_step_id, int):
+            if (api_base := self.get_quote_api(quote_step_id)) is None:
+                return {'status': FAILED, 'data': f'找不到API数据(ID: {quote_step_id})'}
+            # 请求参数在封装请求时可能被修改，每次使用副本
+            params = copy.deepcopy(api_base['params'])
+            url_path, method, timeout = api_base['path'], api_base['method'], api_base['timeout']
+        else:
+            params = step.get('params', {})
+            url_path = params.get('path', '')
+            method = params.get('method', 'GET')
+            timeout = params.get('timeout', self.timeout)
+        if host := params.get('host') or '':
+            if params.get('host_type') == PRO_CFG:
+                host = self.environment.url if self.environment else ''
+        elif self.default_host:
+            host = self.default_host
+        else:
+            host = ''
+        return params, host + url_path, method, timeout
+
+    def build_api_request(self, params, url, method, timeout, i, req_log, upload_files_list):
+        """
+        封装request请求的请求参数，同时记录请求日志
+        """
+        print('开始封装请求数据...')
+        self.api_process = '【Header(请求头)】'
+        if header_source := params.get('header_source'):
+            header = self.parse_source_params(header_source, params.get('header_mode', 'raw'), i)
+            header = {str(key).lower(): str(header[key]) for key in header}  # header的key全部转换为小写
+            if not header.get('content-type'):
+                header['content-type'] = 'application/json'
+            # 只有没有默认请求头时才将自定义的请求头设置为默认请求头，如果使用了全局参数且有默认请求头，则永远不会替换
+            if not self.default_header:
+                self.default_header = copy.deepcopy(header)
+        elif headers := params.get('headers'):
+            # 如果没有header_source但有headers直接参数，则使用它
+            header = {str(key).lower(): str(headers[key]) for key in headers}  # header的key全部转换为小写
+            if not header.get('content-type'):
+                header['content-type'] = 'application/json'
+        else:
+            header = copy.deepcopy(self.default_header) or {'content-type': 'application/json'}
+        self.api_process = '【query(url参数)】'
+        # 处理query参数
+        # 首先尝试获取query_source，如果不存在则尝试直接获取query
+        if query_source := params.get('query_source'):
+            query = self.parse_source_params(query_source, params.get('query_mode', 'raw'), i)
+        else:
+            query = params.get('query', {})
         
-        # 临时文件列表
-        upload_files_list = []
-        print("🗂️ 初始化上传文件列表")
-    
+        self.api_process = '【Body(请求体)】'
+        # 处理body参数
+        if params.get('body_mode', 'raw') != FORM_MODE:
+            # 首先尝试获取body_source，如果不存在则尝试直接获取body
+            if body_source := params.get('body_source'):
+                body = self.parse_source_params(body_source, params.get('body_mode', 'raw'), i)
+            else:
+                body = params.get('body', {})
+        else:
+            body = self.parse_source_params(
+                params.get('body_source'), params.get('body_mode', 'raw'), i, file_list=upload_files_list)
         
-        if step.get('quote_step_id') and isinstance(step.get('quote_step_id'), int):
-            # 引用的步骤，通过quote_step_id获取参数，而不是step['params']
-            quote_step_id = step['quote_step_id']
-            print(f"📌 步骤关联了API数据，ID: {quote_step_id}")
-            
-            # 检查缓存
-            api_base = self.api_data.get(quote_step_id)
-            if api_base:
-                print("✅ 从缓存获取API基础数据")
+        # 封装request请求的请求参数    
+        req_params = {'url': url, 'headers': header, 'params': query, 'method': method.lower(),
+                      'allow_redirects': not params.get('ban_redirects', False), 'timeout': timeout}
+        req_log.update({'header': copy.deepcopy(header), 'body': body})
+        content_type = header['content-type']
+        if params.get('body_mode', 'raw') != FORM_MODE:
+            if 'application/json' in content_type:
+                req_params['data'] = json_dumps_bytes(body) if not isinstance(body, str) else body.encode('utf-8')
+            elif 'text/html' in content_type:
+                req_params['data'] = body.encode('utf-8') if isinstance(body, str) else ''
+            elif 'urlencoded' in content_type or 'text/plain' in content_type:
+                if not isinstance(body, dict):
+                    req_params['data'] = body
+                else:
+                    req_data = {k: json.dumps(body[k], ensure_ascii=False, separators=(',', ':')) if isinstance(
+                        body[k], dict) else body[k] for k in body}
+                    urlencode_v = urlencode(req_data).replace('+', '%20')
+                    req_params['data'] = urlencode_v
+        else:
+            header.pop('content-type', None)
+            req_log['header']['content-type'] = 'multipart/form-data'
+            req_params['files'], req_log['body'] = body
+        print('http请求参数封装完毕')
+        return req_params
+
+    @staticmethod
+    def get_send_error(e):
+        """
+        将发送请求时的异常转换为请求日志中的字段及提示信息，非请求异常时返回None
+        """
+        if isinstance(e, (requests.exceptions.ConnectionError, ReadTimeout)):
+            return 'response', '请求超时！'
+        elif isinstance(e, requests.exceptions.InvalidSchema):
+            return 'results', '无效的请求地址！'
+        elif isinstance(e, requests.exceptions.MissingSchema):
+            return 'results', '请求地址不能为空！'
+        return None
+
+    def parse_api_response(self, step, params, prefix_label, i, r, req_log):
+        """
+        解析接口响应：处理输出参数、预期结果及断言，返回 (res_status, results)
+        r 为流式读取的响应(CapturedResponse)，响应体只在需要时解析
+        """
+        spend_time = float('%.2f' % r.elapsed.total_seconds())
+        res_code = r.status_code
+        res_headers = dict(r.headers)
+        response, log_response = '', ''
+        if str(res_code).startswith('2'):  # 代表请求成功
+            assertion_rules = self.plan.get_assertions(step['step_id']) if self.plan and 'step_id' in step else None
+            # 输出参数、预期结果、断言需要时才解析响应体，不需要时较大的响应体只记录摘要
+            if params.get('output_source') or params.get('expect_source') or assertion_rules or (
+                    'step_id' in step and not self.plan):
+                response = r.get_body()
+                log_response = r.get_log_body(response)
             else:
-                print("🔄 缓存未命中，从数据库查询API数据...")
-                # 从数据库获取API数据
-                api_instance = ApiCaseStep.objects.filter(id=quote_step_id).select_related('env').first()
+                log_response = r.get_log_body()
+            out_res = self.parse_api_step_output(
+                params, prefix_label, step.get('step_name', '未命名步骤'), response, res_headers, i)
+            res_status, results = out_res['status'], out_res.get('results')
+            if res_status == FAILED:
+                results = self.api_process + results
+            elif out_data := out_res.get('out_data'):
+                req_log['output'] = out_data
+            ext_res = self.parse_api_step_expect(params, response, res_headers, i)
+            if res_status != FAILED:
+                res_status = ext_res['status']
+            if ext_res['status'] == FAILED:
+                results = self.api_process + ext_res.get('results', '')
                 
-                if not api_instance:
-                    print(f"❌ 数据库中未找到API数据(ID: {quote_step_id})")
-                    return {'status': FAILED, 'data': f'找不到API数据(ID: {quote_step_id})'}
+            # 执行断言规则
+            from .step_assert import execute_assertions
+            # 检查是否有step_id用于断言
+            if 'step_id' in step:
+                # 执行断言，主要针对响应体
+                assertion_result = execute_assertions(
+                    step_id=step['step_id'],
+                    response=response,
+                    status_code=res_code,
+                    headers=res_headers,
+                    assertion_rules=assertion_rules
+                )
                 
-                print("✅ 数据库查询成功")
-                # 构建api_base数据
-                api_base = {
-                    'path': api_instance.path,
-                    'method': api_instance.method,
-                    'timeout': api_instance.timeout or self.timeout,
-                    'env_url': api_instance.env.url if api_instance.env else ''
-                }
+                # 将断言结果添加到请求日志
+                req_log['assertion_results'] = assertion_result['results']
                 
-                # 缓存API基础数据
-                self.api_data[quote_step_id] = api_base
-                print("📦 API基础数据已缓存")
-            
-            # 获取参数
-            print("🔍 获取API参数...")
-            params = api_instance.params or {} if 'api_instance' in locals() else {}
-            print(f"📦 参数大小: 约 {len(str(params))} 字符")
-            
-            # 从api_base获取基础API信息
-            url_path = api_base['path']
-            method = api_base['method']
-            timeout = api_base.get('timeout', self.timeout)
-            
-            # 确定主机地址
-            if api_base.get('env_url'):
-                host = api_base['env_url']
-            elif host := params.get('host') or '':
-                if params.get('host_type') == PRO_CFG:
-                    environment = Environment.objects.filter(id=self.envir).first()
-                    host = environment.url if environment else ''
-            elif self.default_host:
-                host = self.default_host
+                # 根据断言结果更新状态
+                if not assertion_result['passed']:
+                    res_status = FAILED
+                    results = assertion_result['summary'] + (f"\n{results}" if results else "")
             else:
-                host = ''
-                
+                print("⚠️ 步骤ID不存在，跳过断言执行")
+        elif res_code == 404:
+            results = '请求路径不存在！'
+            res_status = FAILED
         else:
-            # 不存在引用步骤，可以直接使用step['params']
-            print("步骤未关联API数据，使用step['params']")
-            # print(f'step: {step}\t')
-            params = step.get('params', {})
-            # print(f'已提取到params: {params}')
-            if host := params.get('host') or '':
-                if params.get('host_type') == PRO_CFG:
-                    environment = Environment.objects.filter(id=self.envir).first()
-                    host = environment.url if environment else ''
-            elif self.default_host:
-                host = self.default_host
-            else:
-                host = ''
-                
-            url_path = params.get('path', '')
-            method = params.get('method', 'GET')
-            timeout = params.get('timeout', self.timeout)
-        
+            results = '请求异常！'
+            res_status = FAILED
+        # 更新请求日志
+        req_log.update({
+            'url': str(r.url), 
+            'res_header': res_headers, 
+            'response': log_response,
+            'spend_time': spend_time, 
+            'results': results
+        })
+        return res_status, results
+
+    def api(self, step, prefix_label, i=0):
+        """
+        执行类型为接口的步骤
+        优化后：参数通过关联的ApiData获取，不再使用step['params']
+        """
+        print("\n" + "="*60)
+        print("🌐 API方法开始执行")
         
-        # print('开始拼接URL...')
-        url = host + url_path
+        # 临时文件列表
+        upload_files_list = []
+        target = self.get_api_target(step)
+        if isinstance(target, dict):
+            return target
+        params, url, method, timeout = target
         req_log = {'url': url, 'method': method, 'response': '无响应结果', 'res_header': '无响应头'}
         res_status, results = WAITING, ''  # 初始化为等待状态
         try:
-            print('开始封装请求数据...')
-            self.api_process = '【Header(请求头)】'
-            if header_source := params.get('header_source'):
-                header = self.parse_source_params(header_source, params.get('header_mode', 'raw'), i)
-                header = {str(key).lower(): str(header[key]) for key in header}  # header的key全部转换为小写
-                if not header.get('content-type'):
-                    header['content-type'] = 'application/json'
-                # 只有没有默认请求头时才将自定义的请求头设置为默认请求头，如果使用了全局参数且有默认请求头，则永远不会替换
-                if not self.default_header:
-                    self.default_header = copy.deepcopy(header)
-            elif headers := params.get('headers'):
-                # 如果没有header_source但有headers直接参数，则使用它
-                # print(f'直接从params获取headers参数: {headers}')
-                header = {str(key).lower(): str(headers[key]) for key in headers}  # header的key全部转换为小写
-                if not header.get('content-type'):
-                    header['content-type'] = 'application/json'
-            else:
-                header = copy.deepcopy(self.default_header) or {'content-type': 'application/json'}
-            self.api_process = '【query(url参数)】'
-            # 处理query参数
-            # 首先尝试获取query_source，如果不存在则尝试直接获取query
-            if query_source := params.get('query_source'):
-                query = self.parse_source_params(query_source, params.get('query_mode', 'raw'), i)
-            else:
-                query = params.get('query', {})
-                # print(f'直接从params获取query参数: {query}')
-            
-            self.api_process = '【Body(请求体)】'
-            # 处理body参数
-            if params.get('body_mode', 'raw') != FORM_MODE:
-                # 首先尝试获取body_source，如果不存在则尝试直接获取body
-                if body_source := params.get('body_source'):
-                    body = self.parse_source_params(body_source, params.get('body_mode', 'raw'), i)
-                else:
-                    body = params.get('body', {})
-            else:
-                body = self.parse_source_params(
-                    params.get('body_source'), params.get('body_mode', 'raw'), i, file_list=upload_files_list)
-            
-            # print(f'封装好的query: {query}\t')
-            # 封装request请求的请求参数    
-            req_params = {'url': url, 'headers': header, 'params': query, 'method': method.lower(),
-                          'allow_redirects': not params.get('ban_redirects', False), 'timeout': timeout}
-            req_log.update({'header': copy.deepcopy(header), 'body': body})
-            content_type = header['content-type']
-            if params.get('body_mode', 'raw') != FORM_MODE:
-                if 'application/json' in content_type:
-                    req_params['data'] = json_dumps(body).encode() if not isinstance(body, str) else body.encode(
-                        'utf-8')
-                elif 'text/html' in content_type:
-                    req_params['data'] = body.encode('utf-8') if isinstance(body, str) else ''
-                elif 'urlencoded' in content_type or 'text/plain' in content_type:
-                    if not isinstance(body, dict):
-                        req_params['data'] = body
-                    else:
-                        req_data = {k: json.dumps(body[k], ensure_ascii=False, separators=(',', ':')) if isinstance(
-                            body[k], dict) else body[k] for k in body}
-                        urlencode_v = urlencode(req_data).replace('+', '%20')
-                        req_params['data'] = urlencode_v
-            else:
-                header.pop('content-type', None)
-                req_log['header']['content-type'] = 'multipart/form-data'
-                req_params['files'], req_log['body'] = body
-            print('http请求参数封装完毕')
+            req_params = self.build_api_request(params, url, method, timeout, i, req_log, upload_files_list)
             try:
                 # 发送请求
                 print("🚀 实际发送HTTP请求...")
-                # print(f'实际请求参数req_params: {req_params}\t')
-                r = requests.request(**req_params)
-
+                r, req_log['connection'] = self.http_pool.request(**req_params)
             except KeyError as e:
                 req_log['results'] = results = self.api_process + '未找到key：' + str(e)
                 res_status = FAILED
-            except (requests.exceptions.ConnectionError, ReadTimeout):
-                req_log['response'] = results = '请求超时！'
-                res_status = FAILED
-            except requests.exceptions.InvalidSchema:
-                req_log['results'] = results = '无效的请求地址！'
-                res_status = FAILED
-            except requests.exceptions.MissingSchema:
-                req_log['results'] = results = '请求地址不能为空！'
+            except requests.exceptions.RequestException as e:
+                if not (send_error := self.get_send_error(e)):
+                    raise
+                log_key, results = send_error
+                req_log[log_key] = results
                 res_status = FAILED
             else:
-                spend_time = float('%.2f' % r.elapsed.total_seconds())
-                res_code = r.status_code
-                response = ''
-                if str(res_code).startswith('2'):  # 代表请求成功
-                    try:
-                        response = r.json()
-                    except Exception:
-                        response = r.text
-                    out_res = self.parse_api_step_output(
-                        params, prefix_label, step.get('step_name', '未命名步骤'), response, dict(r.headers), i)
-                    res_status, results = out_res['status'], out_res.get('results')
-                    if res_status == FAILED:
-                        results = self.api_process + results
-                    elif out_data := out_res.get('out_data'):
-                        req_log['output'] = out_data
-                    ext_res = self.parse_api_step_expect(params, response, dict(r.headers), i)
-                    if res_status != FAILED:
-                        res_status = ext_res['status']
-                    if ext_res['status'] == FAILED:
-                        results = self.api_process + ext_res.get('results', '')
-                        
-                    # 执行断言规则
-                    from .step_assert import execute_assertions
-                    # 检查是否有step_id用于断言
-                    if 'step_id' in step:
-                        # 执行断言，主要针对响应体
-                        assertion_result = execute_assertions(
-                            step_id=step['step_id'],
-                            response=response,
-                            status_code=res_code,
-                            headers=dict(r.headers)
-                        )
-                        
-                        # 将断言结果添加到请求日志
-                        req_log['assertion_results'] = assertion_result['results']
-                        
-                        # 根据断言结果更新状态
-                        if not assertion_result['passed']:
-                            res_status = FAILED
-                            results = assertion_result['summary'] + (f"\n{results}" if results else "")
-                    else:
-                        print("⚠️ 步骤ID不存在，跳过断言执行")
-                elif res_code == 404:
-                    results = '请求路径不存在！'
-                    res_status = FAILED
-                else:
-                    results = '请求异常！'
-                    res_status = FAILED
-                # 更新请求日志
-                req_log.update({
-                    'url': r.url, 
-                    'res_header': dict(r.headers), 
-                    'response': response,
-                    'spend_time': spend_time, 
-                    'results': results
-                })
+                res_status, results = self.parse_api_response(step, params, prefix_label, i, r, req_log)
                  
         except Exception as e:
             print(f"\n❌ API执行出错: {str(e)}")
@@ -458,7 +488,6 @@ class ApiCasesActuator:
             res_status = FAILED
             
         # 清理临时文件
-        # print("\n🧹 清理临时上传文件...")
         self.clear_upload_files(upload_files_list)
         
         # 准备返回结果
@@ -468,25 +497,40 @@ class ApiCasesActuator:
         print("="*60 + "\n")
         return result
 
+    def get_case_result(self, cascader_level, res_status, step_data):
+        """
+        汇总引用用例步骤的执行结果
+        """
+        if cascader_level == 1 and self.cascader_error:
+            self.cascader_error = False
+            return {'status': FAILED, 'results': '步骤死循环或主计划步骤嵌套的子用例超过10层！'}
+        return {'status': res_status, 'results': step_data}
+
+    def get_quote_case_steps(self, case_id):
+        """
+        获取引用用例的步骤，优先从执行计划中获取
+        """
+        if self.plan and (step_data := self.plan.get_case_steps(case_id)) is not None:
+            return step_data
+        # 延迟导入避免循环引用
+        from .group_def import parse_api_case_steps
+        return parse_api_case_steps([case_id], is_step=True)
+
     def case(self, step, prefix_label='', cascader_level=1, i=0):
         """
         执行类型为用例
         """
         # 延迟导入避免循环引用
         from .group_def import run_step_groups
-        from .group_def import parse_api_case_steps
         
         if cascader_level > 10:  # 引用计划嵌套超过10层判断为死循环
             self.cascader_error = True
             return {'status': FAILED}
         params = step.get('params')
-        step_data = parse_api_case_steps([params['case_related'][-1]], is_step=True)
+        step_data = self.get_quote_case_steps(params['case_related'][-1])
         prefix_label += step['step_name'] + '-'
         res_status, step_data = run_step_groups(self, step_data, prefix_label, cascader_level, i)
-        if cascader_level == 1 and self.cascader_error:
-            self.cascader_error = False
-            return {'status': FAILED, 'results': '步骤死循环或主计划步骤嵌套的子用例超过10层！'}
-        return {'status': res_status, 'results': step_data}
+        return self.get_case_result(cascader_level, res_status, step_data)
 
 
     def sql(self, step, prefix_label='', i=0):
@@ -494,39 +538,33 @@ class ApiCasesActuator:
           执行类型为SQL的步骤
         """
         params = step.get('params') or step
-        db_data = get_proj_envir_db_data(params['sql_proj_related'], envir=self.envir)
+        db_data = get_proj_envir_db_data(params['sql_proj_related'], envir=self.envir, snapshot=self.environment)
         sql = params['sql']
         if db_data:
             if 'database' in params:
                 db_data['db_database'] = params['database']
-            res = db_connect(db_data)
-            if res['status'] == SUCCESS:
-                try:
-                    sql = parse_param_value(sql, self.default_var, i)
-                except DiyBaseException as e:
-                    return {'status': FAILED, 'results': f'执行出错：{e}', 'sql': sql}
+            try:
+                sql = parse_param_value(sql, self.default_var, i)
+            except DiyBaseException as e:
+                return {'status': FAILED, 'results': f'执行出错：{e}', 'sql': sql}
+            with get_db_pool().connect(db_data) as res:
+                if res['status'] != SUCCESS:
+                    return res
                 sql_res = execute_sql_func(res['db_con'], sql, db_data['db_type'])
-                close_db_con(res)
-                if sql_res['status'] == SUCCESS:
-                    if sql_var := params.get('sql_var'):
-                        sql_data = sql_res['data']['sql_data']
-                        self.default_var[sql_var] = sql_data
-                        self.params_source[VAR_PARAM][sql_var] = {
-                            'name': sql_var, 'value': json_dumps(sql_data, JSONEncoder), 'type': VAR_PARAM,
-                            'step_name': prefix_label + step['step_name'], 'param_type_id': OBJECT,
-                            **self.base_params_source}
-                    return sql_res
-                return sql_res
-            return res
+            if sql_res['status'] == SUCCESS and (sql_var := params.get('sql_var')):
+                sql_data = sql_res['data']['sql_data']
+                self.default_var[sql_var] = sql_data
+                self.params_source[VAR_PARAM][sql_var] = {
+                    'name': sql_var, 'value': json_dumps(sql_data, JSONEncoder), 'type': VAR_PARAM,
+                    'step_name': prefix_label + step['step_name'], 'param_type_id': OBJECT,
+                    **self.base_params_source}
+            return sql_res
         return {'status': FAILED, 'results': '无效的连接！'}
 
-    def foreach(self, step, prefix_label='', cascader_level=1, i=0):
+    def get_foreach_data(self, step):
         """
-        循环控制器
+        获取循环控制器的循环次数、中止条件及循环的步骤
         """
-        if cascader_level > 15:  # 嵌套超过15层则判断为死循环
-            self.cascader_error = True
-            return {'status': FAILED}
         params = step['params']
         times_value, break_code = params['times'], params.get('break_code')
         if times_value.isdigit():
@@ -539,44 +577,63 @@ class ApiCasesActuator:
             elif for_times not in ('true', True) and not isinstance(for_times, int):
                 raise DiyBaseException(f'无效的循环次数值：{for_times}！')
         if 'steps' not in params:
-            steps = set_foreach_tree(ApiForeachStep.objects.filter(step_id=step['id']).values().order_by('id'))
+            if self.plan and (foreach_steps := self.plan.get_foreach_steps(step['id'])) is not None:
+                steps = set_foreach_tree(foreach_steps)
+            else:
+                steps = set_foreach_tree(ApiForeachStep.objects.filter(step_id=step['id']).values().order_by('id'))
         else:  # 调试时，不会传递foreach_id
             steps = params['steps']
-        prefix_label += step['step_name'] + '-'
-        res_status, res_data = SUCCESS, []
-        # 延迟导入避免循环引用
-        from .group_def import run_step_groups
-        
-        if type(for_times) != int and for_times in ('true', True):
-            while True:
-                # 满足break条件的话则中止循环
-                if self.status == INTERRUPT or break_code and run_params_code(
-                        break_code, copy.deepcopy(self.default_var), i):
-                    break
-                run_status, step_data = run_step_groups(
-                    self, copy.deepcopy(steps), prefix_label, cascader_level=cascader_level, i=i)
-                i += 1
-                res_data.append(step_data)
-                if run_status == FAILED:
-                    res_status = FAILED
-        else:
-            for _ in range(for_times):
-                # 满足break条件的话则中止循环
-                if self.status == INTERRUPT or break_code and run_params_code(
-                        break_code, copy.deepcopy(self.default_var), i):
-                    break
-                run_status, step_data = run_step_groups(
-                    self, copy.deepcopy(steps), prefix_label, cascader_level=cascader_level, i=i)
-                i += 1
-                res_data.append(step_data)
-                if run_status == FAILED:
-                    res_status = FAILED
+        # 循环次数为true时代表一直循环，直到满足中止条件
+        loop_range = itertools.count() if type(for_times) != int and for_times in ('true', True) else range(for_times)
+        return loop_range, break_code, steps
+
+    def foreach_need_break(self, break_code, i):
+        """
+        判断循环是否需要中止
+        """
+        return self.status == INTERRUPT or break_code and run_params_code(
+            break_code, VarScope(self.default_var), i)
+
+    def get_foreach_result(self, cascader_level, res_status, res_data):
+        """
+        汇总循环控制器的执行结果
+        """
         if cascader_level == 1:
             if self.cascader_error:
                 self.cascader_error = False
                 return {'status': FAILED, 'results': '步骤死循环或主计划步骤嵌套的子用例超过15层！'}
         return {'status': res_status, 'results': res_data}
 
+    def foreach(self, step, prefix_label='', cascader_level=1, i=0):
+        """
+        循环控制器
+        """
+        if cascader_level > 15:  # 嵌套超过15层则判断为死循环
+            self.cascader_error = True
+            return {'status': FAILED}
+        loop_range, break_code, steps = self.get_foreach_data(step)
+        prefix_label += step['step_name'] + '-'
+        res_status, res_data = SUCCESS, []
+        # 延迟导入避免循环引用
+        from .group_def import run_step_groups
+        from .foreach_def import get_foreach_parallel_cfg, run_foreach_parallel
+
+        if parallel_cfg := get_foreach_parallel_cfg(step):  # 开启并行执行时各次循环同时执行
+            res_status, res_data = run_foreach_parallel(
+                self, loop_range, break_code, steps, prefix_label, cascader_level, i, *parallel_cfg)
+            return self.get_foreach_result(cascader_level, res_status, res_data)
+        for _ in loop_range:
+            # 满足break条件的话则中止循环
+            if self.foreach_need_break(break_code, i):
+                break
+            run_status, step_data = run_step_groups(
+                self, copy_foreach_steps(steps), prefix_label, cascader_level=cascader_level, i=i)
+            i += 1
+            res_data.append(step_data)
+            if run_status == FAILED:
+                res_status = FAILED
+        return self.get_foreach_result(cascader_level, res_status, res_data)
+
     def parse_source_params(self, data, mode=TABLE_MODE, i=0, params_type='', file_list=None):
         """
         解析请求数据
@@ -604,7 +661,7 @@ class ApiCasesActuator:
         elif mode == TEXT_MODE:
             res = parse_param_value(data, self.default_var, i)
         elif mode == CODE_MODE:
-            res = run_params_code(data, copy.deepcopy(self.default_var), i)
+            res = run_params_code(data, VarScope(self.default_var), i)
             if isinstance(res, dict):
                 if params_type == API_VAR:  # 步骤类型为全局变量的话，则将其加入到全局变量中
                     self.default_var.update(res)
@@ -617,22 +674,8 @@ class ApiCasesActuator:
                 if isinstance(parm_v, dict) and 'type' in parm_v:
                     if parm_v['type'] == FORM_FILE_TYPE:
                         file_name, file_url = parm_v['name'], parm_v['value']
-                        r = requests.get(file_url)
-                        if r.status_code == 404:
-                            raise NotFoundFileError('未找到上传的文件：' + file_name)
-                        with open(file_name, 'wb') as f:
-                            f.write(r.content)
-                        file_type = os.path.splitext(file_name)[-1]
-                        if file_type in ['.xlsx'] and '有变量' in file_name:
-                            try:
-                                self.parse_excel_var_params(file_name)
-                            except Exception as e:
-                                file_list.append({'name': file_name, 'file': None})
-                                raise Exception('导入报错：' + str(e))
-                        file = open(file_name, 'rb')
-                        req_data[parm_name] = (file_name, file)
+                        req_data[parm_name] = (file_name, self.open_upload_file(file_name, file_url, file_list))
                         body_log[parm_name] = file_name
-                        file_list.append({'name': file_name, 'file': file})
                     else:
                         parm_v = parse_param_value(parm_v['value'], self.default_var)
                         body_log[parm_name] = parm_v
@@ -664,6 +707,14 @@ def parse_create_foreach_steps(save_step_objs, foreach_step, parent_step, next_o
     return next_order
 
 
+def copy_foreach_steps(steps):
+    """
+    复制循环控制器每次循环执行的步骤
+    执行时只会写入步骤的顶层字段（步骤id、状态、结果），浅复制每个步骤即可隔离各次循环的结果，不需要深复制整个步骤树
+    """
+    return [dict(step) for step in steps]
+
+
 def set_foreach_tree(_list):
     """
     生成循环控制器树
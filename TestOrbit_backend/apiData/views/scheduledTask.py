@@ -17,7 +17,12 @@ def schedule_api_cases(request):
         "case_ids": [22, 20],                // api_case 的id列表
         "parallel": 1,                       // 运行模式：0串行，1并行
         "owner_ids": [1, 2],                // 负责人user_id列表
-        "startTime": "2025-08-26T11:00:00"  // 预定运行时间（ISO 8601格式）
+        "startTime": "2025-08-26T11:00:00", // 预定运行时间（ISO 8601格式），设置了cron时可选
+        "recurring_interval": 60,            // 可选，重复执行的间隔（分钟）
+        "cron": "0 9 * * mon-fri",           // 可选，cron表达式（分 时 日 月 周），设置后按表达式周期执行
+        "misfire_policy": "run_once",        // 可选，错过预定时间时：run_once立即补执行一次，skip跳过
+        "misfire_grace_time": 60,            // 可选，错过预定时间的容忍秒数
+        "overlap_policy": "skip"             // 可选，上次执行未结束时：skip跳过，queue结束后再执行，allow同时执行
     }
     
     更新任务请求体格式（完全更新，必须包含所有字段）：
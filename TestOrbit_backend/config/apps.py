@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ConfigConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'config'
+
+    def ready(self):
+        """
+        环境及其关联关系修改后清空执行用的环境快照缓存
+        """
+        from utils.envDef import connect_env_signals
+        connect_env_signals()
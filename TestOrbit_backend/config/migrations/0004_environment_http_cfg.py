@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("config", "0003_remove_environment_remark_remove_environment_url_and_more"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="environment",
+            name="remark",
+        ),
+        migrations.RemoveField(
+            model_name="environment",
+            name="url",
+        ),
+        migrations.AddField(
+            model_name="environment",
+            name="http_cfg",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="格式: {pool_maxsize: 10, retries: 0, backoff_factor: 0, verify: true, cert: null}",
+                verbose_name="HTTP连接配置",
+            ),
+        ),
+    ]
@@ -21,6 +21,9 @@ class Environment(ComTimeModel):
     
     # 使用JSON字段存储动态变量
     variables = models.JSONField(default=dict, verbose_name="环境变量", help_text="格式: {变量名: {value: 值, description: 描述}}")
+    # 执行接口步骤时的HTTP连接配置（连接池大小、重试、TLS）
+    http_cfg = models.JSONField(default=dict, blank=True, verbose_name="HTTP连接配置",
+                                help_text="格式: {pool_maxsize: 10, retries: 0, backoff_factor: 0, verify: true, cert: null}")
 
     class Meta:
         verbose_name = '环境表'
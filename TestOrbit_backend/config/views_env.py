@@ -123,7 +123,7 @@ def handle_environment_get(request):
         
         # 统一查询环境数据
         environments = Environment.objects.filter(**filter_condition).values(
-            'id', 'name', 'variables', 'created', 'updated'
+            'id', 'name', 'variables', 'http_cfg', 'created', 'updated'
         )
         
         # 构造返回数据
@@ -134,6 +134,7 @@ def handle_environment_get(request):
                 'type': env_type,
                 'variables': env['variables'] or {},
                 'variable_count': len(env['variables'] or {}),
+                'http_cfg': env['http_cfg'] or {},
                 'created': env['created'],
                 'updated': env['updated']
             }
@@ -161,6 +162,7 @@ def handle_environment_create(request):
     env_type = request.data.get('type')
     name = request.data.get('name')
     variables = request.data.get('variables', {})
+    http_cfg = request.data.get('http_cfg') or {}
     project_id = request.data.get('project_id')
     case_id = request.data.get('case_id')
     
@@ -181,7 +183,8 @@ def handle_environment_create(request):
             environment = Environment.objects.create(
                 name=name,
                 type=env_type,
-                variables=variables
+                variables=variables,
+                http_cfg=http_cfg
             )
             
             # 创建关联关系
@@ -221,6 +224,7 @@ def handle_environment_update(request):
     env_id = request.data.get('id')
     name = request.data.get('name')
     variables = request.data.get('variables')
+    http_cfg = request.data.get('http_cfg')
     project_id = request.data.get('project_id')  # 全局环境需要
     case_id = request.data.get('case_id')        # 场景环境需要
     
@@ -245,6 +249,8 @@ def handle_environment_update(request):
             environment.name = name
         if variables is not None:
             environment.variables = variables
+        if http_cfg is not None:
+            environment.http_cfg = http_cfg
         environment.save()
         
         return Response({
@@ -253,7 +259,8 @@ def handle_environment_update(request):
                 "id": environment.id,
                 "name": environment.name,
                 "type": environment.type,
-                "variables": environment.variables
+                "variables": environment.variables,
+                "http_cfg": environment.http_cfg
             }
         })
         
@@ -0,0 +1,245 @@
+"""
+请求/响应内容的制品存储
+步骤结果和报告中请求日志的请求头、请求体、响应、响应头超过ARTIFACT_MIN_SIZE时，内容按sha256去重、zlib压缩后写入制品存储，
+结果中只保存引用：{'$artifact': 摘要, 'size': 原始大小}；重复执行得到相同内容时只保存一份
+读取时按块解压流式返回；没有任何报告、步骤结果引用的制品由垃圾回收（python manage.py gc_artifacts）删除
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+from utils.comDef import JSONEncoder, json_dumps, json_loads
+
+ARTIFACT_KEY = '$artifact'
+# 请求日志中保存为制品的字段
+ARTIFACT_FIELDS = ('header', 'body', 'response', 'res_header')
+DEFAULT_MIN_SIZE = 1024  # 未配置ARTIFACT_MIN_SIZE时，内容超过该大小(字节)才保存为制品
+CHUNK_SIZE = 64 * 1024
+DIGEST_PATTERN = re.compile('^[0-9a-f]{64}$')
+
+
+class LocalArtifactBackend:
+    """
+    本地文件系统存储：制品按摘要前两位分目录保存在ARTIFACT_ROOT下
+    """
+
+    def __init__(self, root=None):
+        self.root = str(root or getattr(settings, 'ARTIFACT_ROOT', os.path.join(settings.BASE_DIR, 'artifacts')))
+
+    def get_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def exists(self, digest):
+        """
+        制品是否已存在，存在时刷新修改时间，避免刚被引用的制品被垃圾回收
+        """
+        try:
+            os.utime(self.get_path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def write(self, digest, data):
+        """
+        先写入临时文件再重命名，并发写入同一制品时不会读到不完整的内容
+        """
+        path = self.get_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.path.exists(tmp_path) and os.remove(tmp_path)
+            raise
+
+    def open(self, digest):
+        return open(self.get_path(digest), 'rb')
+
+    def delete(self, digest):
+        try:
+            os.remove(self.get_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def iter_digests(self):
+        """
+        遍历所有制品，返回 (摘要, 修改时间)
+        """
+        if not os.path.isdir(self.root):
+            return
+        for prefix in os.listdir(self.root):
+            dir_path = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(dir_path):
+                continue
+            for name in os.listdir(dir_path):
+                if DIGEST_PATTERN.match(digest := prefix + name):
+                    yield digest, os.path.getmtime(os.path.join(dir_path, name))
+
+
+ARTIFACT_BACKENDS = {'local': LocalArtifactBackend}
+
+
+def is_artifact_ref(value):
+    return isinstance(value, dict) and ARTIFACT_KEY in value
+
+
+def iter_artifact_refs(data):
+    """
+    遍历结果数据中引用的所有制品摘要
+    """
+    if isinstance(data, dict):
+        if is_artifact_ref(data):
+            yield data[ARTIFACT_KEY]
+            return
+        for value in data.values():
+            yield from iter_artifact_refs(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from iter_artifact_refs(value)
+
+
+class ArtifactStore:
+    """
+    制品存储，backend需要提供exists、write、open、delete、iter_digests
+    """
+
+    def __init__(self, backend, min_size=None):
+        self.backend = backend
+        self.min_size = min_size if min_size is not None else getattr(settings, 'ARTIFACT_MIN_SIZE', DEFAULT_MIN_SIZE)
+
+    def put(self, value):
+        """
+        保存内容，返回引用；内容不超过min_size时返回None
+        """
+        data = (value if isinstance(value, str) else json_dumps(value, cls=JSONEncoder)).encode('utf-8')
+        if len(data) <= self.min_size:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.backend.exists(digest):
+            self.backend.write(digest, zlib.compress(data))
+        return {ARTIFACT_KEY: digest, 'size': len(data), 'type': 'text' if isinstance(value, str) else 'json'}
+
+    def offload_request_log(self, req_log):
+        """
+        返回请求日志的副本，其中较大的请求/响应内容替换为制品引用
+        """
+        new_log = None
+        for key in ARTIFACT_FIELDS:
+            value = req_log.get(key)
+            if value is None or is_artifact_ref(value) or not isinstance(value, (str, dict, list)):
+                continue
+            if ref := self.put(value):
+                new_log = new_log or dict(req_log)
+                new_log[key] = ref
+        return new_log or req_log
+
+    def offload(self, data):
+        """
+        把步骤结果（包括引用用例、循环控制器的子步骤结果）中所有请求日志的内容替换为制品引用
+        """
+        if isinstance(data, dict):
+            new_data = None
+            for key, value in data.items():
+                if key == 'request_log' and isinstance(value, dict):
+                    new_value = self.offload_request_log(value)
+                else:
+                    new_value = self.offload(value)
+                if new_value is not value:
+                    new_data = new_data or dict(data)
+                    new_data[key] = new_value
+            return new_data or data
+        elif isinstance(data, list):
+            new_items = [self.offload(value) for value in data]
+            return new_items if any(a is not b for a, b in zip(new_items, data)) else data
+        return data
+
+    def iter_chunks(self, digest):
+        """
+        按块解压读取制品内容
+        """
+        decompressor = zlib.decompressobj()
+        with self.backend.open(digest) as f:
+            while chunk := f.read(CHUNK_SIZE):
+                if data := decompressor.decompress(chunk):
+                    yield data
+        if data := decompressor.flush():
+            yield data
+
+    def load(self, ref):
+        """
+        读取引用的完整内容
+        """
+        data = b''.join(self.iter_chunks(ref[ARTIFACT_KEY])).decode('utf-8')
+        return json_loads(data) if ref.get('type') == 'json' else data
+
+    def resolve(self, data):
+        """
+        把数据中的制品引用替换为原内容，制品已被删除时保留引用
+        """
+        if isinstance(data, dict):
+            if is_artifact_ref(data):
+                try:
+                    return self.load(data)
+                except FileNotFoundError:
+                    return data
+            return {key: self.resolve(value) for key, value in data.items()}
+        elif isinstance(data, list):
+            return [self.resolve(value) for value in data]
+        return data
+
+    def collect_garbage(self, referenced, grace=3600, dry_run=False):
+        """
+        删除没有被引用的制品，grace秒内写入或被引用过的制品不删除（可能属于还未保存结果的执行）
+        返回删除的制品摘要列表
+        """
+        deadline = time.time() - grace
+        removed = [digest for digest, mtime in self.backend.iter_digests()
+                   if digest not in referenced and mtime < deadline]
+        if not dry_run:
+            for digest in removed:
+                self.backend.delete(digest)
+        return removed
+
+
+def offload_artifacts(data):
+    """
+    返回写入数据库用的副本，较大的请求/响应内容替换为制品引用；未启用制品存储时直接返回
+    """
+    if not data or not (artifact_store := get_artifact_store()):
+        return data
+    return artifact_store.offload(data)
+
+
+def resolve_artifacts(data):
+    """
+    读取步骤结果、报告时把其中的制品引用替换为原内容，没有引用时直接返回
+    """
+    if next(iter_artifact_refs(data), None) is None or not (artifact_store := get_artifact_store()):
+        return data
+    return artifact_store.resolve(data)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """
+    获取制品存储，后端由ARTIFACT_BACKEND配置，配置为空时不启用制品存储，返回None
+    """
+    global _store
+    if _store is None:
+        if not (backend_name := getattr(settings, 'ARTIFACT_BACKEND', 'local')):
+            return None
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore(ARTIFACT_BACKENDS[backend_name]())
+    return _store
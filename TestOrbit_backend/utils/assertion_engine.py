@@ -4,9 +4,130 @@
 """
 import json
 import re
+import threading
+
 import jsonpath
 from lxml import etree
 
+from utils.comDef import LRUCache
+from utils.jsonCodecDef import json_decode
+
+EXPRESSION_CACHE_SIZE = 1024  # 断言表达式编译结果缓存数量
+JSONPATH_SPECIAL = ('(', ':', ',')  # 含有这些字符的JSONPath（过滤、切片、多索引）使用jsonpath库执行
+PARSE_FAILED = object()  # 响应体无法解析为HTML或XML
+
+expression_cache = LRUCache(EXPRESSION_CACHE_SIZE)
+
+
+def compile_jsonpath(expression):
+    """
+    预编译JSONPath表达式：只包含键名和数组下标的表达式（如$.data.list[0].id）编译为逐级取值的键列表，
+    其他表达式返回None，执行时交给jsonpath库处理
+    """
+    if not expression:
+        return None
+    try:
+        cleaned_expr = jsonpath.normalize(expression)
+    except Exception:  # 执行时由jsonpath库抛出同样的错误
+        return None
+    if cleaned_expr.startswith("$;"):
+        cleaned_expr = cleaned_expr[2:]
+    locs = tuple(cleaned_expr.split(';'))
+    for loc in locs:
+        if not loc or loc in ('*', '..', '!') or any(c in loc for c in JSONPATH_SPECIAL):
+            return None
+    return locs
+
+
+def compile_regex(expression):
+    """
+    预编译正则表达式，表达式错误时返回None，执行时再由re抛出同样的错误
+    """
+    try:
+        return re.compile(expression)
+    except Exception:
+        return None
+
+
+def compile_xpath(expression):
+    """
+    预编译XPath表达式，表达式错误时返回None，执行时再由lxml抛出同样的错误
+    """
+    try:
+        return etree.XPath(expression)
+    except Exception:
+        return None
+
+
+EXPRESSION_COMPILERS = {'jsonpath': compile_jsonpath, 'regex': compile_regex, 'xpath': compile_xpath}
+
+
+def get_compiled_expression(rule):
+    """
+    获取断言规则表达式的编译结果，按断言类型和表达式缓存
+    """
+    key = (rule.type, rule.expression)
+    if rule.type == 'xpath':  # lxml编译的XPath只在编译它的线程中使用
+        key += (threading.get_ident(),)
+    return expression_cache.get_or_create(key, lambda: EXPRESSION_COMPILERS[rule.type](rule.expression))
+
+
+def get_jsonpath_matches(json_data, rule):
+    """
+    执行JSONPath表达式，结果与jsonpath.jsonpath一致：匹配到时返回匹配值列表，否则返回False
+    """
+    locs = get_compiled_expression(rule)
+    if locs is None:
+        return jsonpath.jsonpath(json_data, rule.expression)
+    if not json_data:
+        return False
+    for loc in locs:
+        if isinstance(json_data, dict) and loc in json_data:
+            json_data = json_data[loc]
+        elif isinstance(json_data, list) and loc.isdigit() and len(json_data) > int(loc):
+            json_data = json_data[int(loc)]
+        else:
+            return False
+    return [json_data]
+
+
+def parse_markup(html_content):
+    """
+    解析HTML/XML，无法解析时返回PARSE_FAILED
+    """
+    try:
+        # 尝试解析HTML
+        parser = etree.HTMLParser()
+        return etree.fromstring(html_content, parser)
+    except:
+        try:
+            # 尝试解析XML
+            return etree.fromstring(html_content.encode('utf-8'))
+        except:
+            return PARSE_FAILED
+
+
+class ResponseContext:
+    """
+    同一步骤所有断言规则共用的响应数据
+    JSON数据、正则匹配的文本、HTML/XML文档只在第一次使用时解析一次，解析出错时保存错误，后续规则使用时抛出同样的错误
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self._cache = {}
+
+    def get(self, name, func):
+        if name not in self._cache:
+            try:
+                self._cache[name] = (True, func())
+            except Exception as e:
+                self._cache[name] = (False, e)
+        success, value = self._cache[name]
+        if not success:
+            raise value
+        return value
+
 class AssertionResult:
     """
     断言结果类
@@ -64,16 +185,18 @@ class AssertionEngine:
             list: 断言结果列表
         """
         results = []
+        # 响应体在所有断言规则间共用，只解析一次
+        context = ResponseContext(response)
         
         # 遍历所有启用的断言规则
         for rule in [r for r in assertion_rules if r.enabled]:
             # 根据断言类型选择对应的断言方法
             if rule.type == 'jsonpath':
-                result = AssertionEngine._assert_jsonpath(response, rule)
+                result = AssertionEngine._assert_jsonpath(response, rule, context)
             elif rule.type == 'regex':
-                result = AssertionEngine._assert_regex(response, rule)
+                result = AssertionEngine._assert_regex(response, rule, context)
             elif rule.type == 'xpath':
-                result = AssertionEngine._assert_xpath(response, rule)
+                result = AssertionEngine._assert_xpath(response, rule, context)
             elif rule.type == 'header':
                 result = AssertionEngine._assert_header(response, rule)
             elif rule.type == 'status_code':
@@ -91,24 +214,26 @@ class AssertionEngine:
         return results
     
     @staticmethod
-    def _assert_jsonpath(response, rule):
+    def _assert_jsonpath(response, rule, context=None):
         """
         执行JSONPath断言
         
         Args:
             response (dict): HTTP响应对象
             rule (AssertionRule): 断言规则
+            context (ResponseContext, optional): 同一步骤断言共用的响应数据
             
         Returns:
             AssertionResult: 断言结果
         """
+        context = context or ResponseContext(response)
         try:
             # 获取响应体数据
             if isinstance(response, dict) and 'body' in response:
                 # 确保响应体是JSON对象
                 if isinstance(response['body'], str):
                     try:
-                        json_data = json.loads(response['body'])
+                        json_data = context.get('json', lambda: json_decode(response['body']))
                     except json.JSONDecodeError:
                         return AssertionResult(
                             success=False,
@@ -123,7 +248,7 @@ class AssertionEngine:
             
             # 应用JSONPath表达式
             expression = rule.expression
-            matches = jsonpath.jsonpath(json_data, expression)
+            matches = get_jsonpath_matches(json_data, rule)
             
             # 如果没有匹配结果
             if matches is False:
@@ -162,30 +287,33 @@ class AssertionEngine:
             )
     
     @staticmethod
-    def _assert_regex(response, rule):
+    def _assert_regex(response, rule, context=None):
         """
         执行正则表达式断言
         
         Args:
             response (dict): HTTP响应对象
             rule (AssertionRule): 断言规则
+            context (ResponseContext, optional): 同一步骤断言共用的响应数据
             
         Returns:
             AssertionResult: 断言结果
         """
+        context = context or ResponseContext(response)
         try:
             # 从响应中提取文本内容
             if isinstance(response, dict) and 'body' in response:
                 text = response['body']
                 if not isinstance(text, str):
-                    text = json.dumps(text)
+                    text = context.get('text', lambda: json.dumps(response['body']))
             else:
                 # 如果没有body字段，尝试直接使用response
-                text = str(response)
+                text = context.get('text', lambda: str(response))
                 
             # 应用正则表达式
             pattern = rule.expression
-            matches = re.findall(pattern, text)
+            compiled_pattern = get_compiled_expression(rule)
+            matches = compiled_pattern.findall(text) if compiled_pattern else re.findall(pattern, text)
             
             # 如果没有匹配结果
             if not matches:
@@ -224,17 +352,19 @@ class AssertionEngine:
             )
     
     @staticmethod
-    def _assert_xpath(response, rule):
+    def _assert_xpath(response, rule, context=None):
         """
         执行XPath断言
         
         Args:
             response (dict): HTTP响应对象
             rule (AssertionRule): 断言规则
+            context (ResponseContext, optional): 同一步骤断言共用的响应数据
             
         Returns:
             AssertionResult: 断言结果
         """
+        context = context or ResponseContext(response)
         try:
             # 从响应中提取HTML/XML内容
             if isinstance(response, dict) and 'body' in response:
@@ -250,24 +380,18 @@ class AssertionEngine:
                 html_content = str(response)
                 
             # 解析HTML/XML
-            try:
-                # 尝试解析HTML
-                parser = etree.HTMLParser()
-                tree = etree.fromstring(html_content, parser)
-            except:
-                try:
-                    # 尝试解析XML
-                    tree = etree.fromstring(html_content.encode('utf-8'))
-                except:
-                    return AssertionResult(
-                        success=False,
-                        message="无法解析响应体为HTML或XML",
-                        rule=rule
-                    )
+            tree = context.get('tree', lambda: parse_markup(html_content))
+            if tree is PARSE_FAILED:
+                return AssertionResult(
+                    success=False,
+                    message="无法解析响应体为HTML或XML",
+                    rule=rule
+                )
             
             # 应用XPath表达式
             xpath_expr = rule.expression
-            matches = tree.xpath(xpath_expr)
+            compiled_xpath = get_compiled_expression(rule) if tree is not None else None
+            matches = compiled_xpath(tree) if compiled_xpath else tree.xpath(xpath_expr)
             
             # 如果没有匹配结果
             if not matches:
@@ -0,0 +1,244 @@
+"""
+执行中断登记表
+执行中的用例按run_id登记中断回调，中断请求到达时立即调用回调把执行器标记为中断，步骤开始执行前检查该状态（协作式中断），
+不再为每次执行启动定时查库的监控线程
+中断通知通过可替换的后端发送：
+db（默认）先通知当前进程，其他进程（web的其他worker、run_worker执行进程、多进程模式的分片）由每个进程一个的轮询线程
+在有执行中的任务时按CANCEL_POLL_INTERVAL查询UserCfg.exec_status，不再为每次执行启动监控线程；
+memory只通知当前进程；redis通过发布订阅通知所有进程，CANCEL_REDIS_URL为local://时使用进程内的替身，不需要redis服务
+"""
+import json
+import queue
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.db import close_old_connections
+
+DEFAULT_CANCEL_CHANNEL = 'testorbit:cancel'
+DEFAULT_CANCEL_BACKEND = 'db'  # 未配置CANCEL_BACKEND时使用的中断通知后端
+DEFAULT_POLL_INTERVAL = 1  # 未配置CANCEL_POLL_INTERVAL时，db后端查询中断状态的间隔（秒）
+LOCAL_REDIS_SCHEME = 'local://'
+
+
+class MemoryCancelBackend:
+    """
+    进程内通知：发布的中断消息直接交给当前进程的登记表处理
+    """
+
+    def __init__(self):
+        self.handler = None
+
+    def start(self, registry):
+        self.handler = registry.handle
+
+    def publish(self, message):
+        self.handler and self.handler(message)
+
+
+class DatabaseCancelBackend(MemoryCancelBackend):
+    """
+    数据库通知：stop_casing已把UserCfg.exec_status标记为INTERRUPT，发布的消息直接交给当前进程的登记表处理，
+    其他进程的轮询线程查询到登记的用户被标记中断、登记的批量执行任务被取消后中断对应的执行；没有执行中的任务时不查询数据库
+    """
+
+    def __init__(self, interval=None):
+        super().__init__()
+        self.interval = interval or getattr(settings, 'CANCEL_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        self.registry = None
+
+    def start(self, registry):
+        super().start(registry)
+        self.registry = registry
+        threading.Thread(target=self._poll_loop, daemon=True).start()
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.registry.has_runs():
+                continue
+            try:
+                close_old_connections()
+                self.poll()
+            except Exception as e:
+                print(f'查询中断状态失败: {str(e)}')
+
+    def poll(self):
+        """
+        查询登记的执行是否被中断
+        """
+        # 延迟导入避免循环引用
+        from apiData.models import ExecutionJob
+        from user.models import UserCfg
+        from utils.constant import INTERRUPT
+
+        user_ids = self.registry.get_user_ids()
+        for user_id in UserCfg.objects.filter(user_id__in=user_ids, exec_status=INTERRUPT).values_list(
+                'user_id', flat=True):
+            self.handler({'run_id': None, 'user_id': user_id})
+        if job_ids := self.registry.get_job_ids():
+            for job_id in ExecutionJob.objects.filter(run_id__in=job_ids, status='cancelled').values_list(
+                    'run_id', flat=True):
+                self.handler({'run_id': None, 'job_id': job_id})
+
+
+class LocalRedis:
+    """
+    进程内的redis发布订阅替身，CANCEL_REDIS_URL为local://时使用，本地开发及测试不需要启动redis服务
+    """
+
+    def __init__(self):
+        self._queues = {}  # {频道: [订阅者的消息队列]}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, data):
+        with self._lock:
+            queues = list(self._queues.get(channel, []))
+        for message_queue in queues:
+            message_queue.put({'type': 'message', 'channel': channel, 'data': data})
+        return len(queues)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return LocalPubSub(self)
+
+
+class LocalPubSub:
+    """
+    LocalRedis的订阅对象
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.queue = queue.Queue()
+
+    def subscribe(self, *channels):
+        with self.client._lock:
+            for channel in channels:
+                self.client._queues.setdefault(channel, []).append(self.queue)
+
+    def listen(self):
+        while True:
+            yield self.queue.get()
+
+
+local_redis = LocalRedis()
+
+
+class RedisCancelBackend:
+    """
+    redis发布订阅通知：中断消息发布到频道，每个进程的订阅线程收到后交给本进程的登记表处理
+    """
+
+    def __init__(self, url=None, channel=None):
+        self.url = url or getattr(settings, 'CANCEL_REDIS_URL', 'redis://127.0.0.1:6379/0')
+        self.channel = channel or getattr(settings, 'CANCEL_REDIS_CHANNEL', DEFAULT_CANCEL_CHANNEL)
+        self.client = local_redis if self.url.startswith(LOCAL_REDIS_SCHEME) else redis.Redis.from_url(self.url)
+        self.handler = None
+
+    def start(self, registry):
+        self.handler = registry.handle
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self):
+        """
+        订阅线程：连接断开后间隔重连
+        """
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.handler(json.loads(message['data']))
+            except Exception as e:
+                print(f'中断通知订阅异常，3秒后重新订阅: {str(e)}')
+                time.sleep(3)
+
+    def publish(self, message):
+        try:
+            self.client.publish(self.channel, json.dumps(message))
+        except redis.RedisError as e:  # 发送失败时至少中断本进程中的执行
+            print(f'发送中断通知失败，只中断当前进程中的执行: {str(e)}')
+            self.handler and self.handler(message)
+
+
+CANCEL_BACKENDS = {'db': DatabaseCancelBackend, 'memory': MemoryCancelBackend, 'redis': RedisCancelBackend}
+
+
+class CancelRegistry:
+    """
+    中断登记表：{run_id: (user_id, 中断回调, job_id)}，job_id为执行所属的批量执行任务（ExecutionJob.run_id）
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._runs = {}
+        self._lock = threading.Lock()
+        self.backend.start(self)
+
+    def register(self, run_id, user_id, on_cancel, job_id=None):
+        with self._lock:
+            self._runs[run_id] = (user_id, on_cancel, job_id)
+
+    def unregister(self, run_id):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def has_runs(self):
+        return bool(self._runs)
+
+    def get_user_ids(self):
+        with self._lock:
+            return {user_id for user_id, _, _ in self._runs.values() if user_id is not None}
+
+    def get_job_ids(self):
+        with self._lock:
+            return {job_id for _, _, job_id in self._runs.values() if job_id is not None}
+
+    def cancel(self, run_id=None, user_id=None, job_id=None):
+        """
+        发送中断请求：指定run_id时中断该次执行，指定user_id时中断该用户所有执行中的用例，指定job_id时中断该批量执行任务的用例
+        """
+        self.backend.publish({'run_id': run_id, 'user_id': user_id, 'job_id': job_id})
+
+    def handle(self, message):
+        """
+        处理中断消息，调用匹配的执行的中断回调
+        """
+        run_id, user_id, job_id = message.get('run_id'), message.get('user_id'), message.get('job_id')
+        with self._lock:
+            callbacks = [on_cancel for _run_id, (_user_id, on_cancel, _job_id) in self._runs.items()
+                         if (run_id and _run_id == run_id) or (user_id is not None and _user_id == user_id)
+                         or (job_id and _job_id == job_id)]
+        for on_cancel in callbacks:
+            try:
+                on_cancel()
+            except Exception as e:
+                print(f'中断回调执行出错: {str(e)}')
+        if callbacks:
+            print(f'已中断{len(callbacks)}个执行中的任务')
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_cancel_registry():
+    """
+    获取当前进程的中断登记表，后端由CANCEL_BACKEND配置
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                backend = CANCEL_BACKENDS[getattr(settings, 'CANCEL_BACKEND', DEFAULT_CANCEL_BACKEND)]()
+                _registry = CancelRegistry(backend)
+    return _registry
+
+
+def reset_cancel_registry():
+    """
+    丢弃继承自父进程的中断登记表，fork出的子进程不会继承登记表的订阅线程，需要在子进程中重新创建
+    """
+    global _registry
+    _registry = None
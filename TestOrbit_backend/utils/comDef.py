@@ -2,7 +2,10 @@ import datetime
 import decimal
 import json
 import re
+import sys
 import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import pymysql
 import redis
@@ -16,10 +19,14 @@ from sshtunnel import SSHTunnelForwarder
 from utils.constant import MYSQL, FAILED, SUCCESS, HEADER_PARAM, VAR_PARAM, HOST_PARAM, STRING
 from utils.diyException import DiyBaseException
 from project.models import ProjectParamType
-# 从 config.models 中导入 Environment 而不是 ProjectEnvirData，因为业务逻辑已改变
-from config.models import Environment
+from utils.envDef import get_env_snapshot
+from utils.jsonCodecDef import json_decode
 from user.models import UserCfg, UserTempParams
 
+# 数据库连接的参数，从执行环境的变量中读取
+DB_CFG_FIELDS = ('db_type', 'db_host', 'db_port', 'db_user', 'db_pwd', 'db_database', 'ssh_host', 'ssh_user', 'ssh_pwd')
+DEFAULT_DB_PORT = 3306  # 环境中未配置db_port时使用的端口
+
 
 def get_module_related(model, mod_id, related):
     """
@@ -59,62 +66,88 @@ def get_next_id(model, prefix):
         return prefix + '0001'
 
 
+def create_ssh_tunnel(data):
+    """
+    创建并启动连接数据库的ssh隧道，未配置跳板机时返回None
+    """
+    ssh_host, ssh_user, ssh_pwd = data.get('ssh_host'), data.get('ssh_user'), data.get('ssh_pwd')
+    if not (ssh_host and ssh_user and ssh_pwd):
+        return None
+    ssh_server = SSHTunnelForwarder(
+        ssh_address_or_host=(ssh_host, 22), ssh_username=ssh_user, ssh_password=ssh_pwd,
+        remote_bind_address=(data['db_host'], int(data['db_port'])))
+    ssh_server.start()
+    return ssh_server
+
+
+def create_mysql_connection(data, db_host, db_port):
+    """
+    创建mysql连接
+    """
+    connect_data = {'host': db_host, 'user': data['db_user'], 'passwd': data['db_pwd'], 'port': db_port,
+                    'cursorclass': DictCursor, 'charset': 'utf8', 'client_flag': MULTI_STATEMENTS}
+    if 'db_database' in data:
+        connect_data['database'] = data['db_database']
+    connection = pymysql.connect(**connect_data)
+    connection.autocommit(True)  # 防止缓存
+    return connection
+
+
+def get_db_connect_error(e):
+    """
+    数据库连接失败时返回的结果
+    """
+    if isinstance(e, (OperationalError, redis.ConnectionError)):
+        return {'status': FAILED, 'results': f"连接失败：{e}"}
+    print('error', str(e))
+    if 'SSH gateway' in str(e):
+        return {'status': FAILED, 'results': "无法连接ssh！"}
+    return {'status': FAILED, 'results': "请完善必填项！"}
+
+
 def db_connect(data):
     """
     数据库连接
     """
     try:
-        ssh_host, ssh_user, ssh_pwd = data.get('ssh_host'), data.get('ssh_user'), data.get('ssh_pwd')
         db_port, db_host = int(data['db_port']), data['db_host']
-        db_con, ssh_server = None, None  # 初始化跳板机为空
-        if ssh_host and ssh_user and ssh_pwd:
-            ssh_server = SSHTunnelForwarder(
-                ssh_address_or_host=(ssh_host, 22), ssh_username=ssh_user, ssh_password=ssh_pwd,
-                remote_bind_address=(db_host, db_port))
-            ssh_server.start()
+        db_con = None
+        if ssh_server := create_ssh_tunnel(data):  # 初始化跳板机
             db_port, db_host = ssh_server.local_bind_port, '127.0.0.1'
-        if (db_type := data['db_type']) == MYSQL:
-            connect_data = {'host': db_host, 'user': data['db_user'], 'passwd': data['db_pwd'], 'port': db_port,
-                            'cursorclass': DictCursor, 'charset': 'utf8', 'client_flag': MULTI_STATEMENTS}
-            if 'db_database' in data:
-                connect_data['database'] = data['db_database']
-            db_con = pymysql.connect(**connect_data).cursor()
-            db_con.connection.autocommit(True)  # 防止缓存
-    except (OperationalError, redis.ConnectionError) as e:
-        return {'status': FAILED, 'results': f"连接失败：{e}"}
+        if data['db_type'] == MYSQL:
+            db_con = create_mysql_connection(data, db_host, db_port).cursor()
     except Exception as e:
-        print('error', str(e))
-        if 'SSH gateway' in str(e):
-            return {'status': FAILED, 'results': "无法连接ssh！"}
-        return {'status': FAILED, 'results': "请完善必填项！"}
+        return get_db_connect_error(e)
     return {'status': SUCCESS, 'db_con': db_con, 'ssh_server': ssh_server}
 
 
-def get_proj_envir_db_data(sql_proj_related, user_id=None, envir=None):
+def get_proj_envir_db_data(sql_proj_related, user_id=None, envir=None, snapshot=None):
     """
     获取项目环境下的数据库参数
     新版本: 由于业务逻辑已改变，直接从 Environment 中获取数据
+    snapshot：执行环境的快照，执行步骤时传递，避免每个SQL步骤都查询环境
+    连接参数（DB_CFG_FIELDS）取自环境中与连接同名的对象变量，如 default: {db_host: ..., db_user: ...}，
+    没有该变量时取自环境的db_host、db_user等变量；未配置db_host时返回None
     """
-    # 获取环境ID，默认为1
-    envir_id = envir or UserCfg.objects.filter(user_id=user_id).values_list('envir_id', flat=True).first() or 1
+    if snapshot is None:
+        # 获取环境ID，默认为1
+        envir_id = envir or UserCfg.objects.filter(user_id=user_id).values_list('envir_id', flat=True).first() or 1
+        snapshot = get_env_snapshot(envir_id)
     project_id, db_name = sql_proj_related
-    
-    # 从 Environment 中获取 url 作为数据库连接参数
-    environment = Environment.objects.filter(id=envir_id).first()
-    if not environment:
+
+    if not snapshot:
+        return None
+
+    db_cfg = snapshot.get(db_name)
+    if not isinstance(db_cfg, dict):
+        db_cfg = snapshot.variables
+    db_data = {field: db_cfg[field] for field in DB_CFG_FIELDS if db_cfg.get(field) not in (None, '')}
+    if not db_data.get('db_host'):
         return None
-    
-    # 构造数据库参数
-    # 注意：这是一个简化的实现，可能需要根据实际业务逻辑进行调整
-    db_data = {
-        'host': environment.url,
-        'db_name': db_name,
-        # 添加其他必要的默认参数
-        'port': 3306,
-        'username': 'default_user',
-        'password': 'default_password',
-    }
-    
+    db_data.setdefault('db_type', MYSQL)
+    db_data.setdefault('db_port', DEFAULT_DB_PORT)
+    db_data.setdefault('db_user', '')
+    db_data.setdefault('db_pwd', '')
     return db_data
 
 
@@ -170,12 +203,20 @@ def json_dumps(data, cls=None):
     return json.dumps(data, ensure_ascii=False)
 
 
+def json_dumps_bytes(data, cls=None):
+    """
+    dumps为utf-8编码的bytes，用于请求体
+    """
+    return json_dumps(data, cls).encode()
+
+
 def json_loads(data):
     """
     避免中文dumps后数据乱码
+    使用JSON_CODEC配置的解码实现（默认orjson，未安装时为标准库json）
     """
     try:
-        return json.loads(data)
+        return json_decode(data)
     except Exception:
         return data
 
@@ -207,6 +248,48 @@ class MyThread(threading.Thread):
             del self._target, self._args, self._kwargs
 
 
+class LRUCache:
+    """
+    线程安全的LRU缓存，超出容量时淘汰最久未使用的数据
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_create(self, key, create_func):
+        """
+        获取缓存数据，不存在时调用create_func生成并缓存
+        """
+        value = self.get(key, self)
+        if value is self:
+            value = create_func()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
 class SavePrintContent:
     """
     保存print打印的内容
@@ -218,6 +301,51 @@ class SavePrintContent:
     def write(self, *args, **kwargs):
         self.buffer.append(args)
 
+    def flush(self):
+        pass
+
+
+class ThreadStdout:
+    """
+    按线程重定向print输出：正在捕获输出的线程写入各自的SavePrintContent，其他线程仍写入原来的标准输出
+    替代直接替换sys.stdout，多线程同时执行用户代码时不会互相覆盖、也不会丢失其他线程的输出
+    """
+    _local = threading.local()
+    _lock = threading.Lock()
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    def get_target(self):
+        buffer = getattr(self._local, 'buffer', None)
+        return self.stdout if buffer is None else buffer
+
+    def write(self, *args, **kwargs):
+        return self.get_target().write(*args, **kwargs)
+
+    def flush(self):
+        return self.get_target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stdout, name)
+
+    @classmethod
+    @contextmanager
+    def capture(cls):
+        """
+        捕获当前线程print的内容，返回保存内容的SavePrintContent
+        """
+        if not isinstance(sys.stdout, cls):
+            with cls._lock:
+                if not isinstance(sys.stdout, cls):
+                    sys.stdout = cls(sys.stdout)
+        old_buffer = getattr(cls._local, 'buffer', None)
+        cls._local.buffer = SavePrintContent()
+        try:
+            yield cls._local.buffer
+        finally:
+            cls._local.buffer = old_buffer
+
 
 def get_module_children(module_ids: list, module) -> list:
     """
@@ -11,6 +11,24 @@ FAILED_STOP = 8  # 失败中断
 STATUS_LABEL = {WAITING: '等待执行', FAILED: '失败', RUNNING: '执行中', FINISH: '执行完成', SUCCESS: '成功', SKIP: '跳过',
                 INTERRUPT: '中断', DISABLED: '禁用', FAILED_STOP: '失败中断'}
 # --执行状态 end--
+# --批量执行模式 start--
+SERIAL_MODE = 0  # 串行执行
+THREAD_MODE = 1  # 多线程并行执行
+ASYNC_MODE = 2  # 协程异步并发执行
+PROCESS_MODE = 3  # 多进程分片执行
+# --批量执行模式 end--
+# --执行触发方式 start--
+MANUAL_TRIGGER = 0  # 手动执行
+BATCH_TRIGGER = 1  # 批量执行
+SCHEDULED_TRIGGER = 2  # 定时任务执行
+TRIGGER_LABEL = {MANUAL_TRIGGER: '手动执行', BATCH_TRIGGER: '批量执行', SCHEDULED_TRIGGER: '定时执行'}
+# --执行触发方式 end--
+# --循环控制器并行执行时变量的写回方式 start--
+FOREACH_MERGE_LAST = 'last'  # 按循环顺序写回，后面循环写入的值覆盖前面的
+FOREACH_MERGE_COLLECT = 'collect'  # 写回为按循环顺序排列的各次循环写入的值列表
+FOREACH_MERGE_NONE = 'none'  # 不写回，各次循环写入的变量只在本次循环内有效
+FOREACH_MERGE_POLICIES = (FOREACH_MERGE_LAST, FOREACH_MERGE_COLLECT, FOREACH_MERGE_NONE)
+# --循环控制器并行执行时变量的写回方式 end--
 API_HEADER = 'header'
 API_HOST = 'host'
 API_VAR = 'var'
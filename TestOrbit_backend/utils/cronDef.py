@@ -0,0 +1,99 @@
+"""
+cron表达式解析
+支持5段式表达式：分 时 日 月 周，每段支持 *、数字、范围(1-5)、步长(*/15、1-30/5)、列表(1,3,5)以及月份、星期的英文缩写
+日和周同时指定时满足其一即可（与crontab一致），周的0和7都表示周日
+"""
+import datetime
+
+from utils.comDef import LRUCache
+
+MONTH_NAMES = {name: i for i, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+WEEK_NAMES = {name: i for i, name in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))}
+# (字段名, 最小值, 最大值, 名称映射)
+CRON_FIELDS = (('分', 0, 59, {}), ('时', 0, 23, {}), ('日', 1, 31, {}), ('月', 1, 12, MONTH_NAMES),
+               ('周', 0, 7, WEEK_NAMES))
+MAX_SEARCH_YEARS = 5  # 查找下次执行时间的最大范围，超过时认为表达式不会再触发（如2月30日）
+
+
+def parse_cron_value(value, names, field_name):
+    value = value.lower()
+    if value in names:
+        return names[value]
+    if not value.isdigit():
+        raise ValueError(f'cron表达式的{field_name}字段存在无效的值：{value}')
+    return int(value)
+
+
+def parse_cron_field(expr, field):
+    """
+    解析cron表达式的一段，返回允许的值集合
+    """
+    field_name, min_v, max_v, names = field
+    values = set()
+    for part in expr.split(','):
+        part, sep, step = part.partition('/')
+        step = parse_cron_value(step, {}, field_name) if step else 1
+        if part == '*':
+            start, end = min_v, max_v
+        elif '-' in part:
+            start, end = (parse_cron_value(v, names, field_name) for v in part.split('-', 1))
+        else:
+            start = parse_cron_value(part, names, field_name)
+            end = max_v if sep else start  # 1/5 表示从1开始每5个
+        if not (min_v <= start <= end <= max_v) or step < 1:
+            raise ValueError(f'cron表达式的{field_name}字段超出范围：{expr}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """
+    解析后的cron表达式
+    """
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != len(CRON_FIELDS):
+            raise ValueError('cron表达式格式错误，需要5段：分 时 日 月 周')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            parse_cron_field(part, field) for part, field in zip(parts, CRON_FIELDS))
+        self.weekdays = {v % 7 for v in weekdays}
+        self.day_any, self.week_any = parts[2] == '*', parts[4] == '*'
+
+    def match_day(self, date):
+        day_match = date.day in self.days
+        week_match = (date.weekday() + 1) % 7 in self.weekdays  # 转换为0表示周日
+        if self.day_any or self.week_any:
+            return day_match and week_match
+        return day_match or week_match
+
+    def get_next(self, after):
+        """
+        返回after之后（不含after）的下一次执行时间，精确到分钟，找不到时返回None
+        """
+        t = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        end = after + datetime.timedelta(days=366 * MAX_SEARCH_YEARS)
+        while t <= end:
+            if t.month not in self.months:
+                t = (t.replace(day=1) + datetime.timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self.match_day(t):
+                t = t.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + datetime.timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += datetime.timedelta(minutes=1)
+            else:
+                return t
+        return None
+
+
+cron_cache = LRUCache(maxsize=256)
+
+
+def get_cron_expression(expression):
+    """
+    获取解析后的cron表达式，同一表达式只解析一次
+    """
+    return cron_cache.get_or_create(expression.strip(), lambda: CronExpression(expression.strip()))
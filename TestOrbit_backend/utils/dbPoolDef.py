@@ -0,0 +1,327 @@
+"""
+SQL步骤的数据库连接池
+按连接目标（数据库类型、地址、端口、账号、库名及跳板机）缓存数据库连接，同一跳板机+数据库地址只建立一条ssh隧道，由该目标的所有连接共用；
+连接在进程（web进程、执行进程）的生命周期内复用：取出时空闲较久的连接先ping检查，不可用的重新创建；
+每个目标的连接数不超过DB_POOL_MAX_SIZE，达到上限时等待归还；空闲超过DB_POOL_IDLE_TIMEOUT的连接及不再使用的ssh隧道由后台线程关闭；
+归还时重置连接的会话状态（COM_RESET_CONNECTION），上一个步骤的USE、SET、临时表、LOCK TABLES等不会影响之后使用该连接的步骤
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from utils.comDef import create_ssh_tunnel, create_mysql_connection, get_db_connect_error, DB_CFG_FIELDS
+from utils.constant import MYSQL, SUCCESS, FAILED
+
+DEFAULT_MAX_SIZE = 5  # 未配置DB_POOL_MAX_SIZE时，每个连接目标最多同时打开的连接数
+DEFAULT_IDLE_TIMEOUT = 300  # 未配置DB_POOL_IDLE_TIMEOUT时，连接、ssh隧道空闲超过该时间（秒）后关闭
+DEFAULT_CHECK_INTERVAL = 30  # 未配置DB_POOL_CHECK_INTERVAL时，空闲超过该时间（秒）的连接取出时先检查是否可用
+DEFAULT_WAIT_TIMEOUT = 30  # 未配置DB_POOL_WAIT_TIMEOUT时，连接数达到上限后等待归还的最长时间（秒）
+COM_RESET_CONNECTION = 0x1f  # 重置会话的命令（MySQL 5.7.3+、MariaDB 10.2.4+），pymysql未提供
+RESET_COMMAND_METHODS = ('_execute_command', '_read_ok_packet')  # 发送重置命令依赖的pymysql内部方法
+TARGET_FIELDS = DB_CFG_FIELDS
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+def send_reset_connection(connection):
+    """
+    发送COM_RESET_CONNECTION，pymysql没有提供公开的接口，使用其内部的_execute_command、_read_ok_packet；
+    当前pymysql版本没有这些方法时返回False
+    """
+    if not all(hasattr(connection, name) for name in RESET_COMMAND_METHODS):
+        return False
+    connection._execute_command(COM_RESET_CONNECTION, b'')
+    connection._read_ok_packet()
+    return True
+
+
+def get_target_key(data):
+    return tuple(str(data.get(field) or '') for field in TARGET_FIELDS)
+
+
+class SSHTunnel:
+    """
+    共用的ssh隧道，users为正在使用隧道的连接数
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.server = create_ssh_tunnel(data)
+        self.users = 0
+        self.last_used = time.monotonic()
+
+    def ensure_active(self):
+        """
+        隧道断开时重新连接，返回本地绑定的端口
+        """
+        if not self.server.is_active:
+            print(f"ssh隧道已断开，重新连接：{self.data.get('ssh_host')}")
+            self.server.restart()
+        return self.server.local_bind_port
+
+    def close(self):
+        try:
+            self.server.close()
+        except Exception as e:
+            print(f'关闭ssh隧道出错: {str(e)}')
+
+
+class PooledConnection:
+    """
+    连接池中的连接，tunnel为连接使用的ssh隧道
+    """
+
+    def __init__(self, connection, tunnel=None):
+        self.connection = connection
+        self.tunnel = tunnel
+        self.last_used = time.monotonic()
+
+    def is_usable(self, check_interval):
+        """
+        空闲超过check_interval的连接ping检查是否可用
+        """
+        if not self.connection.open:
+            return False
+        if time.monotonic() - self.last_used < check_interval:
+            return True
+        try:
+            self.connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def reset(self, database=None):
+        """
+        重置会话状态：回滚未提交的事务，清除会话变量、临时表及表锁，再恢复连接时的字符集、自动提交及库，返回是否重置成功；
+        pymysql或数据库不支持重置、未配置库且当前库已被USE切换时返回False，该连接不再复用
+        """
+        connection = self.connection
+        try:
+            if not send_reset_connection(connection):
+                print('当前pymysql版本不支持重置会话，不再复用该连接')
+                return False
+            connection.set_character_set(connection.charset, connection.collation)
+            connection.autocommit(True)
+            if database:
+                connection.select_db(database)
+                return True
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT DATABASE() AS name')
+                return cursor.fetchone()['name'] is None
+        except Exception as e:
+            print(f'重置数据库连接出错，不再复用该连接: {str(e)}')
+            return False
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class DBConnectionPool:
+    """
+    进程内的数据库连接池
+    """
+
+    def __init__(self, max_size=None, idle_timeout=None, check_interval=None, wait_timeout=None):
+        self.max_size = max_size or getattr(settings, 'DB_POOL_MAX_SIZE', DEFAULT_MAX_SIZE)
+        self.idle_timeout = idle_timeout or getattr(settings, 'DB_POOL_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT)
+        self.check_interval = check_interval if check_interval is not None else getattr(
+            settings, 'DB_POOL_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        self.wait_timeout = wait_timeout or getattr(settings, 'DB_POOL_WAIT_TIMEOUT', DEFAULT_WAIT_TIMEOUT)
+        self._idle = {}  # {连接目标: deque([PooledConnection])} 空闲的连接，最近归还的在右侧
+        self._opened = {}  # {连接目标: 已打开的连接数（包括使用中的）}
+        self._tunnels = {}  # {隧道目标: SSHTunnel}
+        self._condition = threading.Condition()
+        self._reaper = None
+        self._closed = False
+
+    def acquire(self, data):
+        """
+        取出一个可用的连接，没有空闲连接且未达到上限时创建新连接
+        """
+        key = get_target_key(data)
+        deadline = time.monotonic() + self.wait_timeout
+        with self._condition:
+            self._start_reaper()
+            while True:
+                idle = self._idle.get(key)
+                while idle:
+                    conn = idle.pop()
+                    if conn.is_usable(self.check_interval):
+                        return conn
+                    self._discard(key, conn)
+                if self._opened.get(key, 0) < self.max_size:
+                    self._opened[key] = self._opened.get(key, 0) + 1
+                    break
+                if (remaining := deadline - time.monotonic()) <= 0 or not self._condition.wait(remaining):
+                    raise PoolTimeoutError(f'等待数据库连接超时，连接数已达到上限{self.max_size}')
+        try:
+            return self._create(data)
+        except Exception:
+            with self._condition:
+                self._opened[key] -= 1
+                self._condition.notify()
+            raise
+
+    def _create(self, data):
+        """
+        创建新连接，配置了跳板机时通过共用的ssh隧道连接
+        """
+        db_host, db_port, tunnel = data['db_host'], int(data['db_port']), None
+        if data.get('ssh_host') and data.get('ssh_user') and data.get('ssh_pwd'):
+            tunnel = self._get_tunnel(data)
+            try:
+                db_host, db_port = '127.0.0.1', tunnel.ensure_active()
+                connection = create_mysql_connection(data, db_host, db_port)
+            except Exception:
+                self._release_tunnel(tunnel)
+                raise
+        else:
+            connection = create_mysql_connection(data, db_host, db_port)
+        return PooledConnection(connection, tunnel)
+
+    def _get_tunnel(self, data):
+        tunnel_key = tuple(str(data.get(field) or '') for field in ('ssh_host', 'ssh_user', 'ssh_pwd', 'db_host', 'db_port'))
+        with self._condition:
+            if (tunnel := self._tunnels.get(tunnel_key)) is not None:
+                tunnel.users += 1
+                return tunnel
+        tunnel = SSHTunnel(data)  # 建立隧道较慢，不在锁内进行
+        with self._condition:
+            if (existing := self._tunnels.get(tunnel_key)) is not None:
+                tunnel.close()  # 其他线程已经建立了同一隧道
+                tunnel = existing
+            else:
+                self._tunnels[tunnel_key] = tunnel
+            tunnel.users += 1
+            return tunnel
+
+    def _release_tunnel(self, tunnel):
+        with self._condition:
+            tunnel.users -= 1
+            tunnel.last_used = time.monotonic()
+
+    def release(self, data, conn):
+        """
+        归还连接并重置会话状态，断开或无法重置的连接直接关闭
+        """
+        key = get_target_key(data)
+        reusable = conn.connection.open and not self._closed and conn.reset(data.get('db_database'))
+        with self._condition:
+            if reusable and not self._closed:
+                conn.last_used = time.monotonic()
+                self._idle.setdefault(key, deque()).append(conn)
+            else:
+                self._discard(key, conn)
+            self._condition.notify()
+
+    def _discard(self, key, conn):
+        """
+        关闭连接，需要在锁内调用
+        """
+        conn.close()
+        self._opened[key] -= 1
+        if conn.tunnel:
+            conn.tunnel.users -= 1
+            conn.tunnel.last_used = time.monotonic()
+
+    @contextmanager
+    def connect(self, data):
+        """
+        取出连接执行sql，返回与db_connect相同格式的结果：{'status': SUCCESS, 'db_con': 游标}，连接失败时status为FAILED
+        """
+        if data.get('db_type') != MYSQL:
+            yield {'status': FAILED, 'results': '不支持的数据库类型！'}
+            return
+        try:
+            conn = self.acquire(data)
+        except PoolTimeoutError as e:
+            yield {'status': FAILED, 'results': str(e)}
+            return
+        except Exception as e:
+            yield get_db_connect_error(e)
+            return
+        cursor = conn.connection.cursor()
+        try:
+            yield {'status': SUCCESS, 'db_con': cursor}
+        finally:
+            try:
+                cursor.close()  # 读取完多条语句剩余的结果集，否则下次使用该连接时会出错
+            except Exception:
+                conn.close()
+            self.release(data, conn)
+
+    def evict_idle(self):
+        """
+        关闭空闲超时的连接及不再使用的ssh隧道，返回关闭的连接数
+        """
+        now, evicted = time.monotonic(), 0
+        with self._condition:
+            for key, idle in self._idle.items():
+                while idle and now - idle[0].last_used > self.idle_timeout:
+                    self._discard(key, idle.popleft())
+                    evicted += 1
+            for tunnel_key, tunnel in list(self._tunnels.items()):
+                if tunnel.users <= 0 and now - tunnel.last_used > self.idle_timeout:
+                    del self._tunnels[tunnel_key]
+                    tunnel.close()
+        if evicted:
+            print(f'已关闭{evicted}个空闲的数据库连接')
+        return evicted
+
+    def _start_reaper(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._run_reaper, daemon=True)
+            self._reaper.start()
+
+    def _run_reaper(self):
+        while not self._closed:
+            time.sleep(min(self.idle_timeout, 60))
+            try:
+                self.evict_idle()
+            except Exception as e:
+                print(f'清理空闲数据库连接出错: {str(e)}')
+
+    def close(self):
+        """
+        关闭所有空闲连接及ssh隧道，使用中的连接归还时关闭
+        """
+        with self._condition:
+            self._closed = True
+            for key, idle in self._idle.items():
+                while idle:
+                    self._discard(key, idle.pop())
+            for tunnel in self._tunnels.values():
+                tunnel.close()
+            self._tunnels.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    """
+    获取当前进程的数据库连接池
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DBConnectionPool()
+    return _pool
+
+
+def reset_db_pool():
+    """
+    丢弃继承自父进程的连接池，fork出的子进程不能与父进程共用数据库连接及ssh隧道，也不会继承清理线程
+    """
+    global _pool
+    _pool = None
@@ -0,0 +1,130 @@
+"""
+执行用的环境快照
+执行开始时一次性解析执行环境、用例所属项目绑定的全局环境（ProjectEnvironment）及用例绑定的局部环境（CaseEnvironment）的变量，
+按 全局环境 -> 局部环境 的顺序合并（后者覆盖前者，选择的执行环境在同一层中优先），得到只读的环境快照，执行期间不再查库。
+快照按 (执行环境, 用例, 项目) 缓存在进程内，环境及其关联关系保存、删除时通过信号清空缓存；
+信号只作用于当前进程，其他进程（执行进程、其他web进程）中的缓存在ENV_SNAPSHOT_TTL秒后过期重新加载。
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+
+from config.models import Environment, ProjectEnvironment, CaseEnvironment
+
+DEFAULT_TTL = 60  # 未配置ENV_SNAPSHOT_TTL时，环境快照缓存的有效期（秒）
+GLOBAL_ENV = 1  # 全局环境，与Environment.TYPE_CHOICES一致
+ENV_URL_VAR = 'url'  # 环境变量中作为接口地址（项目配置的host）的变量名
+
+
+class EnvSnapshot:
+    """
+    只读的环境快照
+    env_id：执行环境id；variables：合并后的变量 {变量名: 值}；layers：参与合并的环境id（按合并顺序）
+    """
+    __slots__ = ('env_id', 'name', 'variables', 'http_cfg', 'layers')
+
+    def __init__(self, environment, layers):
+        variables = {}
+        for env in layers:
+            for name, var_cfg in (env.variables or {}).items():
+                variables[name] = var_cfg.get('value') if isinstance(var_cfg, dict) else var_cfg
+        for key, value in (('env_id', environment.id), ('name', environment.name),
+                           ('variables', MappingProxyType(variables)),
+                           ('http_cfg', MappingProxyType(dict(environment.http_cfg or {}))),
+                           ('layers', tuple(env.id for env in layers))):
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('环境快照不可修改')
+
+    @property
+    def url(self):
+        return self.variables.get(ENV_URL_VAR) or ''
+
+    def get(self, name, default=None):
+        return self.variables.get(name, default)
+
+
+def load_env_snapshot(envir_id, case_id=None, project_id=None):
+    """
+    查询环境数据生成快照，执行环境不存在时返回None
+    """
+    environment = Environment.objects.filter(id=envir_id).first()
+    if not environment:
+        return None
+    global_envs = list(Environment.objects.filter(
+        project_relations__project_id=project_id).order_by('project_relations__id')) if project_id else []
+    local_envs = list(Environment.objects.filter(
+        case_relations__case_id=case_id).order_by('case_relations__id')) if case_id else []
+    # 选择的执行环境在所属的层中最后合并，同名变量以执行环境为准
+    tier = global_envs if environment.type == GLOBAL_ENV else local_envs
+    tier[:] = [env for env in tier if env.id != environment.id] + [environment]
+    return EnvSnapshot(environment, global_envs + local_envs)
+
+
+class EnvSnapshotCache:
+    """
+    进程内的环境快照缓存
+    """
+
+    def __init__(self):
+        self._snapshots = {}  # {(执行环境, 用例, 项目): (快照, 加载时间)}
+        self._generation = 0  # 每次清空缓存后加1，清空前开始加载的快照不再写入缓存
+        self._lock = threading.Lock()
+
+    def get(self, envir_id, case_id=None, project_id=None):
+        key = (envir_id, case_id, project_id)
+        ttl = getattr(settings, 'ENV_SNAPSHOT_TTL', DEFAULT_TTL)
+        with self._lock:
+            cached, generation = self._snapshots.get(key), self._generation
+        if cached and time.monotonic() - cached[1] < ttl:
+            return cached[0]
+        snapshot = load_env_snapshot(envir_id, case_id, project_id)
+        with self._lock:
+            if generation == self._generation:
+                self._snapshots[key] = (snapshot, time.monotonic())
+        return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+            self._generation += 1
+
+
+env_snapshot_cache = EnvSnapshotCache()
+
+
+def get_env_snapshot(envir_id, case_id=None, project_id=None):
+    """
+    获取执行环境的快照，传递了用例、项目时合并项目的全局环境及用例的局部环境
+    """
+    return env_snapshot_cache.get(envir_id, case_id, project_id)
+
+
+def get_env_url(envir_id):
+    """
+    获取环境的接口地址，环境不存在时返回空字符串
+    """
+    snapshot = get_env_snapshot(envir_id) if envir_id else None
+    return snapshot.url if snapshot else ''
+
+
+def clear_env_snapshots(**kwargs):
+    """
+    环境及其关联关系修改后清空快照缓存，作为post_save、post_delete信号的接收函数
+    """
+    env_snapshot_cache.clear()
+
+
+def connect_env_signals():
+    """
+    注册清空环境快照缓存的信号
+    """
+    # 延迟导入避免循环引用
+    from django.db.models.signals import post_save, post_delete
+
+    for model in (Environment, ProjectEnvironment, CaseEnvironment):
+        for signal in (post_save, post_delete):
+            signal.connect(clear_env_snapshots, sender=model, dispatch_uid=f'env_snapshot_{model.__name__}')
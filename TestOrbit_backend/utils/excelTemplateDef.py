@@ -0,0 +1,208 @@
+"""
+含变量的excel上传文件的模板渲染
+名称包含“有变量”的xlsx文件首次使用时编译为模板（按文件内容hash缓存）：只记录值中含有变量（${}、eval(...)）的文本单元格及其参数模板，
+渲染时不再加载工作簿、遍历所有单元格，而是按顺序把压缩包中的文件写入新的xlsx：不含变量的文件原样写入，
+工作表按编译时切分的片段流式写入，含变量的单元格替换为渲染后的值（与openpyxl写入的类型一致：数字、布尔、公式、文本）。
+渲染结果按文件内容hash及单元格用到的变量的值缓存，循环中变量值相同的多次请求只渲染一次；
+含嵌套变量、eval表达式的模板用到的变量无法确定，每次都重新渲染。
+"""
+import hashlib
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from utils.comDef import LRUCache
+from utils.templateDef import compile_template, ConstTemplate, StrTemplate
+
+TEMPLATE_CACHE_SIZE = 64  # 编译后的excel模板缓存数量
+RENDER_CACHE_SIZE = 64  # 渲染后的excel文件缓存数量
+SHEET_PATTERN = re.compile(r'xl/worksheets/[^/]+\.xml$')
+CELL_PATTERN = re.compile(r'<(?P<prefix>(?:\w+:)?)c\b(?P<attrs>[^>]*?)(?:/>|>(?P<body>.*?)</(?P=prefix)c>)', re.S)
+ATTR_PATTERN = re.compile(r'\s+([\w:]+)="([^"]*)"')
+VALUE_PATTERN = re.compile(r'<(?:\w+:)?v>([^<]*)</(?:\w+:)?v>')
+TEXT_PATTERN = re.compile(r'<(?:\w+:)?t(?:\s[^>]*)?>([^<]*)</(?:\w+:)?t>')
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+MISSING = object()
+
+excel_template_cache = LRUCache(TEMPLATE_CACHE_SIZE)
+excel_render_cache = LRUCache(RENDER_CACHE_SIZE)
+
+
+def unescape_xml(text):
+    return text.replace('&lt;', '<').replace('&gt;', '>').replace('&quot;', '"').replace(
+        '&apos;', "'").replace('&amp;', '&')
+
+
+def read_shared_strings(workbook_zip):
+    """
+    读取共享字符串表，富文本按openpyxl的方式拼接各段文字（不含注音）
+    """
+    try:
+        data = workbook_zip.read('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    strings = []
+    for si in ElementTree.fromstring(data).iter(SHEET_NS + 'si'):
+        # 纯文本为si下的t，富文本为各段r下的t，rPh（注音）不属于单元格的值
+        texts = [t.text or '' for t in si.findall(SHEET_NS + 't')]
+        texts += [t.text or '' for r in si.findall(SHEET_NS + 'r') for t in r.findall(SHEET_NS + 't')]
+        strings.append(''.join(texts))
+    return strings
+
+
+def get_var_roots(template):
+    """
+    返回模板用到的变量名，无法确定时（嵌套变量、eval表达式、变量名为空）返回None
+    """
+    if not isinstance(template, StrTemplate) or template.is_eval:
+        return None
+    roots = set()
+    for _, var_name, _, inner in template.ops:
+        root = var_name.split('.')[0].split('[')[0].lstrip('*')
+        if inner is not None or not root:
+            return None
+        roots.add(root)
+    return roots
+
+
+class CellSlot:
+    """
+    含变量的单元格：prefix为命名空间前缀，attrs为除类型(t)外的属性
+    """
+    __slots__ = ('prefix', 'attrs', 'template')
+
+    def __init__(self, prefix, attrs, template):
+        self.prefix, self.attrs, self.template = prefix, attrs, template
+
+    def render(self, params):
+        """
+        按openpyxl写入单元格的方式生成单元格的xml
+        """
+        value, tag = self.template.render(params), self.prefix + 'c'
+        if value is None:  # 与openpyxl一致，没有样式的空单元格不写入
+            return f'<{tag}{self.attrs}/>' if ' s="' in self.attrs else ''
+        if isinstance(value, bool):
+            return f'<{tag}{self.attrs} t="b"><{self.prefix}v>{int(value)}</{self.prefix}v></{tag}>'
+        if isinstance(value, (int, float, Decimal)):
+            return f'<{tag}{self.attrs}><{self.prefix}v>{value}</{self.prefix}v></{tag}>'
+        if not isinstance(value, str):
+            raise ValueError(f'Cannot convert {value!r} to Excel')
+        if value.startswith('=') and len(value) > 1:  # 与openpyxl一致，=开头的文本作为公式
+            return f'<{tag}{self.attrs}><{self.prefix}f>{escape(value[1:])}</{self.prefix}f><{self.prefix}v></{self.prefix}v></{tag}>'
+        return (f'<{tag}{self.attrs} t="inlineStr"><{self.prefix}is><{self.prefix}t xml:space="preserve">'
+                f'{escape(value)}</{self.prefix}t></{self.prefix}is></{tag}>')
+
+
+class ExcelTemplate:
+    """
+    编译后的xlsx模板
+    members：压缩包中的文件 [(ZipInfo, 内容)]，不含变量的文件内容为bytes，含变量的工作表为 [字面量片段(str)或CellSlot, ...]
+    roots：所有单元格用到的变量名，无法确定时为None
+    """
+
+    def __init__(self, members, cell_count, roots):
+        self.members = members
+        self.cell_count = cell_count
+        self.roots = roots
+
+    def get_fingerprint(self, params):
+        """
+        单元格用到的变量的值的指纹，变量值不变时渲染结果不变
+        """
+        if self.roots is None:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        for root in sorted(self.roots):
+            digest.update(repr((root, params.get(root, MISSING))).encode('utf-8', 'surrogatepass'))
+        return digest.digest()
+
+    def render(self, params):
+        """
+        流式写入渲染后的xlsx，返回文件内容
+        """
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as workbook_zip:
+            for info, content in self.members:
+                info = zipfile.ZipInfo(info.filename, info.date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                if isinstance(content, bytes):
+                    workbook_zip.writestr(info, content)
+                    continue
+                with workbook_zip.open(info, 'w') as f:
+                    for part in content:
+                        f.write((part if isinstance(part, str) else part.render(params)).encode('utf-8'))
+        return output.getvalue()
+
+
+def compile_sheet(xml, shared_strings):
+    """
+    把工作表切分为字面量片段及含变量的单元格，返回 (片段列表, 单元格数, 变量名)
+    """
+    parts, pos, cell_count, roots = [], 0, 0, set()
+    for match in CELL_PATTERN.finditer(xml):
+        if not (body := match.group('body')) or '<' not in body or re.search(r'<(?:\w+:)?f[\s>/]', body):
+            continue  # 空单元格、公式不解析变量
+        attrs = dict(ATTR_PATTERN.findall(match.group('attrs')))
+        if (cell_type := attrs.get('t')) == 's':
+            if not (index := VALUE_PATTERN.search(body)) or not index.group(1).strip().isdigit():
+                continue
+            value = shared_strings[int(index.group(1))]
+        elif cell_type == 'inlineStr':
+            value = unescape_xml(''.join(TEXT_PATTERN.findall(body)))
+        else:
+            continue
+        template = compile_template(value)
+        if isinstance(template, ConstTemplate):
+            continue
+        if roots is not None:
+            cell_roots = get_var_roots(template)
+            roots = roots | cell_roots if cell_roots is not None else None
+        keep_attrs = ''.join(f' {key}="{value}"' for key, value in ATTR_PATTERN.findall(match.group('attrs'))
+                             if key != 't')
+        parts.append(xml[pos:match.start()])
+        parts.append(CellSlot(match.group('prefix') or '', keep_attrs, template))
+        pos, cell_count = match.end(), cell_count + 1
+    parts.append(xml[pos:])
+    return parts, cell_count, roots
+
+
+def compile_excel_template(content):
+    """
+    编译xlsx文件，没有含变量的单元格时返回None
+    """
+    members, cell_count, roots = [], 0, set()
+    with zipfile.ZipFile(io.BytesIO(content)) as workbook_zip:
+        shared_strings = read_shared_strings(workbook_zip)
+        for info in workbook_zip.infolist():
+            data = workbook_zip.read(info)
+            if SHEET_PATTERN.match(info.filename):
+                parts, sheet_cells, sheet_roots = compile_sheet(data.decode('utf-8'), shared_strings)
+                if sheet_cells:
+                    members.append((info, parts))
+                    cell_count += sheet_cells
+                    roots = roots | sheet_roots if roots is not None and sheet_roots is not None else None
+                    continue
+            members.append((info, data))
+    return ExcelTemplate(members, cell_count, roots) if cell_count else None
+
+
+def render_excel_file(file, params):
+    """
+    渲染excel上传文件中的变量，返回文件对象；file为上传文件缓存返回的文件对象
+    """
+    if (digest := getattr(file, 'digest', None)) is None:
+        content = file.read()
+        digest = hashlib.sha256(content).hexdigest()
+        file = io.BytesIO(content)
+    # 只在模板未缓存时读取文件内容
+    template = excel_template_cache.get_or_create(digest, lambda: compile_excel_template(file.read()))
+    if template is None:  # 没有变量，直接使用原文件
+        file.seek(0)
+        return file
+    if (fingerprint := template.get_fingerprint(params)) is None:
+        return io.BytesIO(template.render(params))
+    rendered = excel_render_cache.get_or_create((digest, fingerprint), lambda: template.render(params))
+    return io.BytesIO(rendered)
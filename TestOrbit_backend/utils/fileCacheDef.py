@@ -0,0 +1,203 @@
+"""
+form-data上传文件的缓存
+上传文件按内容的sha256缓存在进程内，同一文件在多个步骤、多次循环中只下载一次，不再写入当前目录的临时文件：
+较小的文件保存在内存中，超过FILE_CACHE_MMAP_THRESHOLD的文件按内容hash写入缓存目录后以内存映射的方式读取；
+缓存的总大小超过FILE_CACHE_MAX_SIZE时淘汰最久未使用的文件。
+文件地址是本服务的上传文件地址（FILE_DIR_HOST）且文件在../FileData中时直接读取本地文件，不再通过HTTP请求自己；
+本地文件按修改时间及大小判断是否变化，其他地址下载后在FILE_CACHE_URL_TTL秒内不再重新下载。
+每次请求使用独立的读取对象（UploadFileReader），多个用例并发上传同一文件时互不影响。
+"""
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote, urlsplit
+
+import requests
+from django.conf import settings
+
+from utils.diyException import NotFoundFileError
+
+LOCAL_FILE_DIR = '../FileData'  # 上传文件的保存目录，与put_file一致
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # 未配置FILE_CACHE_MAX_SIZE时，缓存文件的总大小上限（字节）
+DEFAULT_MMAP_THRESHOLD = 4 * 1024 * 1024  # 未配置FILE_CACHE_MMAP_THRESHOLD时，超过该大小（字节）的文件以内存映射方式缓存
+DEFAULT_URL_TTL = 300  # 未配置FILE_CACHE_URL_TTL时，非本地文件下载后多久（秒）内不再重新下载
+DOWNLOAD_TIMEOUT = 60  # 下载上传文件的超时时间（秒）
+
+
+class UploadFileReader(io.RawIOBase):
+    """
+    缓存文件的只读文件对象，直接读取缓存的内容，不复制
+    """
+
+    def __init__(self, view, digest=None):
+        super().__init__()
+        self._view = view
+        self._pos = 0
+        self.digest = digest  # 文件内容的sha256
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        size = min(len(b), len(self._view) - self._pos)
+        b[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(base + offset, 0)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        self._view = memoryview(b'')  # 释放对缓存内容的引用，缓存淘汰后内存映射可以被回收
+        super().close()
+
+
+class CachedBlob:
+    """
+    缓存的文件内容，data为bytes或内存映射(mmap)
+    """
+
+    def __init__(self, digest, data, path=None):
+        self.digest = digest
+        self.data = data
+        self.size = len(data)
+        self.path = path  # 内存映射的缓存文件路径
+
+    def open(self):
+        return UploadFileReader(memoryview(self.data), self.digest)
+
+
+def get_local_file_path(file_url):
+    """
+    本服务上传的文件返回本地路径，其他地址或本地不存在时返回None
+    """
+    file_host = settings.FILE_DIR_HOST
+    if not file_url.startswith(file_host):
+        return None
+    base_dir = os.path.realpath(LOCAL_FILE_DIR)
+    path = os.path.realpath(os.path.join(base_dir, unquote(urlsplit(file_url[len(file_host):]).path)))
+    # 只允许读取上传目录中的文件
+    if os.path.commonpath([base_dir, path]) != base_dir or not os.path.isfile(path):
+        return None
+    return path
+
+
+class UploadFileCache:
+    """
+    进程内的上传文件缓存
+    """
+
+    def __init__(self, max_size=None, mmap_threshold=None, url_ttl=None, cache_dir=None):
+        self.max_size = max_size or getattr(settings, 'FILE_CACHE_MAX_SIZE', DEFAULT_MAX_SIZE)
+        self.mmap_threshold = mmap_threshold or getattr(settings, 'FILE_CACHE_MMAP_THRESHOLD', DEFAULT_MMAP_THRESHOLD)
+        self.url_ttl = url_ttl if url_ttl is not None else getattr(settings, 'FILE_CACHE_URL_TTL', DEFAULT_URL_TTL)
+        self.cache_dir = cache_dir or getattr(settings, 'FILE_CACHE_DIR', None) or os.path.join(
+            tempfile.gettempdir(), 'testorbit_file_cache')
+        self._blobs = OrderedDict()  # {内容hash: CachedBlob}，最近使用的在最后
+        self._sources = {}  # {文件地址: (内容hash, 校验信息)}，本地文件的校验信息为(修改时间, 大小)，其他为下载时间
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def open(self, file_name, file_url):
+        """
+        返回文件内容的只读文件对象
+        """
+        if (path := get_local_file_path(file_url)) is not None:
+            stat = os.stat(path)
+            blob = self._get_blob(file_url, lambda check: check == (stat.st_mtime_ns, stat.st_size))
+            if blob is None:
+                with open(path, 'rb') as f:
+                    blob = self._put(file_url, f.read(), (stat.st_mtime_ns, stat.st_size))
+        else:
+            blob = self._get_blob(file_url, lambda check: time.monotonic() - check < self.url_ttl)
+            if blob is None:
+                r = requests.get(file_url, timeout=DOWNLOAD_TIMEOUT)
+                if r.status_code == 404:
+                    raise NotFoundFileError('未找到上传的文件：' + file_name)
+                blob = self._put(file_url, r.content, time.monotonic())
+        return blob.open()
+
+    def _get_blob(self, file_url, is_valid):
+        with self._lock:
+            if (source := self._sources.get(file_url)) and is_valid(source[1]):
+                if (blob := self._blobs.get(source[0])) is not None:
+                    self._blobs.move_to_end(source[0])
+                    return blob
+        return None
+
+    def _put(self, file_url, content, check):
+        """
+        缓存文件内容，内容相同的文件只缓存一份
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            self._sources[file_url] = (digest, check)
+            if (blob := self._blobs.get(digest)) is not None:
+                self._blobs.move_to_end(digest)
+                return blob
+        if len(content) > self.max_size:
+            return CachedBlob(digest, content)  # 超过缓存上限的文件不缓存
+        blob = self._create_blob(digest, content)
+        with self._lock:
+            if (existing := self._blobs.get(digest)) is not None:
+                self._blobs.move_to_end(digest)
+                return existing  # 其他线程已经缓存了同一文件
+            self._blobs[digest] = blob
+            self._size += blob.size
+            self._evict()
+        return blob
+
+    def _create_blob(self, digest, content):
+        """
+        较大的文件按内容hash写入缓存目录并映射到内存，同一内容的缓存文件可以被多个进程共用
+        """
+        if len(content) < self.mmap_threshold:
+            return CachedBlob(digest, content)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, digest)
+        if not os.path.isfile(path) or os.path.getsize(path) != len(content):
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        with open(path, 'rb') as f:
+            return CachedBlob(digest, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path)
+
+    def _evict(self):
+        """
+        淘汰最久未使用的文件直到总大小不超过上限，需要在锁内调用
+        使用中的内存映射在读取对象关闭后才会被回收，这里不主动关闭
+        """
+        while self._size > self.max_size and len(self._blobs) > 1:
+            digest, blob = self._blobs.popitem(last=False)
+            self._size -= blob.size
+            if blob.path:
+                try:
+                    os.remove(blob.path)
+                except OSError:
+                    pass
+        live = set(self._blobs)
+        for file_url in [url for url, source in self._sources.items() if source[0] not in live]:
+            del self._sources[file_url]
+
+    def clear(self):
+        with self._lock:
+            self._blobs.clear()
+            self._sources.clear()
+            self._size = 0
+
+
+upload_file_cache = UploadFileCache()
@@ -0,0 +1,67 @@
+"""
+JSON解码
+响应体、JSON路径断言的解码都通过这里：安装了orjson时使用orjson，否则使用标准库json，可通过JSON_CODEC配置指定；
+orjson不支持的数据（超过64位的整数、嵌套过深等）自动改用标准库json解析，结果与只使用标准库时相同。
+编码（请求体、sql_var、JSONField）仍使用标准库json，保存及发送的JSON与原来逐字节一致。
+"""
+import json
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时使用标准库json
+    orjson = None
+
+DEFAULT_CODEC = 'auto'  # 未配置JSON_CODEC时，安装了orjson则使用orjson，否则使用标准库json
+
+
+class StdJSONCodec:
+    """
+    标准库json
+    """
+    name = 'json'
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """
+    orjson
+    """
+    name = 'orjson'
+
+    @staticmethod
+    def loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)
+
+
+CODECS = {StdJSONCodec.name: StdJSONCodec, OrjsonCodec.name: OrjsonCodec}
+_codec = None
+
+
+def get_json_codec():
+    """
+    返回JSON_CODEC配置的解码实现，配置的实现不可用时使用标准库json
+    """
+    global _codec
+    if _codec is None:
+        name = getattr(settings, 'JSON_CODEC', DEFAULT_CODEC)
+        if name == 'auto':
+            name = OrjsonCodec.name if orjson else StdJSONCodec.name
+        elif name == OrjsonCodec.name and not orjson:
+            print('未安装orjson，使用标准库json')
+        _codec = OrjsonCodec if name == OrjsonCodec.name and orjson else CODECS.get(name, StdJSONCodec)
+    return _codec
+
+
+def json_decode(data):
+    """
+    解码str或bytes，数据不是合法的JSON时抛出json.JSONDecodeError（ValueError）
+    """
+    return get_json_codec().loads(data)
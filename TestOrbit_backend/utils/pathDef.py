@@ -0,0 +1,146 @@
+"""
+取值路径编译
+把a.b[0][-1].*c这种取值路径（拆分后的name_list）编译为取值器并缓存，取值时直接按编译好的步骤逐级取值，
+不再拼接'base_params[_name][0][i]'字符串后eval。取值结果与编译前逐级eval取值的实现保持一致
+"""
+import re
+
+from utils.comDef import LRUCache
+from utils.diyException import DiyBaseException
+
+PATH_CACHE_SIZE = 4096  # 取值器缓存数量
+
+INDEX_PATTERN = re.compile(r'\[(.*?)]')
+LOOP_INDEX = object()  # 数组下标为i时，取值时替换为当前循环次数
+NOT_FOUND = object()  # 未找到下一级的值
+
+path_cache = LRUCache(PATH_CACHE_SIZE)
+
+
+def parse_index(index_name):
+    """
+    解析数组下标：[]中字符串为纯数字，或者为i，或者为-1这种数字
+    """
+    if index_name == 'i':
+        return LOOP_INDEX
+    if index_name.isascii() and (index_name.isdigit() or (
+            index_name.startswith('-') and index_name[1:].isdigit())):
+        return int(index_name)
+    raise DiyBaseException('错误的数组格式，若要使用变量表示数组下标，格式为:[${变量}]')
+
+
+class KeyStep:
+    """
+    按键名（可带数组下标）取下一级的值
+    路径格式错误时不在编译时报错，执行到该级时才报错，与逐级解析时的行为一致
+    """
+    __slots__ = ('name', 'indexes', 'error')
+
+    def __init__(self, name):
+        self.indexes, self.error = (), None
+        _index = INDEX_PATTERN.findall(name)  # 可能有多维数组的情况[0][1]
+        if _index:
+            name = name.split('[')[0]
+            try:
+                self.indexes = tuple(parse_index(index_name) for index_name in _index)
+            except DiyBaseException as e:
+                self.error = e
+        self.name = name
+
+    def get_indexes(self, value, i):
+        for index in self.indexes:
+            value = value[i if index is LOOP_INDEX else index]
+        return value
+
+    def get(self, base_params, i):
+        """
+        返回下一级的值，找不到时返回NOT_FOUND
+        """
+        if self.error:
+            raise self.error
+        if isinstance(base_params, dict):
+            if self.name in base_params:
+                if not self.indexes:
+                    return base_params[self.name]
+                # 有数组下标时，按索引的方式进入下一级；键名为空时直接对当前值取下标
+                return self.get_indexes(base_params[self.name] if self.name else base_params, i)
+        elif isinstance(base_params, list) and self.indexes:  # 键名为空的时候会走这个分支，也代表响应结果是纯数组
+            return self.get_indexes(base_params[self.name] if self.name else base_params, i)
+        return NOT_FOUND
+
+
+class FanOutStep:
+    """
+    *c：当前值为数组时，取数组中每个对象的c字段（字段值为对象时继续按剩余路径取值），当前值不是数组时按普通键名取值
+    """
+    __slots__ = ('name', 'key_step', 'rest')
+
+    def __init__(self, name, rest):
+        self.name = name[1:]
+        self.key_step = KeyStep(name)
+        self.rest = rest
+
+    def fan_out(self, base_params):
+        res_data = []
+        for v in base_params:
+            if not isinstance(v, dict) or self.name not in v:
+                return NOT_FOUND
+            get_value = v[self.name]
+            if isinstance(get_value, dict) and self.rest.steps:
+                get_value = self.rest.get(get_value)['value']
+            res_data.append(get_value)
+        return res_data
+
+
+class PathAccessor:
+    """
+    编译后的取值器
+    steps：逐级取值的步骤，类型为KeyStep、FanOutStep、tuple（[0]这种数组格式的路径，元素为下标）或None（忽略剩余路径）
+    """
+    __slots__ = ('steps',)
+
+    def __init__(self, name_list):
+        steps = []
+        for n, _name in enumerate(name_list or ()):
+            if isinstance(_name, str):
+                if _name.startswith('*'):
+                    steps.append(FanOutStep(_name, get_path_accessor(name_list[n + 1:])))
+                else:
+                    steps.append(KeyStep(_name))
+            elif isinstance(_name, list):  # [0].id这种参数时，格式化后会变为[0]的数组，会走这个分支
+                steps.append(tuple(_name))
+            else:  # 其他类型的路径忽略剩余部分，直接返回当前值
+                break
+        self.steps = tuple(steps)
+
+    def get(self, base_params, i=0):
+        """
+        取值，找到时返回{'value': 值}，找不到时返回False
+        """
+        for step in self.steps:
+            if step.__class__ is KeyStep:
+                base_params = step.get(base_params, i)
+            elif step.__class__ is FanOutStep:
+                if isinstance(base_params, list):
+                    res_data = step.fan_out(base_params)
+                    return False if res_data is NOT_FOUND else {'value': res_data}
+                base_params = step.key_step.get(base_params, i)
+            else:
+                if not step:
+                    raise DiyBaseException('错误的数组格式')
+                base_params = base_params[step[0] if len(step) == 1 else step]
+            if base_params is NOT_FOUND:
+                return False
+        return {'value': base_params}
+
+
+def get_path_accessor(name_list):
+    """
+    获取取值路径的取值器，按路径缓存
+    """
+    try:
+        key = tuple(('[]', tuple(n)) if isinstance(n, list) else n for n in name_list or ())
+        hash(key)
+    except TypeError:  # 路径中有不可哈希的值时不缓存
+        return PathAccessor(name_list)
+    return path_cache.get_or_create(key, lambda: PathAccessor(name_list))
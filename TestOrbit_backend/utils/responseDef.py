@@ -0,0 +1,167 @@
+"""
+接口响应的流式读取
+响应体分块读取，边读边计算大小及sha256，内存中最多保留RESPONSE_CAPTURE_MAX_BYTES字节，超出部分只计入大小和hash；
+二进制响应（按Content-Type或内容判断）不解码为文本；响应体只在需要时解码、解析JSON：
+输出参数、预期结果、断言规则需要响应体时才解析，请求日志中不超过RESPONSE_PREVIEW_BYTES的响应保存解析后的内容，
+较大或二进制的响应只保存大小、hash及截断的预览，避免大文件、超大列表占满执行进程的内存及步骤结果、报告。
+"""
+import hashlib
+import re
+
+from django.conf import settings
+
+from utils.jsonCodecDef import json_decode
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024  # 未配置RESPONSE_CAPTURE_MAX_BYTES时，内存中保留的响应体大小上限（字节）
+DEFAULT_PREVIEW_BYTES = 64 * 1024  # 未配置RESPONSE_PREVIEW_BYTES时，请求日志中完整保存的响应体大小上限（字节）
+CHUNK_SIZE = 64 * 1024  # 读取响应体的分块大小
+BINARY_SNIFF_BYTES = 1024  # 按内容判断二进制时检查的字节数
+TEXT_TYPES = ('text/', 'json', 'xml', 'javascript', 'html', 'x-www-form-urlencoded', 'csv', 'yaml')
+BINARY_TYPES = ('image/', 'audio/', 'video/', 'font/', 'application/octet-stream', 'application/pdf', 'application/zip',
+                'application/gzip', 'application/x-', 'application/vnd.', 'application/msword', 'application/protobuf')
+CHARSET_PATTERN = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+
+
+class BodyCapture:
+    """
+    分块读取的响应体
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or getattr(settings, 'RESPONSE_CAPTURE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        self.size = 0
+        self.truncated = False  # 响应体超过max_bytes，只保留了前max_bytes字节
+        self._hash = hashlib.sha256()
+        self._chunks = []
+        self._kept = 0
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if (remain := self.max_bytes - self._kept) > 0:
+            self._chunks.append(chunk[:remain])
+            self._kept += min(len(chunk), remain)
+        if len(chunk) > remain:
+            self.truncated = True
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    @property
+    def content(self):
+        return b''.join(self._chunks)
+
+
+class CapturedResponse:
+    """
+    读取完成的响应，提供与requests响应相同的status_code、headers、url、elapsed、content、text、json()
+    """
+
+    def __init__(self, status_code, headers, url, elapsed, capture):
+        self.status_code = status_code
+        self.headers = headers
+        self.url = url
+        self.elapsed = elapsed
+        self.size = capture.size
+        self.sha256 = capture.sha256
+        self.truncated = capture.truncated
+        self.content = capture.content
+        self._text = None
+        self._json = None
+
+    @property
+    def content_type(self):
+        return next((value for key, value in self.headers.items() if key.lower() == 'content-type'), '') or ''
+
+    @property
+    def charset(self):
+        if match := CHARSET_PATTERN.search(self.content_type):
+            return match.group(1)
+        return None
+
+    @property
+    def is_binary(self):
+        """
+        是否为二进制响应：Content-Type为常见的二进制类型，或未声明文本类型且内容中含有\\x00
+        """
+        content_type = self.content_type.lower()
+        if any(text_type in content_type for text_type in TEXT_TYPES):
+            return False
+        if any(content_type.startswith(binary_type) for binary_type in BINARY_TYPES):
+            return True
+        return b'\x00' in self.content[:BINARY_SNIFF_BYTES]
+
+    def decode(self, data, errors='replace'):
+        """
+        解码响应体，编码规则与requests一致：优先使用Content-Type中的charset，text类型未声明时为ISO-8859-1
+        """
+        encoding = self.charset or ('ISO-8859-1' if self.content_type.lower().startswith('text/') else 'utf-8')
+        try:
+            return data.decode(encoding, errors=errors)
+        except LookupError:  # 未知的编码
+            return data.decode('utf-8', errors=errors)
+
+    @property
+    def text(self):
+        """
+        解码后的响应体，结果会被缓存
+        """
+        if self._text is None:
+            self._text = self.decode(self.content)
+        return self._text
+
+    def json(self):
+        """
+        解析JSON响应体，结果会被缓存；截断或二进制的响应体不解析
+        """
+        if self._json is None:
+            if self.truncated or self.is_binary:
+                raise ValueError('响应体被截断或为二进制内容，无法解析为JSON')
+            self._json = (json_decode(self.text if self.charset else self.content),)
+        return self._json[0]
+
+    def get_summary(self, preview_bytes=None):
+        """
+        较大或二进制的响应体在请求日志中只保存大小、hash及预览，预览为响应体的前preview_bytes个字节，
+        截断处不完整的多字节字符被丢弃
+        """
+        preview_bytes = preview_bytes or getattr(settings, 'RESPONSE_PREVIEW_BYTES', DEFAULT_PREVIEW_BYTES)
+        return {'content_type': self.content_type, 'size': self.size, 'sha256': self.sha256,
+                'truncated': self.truncated, 'binary': self.is_binary,
+                'preview': None if self.is_binary else self.decode(self.content[:preview_bytes], 'ignore')}
+
+    def get_body(self):
+        """
+        供输出参数、预期结果、断言使用的响应体：JSON解析失败时为文本，二进制时为响应体的摘要
+        """
+        if self.is_binary:
+            return self.get_summary()
+        try:
+            return self.json()
+        except ValueError:
+            return self.text
+
+    def get_log_body(self, body=None):
+        """
+        请求日志中保存的响应体，body为已解析的响应体
+        """
+        preview_bytes = getattr(settings, 'RESPONSE_PREVIEW_BYTES', DEFAULT_PREVIEW_BYTES)
+        if self.is_binary or self.size > preview_bytes:
+            return self.get_summary(preview_bytes)
+        return self.get_body() if body is None else body
+
+
+def capture_response(r, max_bytes=None):
+    """
+    分块读取requests的流式响应（stream=True），读取完成后连接归还连接池
+    """
+    capture = BodyCapture(max_bytes)
+    try:
+        for chunk in r.iter_content(CHUNK_SIZE):
+            capture.feed(chunk)
+    finally:
+        r.close()
+    return CapturedResponse(r.status_code, r.headers, r.url, r.elapsed, capture)
@@ -0,0 +1,88 @@
+"""
+变量作用域
+执行用户代码（执行条件、循环中止条件、代码模式参数/预期）时，用VarScope代替对整个default_var的深复制：
+创建时只浅复制一层变量，可变的变量值（字典、列表等）在首次被读取时才深复制，未被读取的大变量（如sql_var保存的查询结果）不会被复制
+"""
+import copy
+import datetime
+import decimal
+
+# 不可变的变量值读取时不需要复制
+IMMUTABLE_TYPES = frozenset((str, int, float, bool, bytes, complex, type(None), decimal.Decimal,
+                             datetime.date, datetime.datetime, datetime.time, datetime.timedelta))
+
+
+class VarScope(dict):
+    """
+    写时复制的变量作用域
+    在作用域中新增、修改、删除变量，或修改读取到的变量值，都不会影响原变量，与深复制后再使用的隔离效果一致
+    """
+    __slots__ = ('_owned',)
+
+    def __init__(self, base=None):
+        super().__init__(base or {})
+        self._owned = set()  # 已复制或在作用域中重新赋值的变量，读取时直接返回
+
+    def _own(self, key, value):
+        if key in self._owned or type(value) in IMMUTABLE_TYPES:
+            return value
+        value = copy.deepcopy(value)
+        super().__setitem__(key, value)
+        self._owned.add(key)
+        return value
+
+    def __getitem__(self, key):
+        return self._own(key, super().__getitem__(key))
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._owned.add(key)
+
+    def __iter__(self):
+        # 重写__iter__后，dict(scope)、{**scope}等会通过__getitem__取值，不会拿到原变量的引用
+        return super().__iter__()
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *args):
+        if key in self:
+            value = self[key]
+            super().pop(key)
+            return value
+        return super().pop(key, *args)
+
+    def popitem(self):
+        key = next(reversed(self.keys()))
+        return key, self.pop(key)
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __or__(self, other):
+        return dict(self) | other
+
+    def __ror__(self, other):
+        return other | dict(self)
+
+    def copy(self):
+        return VarScope(self)
+
+    def __deepcopy__(self, memo):
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
@@ -0,0 +1,319 @@
+"""
+HTTP连接池
+每次执行（run）按目标主机复用 requests.Session，保持长连接，避免每个步骤都重新进行 TCP/TLS 握手
+只复用连接，不保存响应的Set-Cookie：与每次调用requests.request一致，cookie只在单个请求的重定向中携带，不会带到后续步骤、循环及用例
+异步执行模式下使用 AsyncHttpClient 发送请求
+响应体均以流式读取（见responseDef），返回 CapturedResponse
+"""
+import asyncio
+import ssl
+import threading
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import certifi
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.poolmanager import pool_classes_by_scheme
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # 未安装httpx时，异步执行模式会在线程池中使用requests发送请求
+    httpx = None
+
+from utils.responseDef import BodyCapture, CapturedResponse, capture_response, CHUNK_SIZE
+
+# 环境未配置时使用的默认连接参数
+DEFAULT_HTTP_CFG = {
+    'pool_connections': 10,  # 缓存的主机连接池数量
+    'pool_maxsize': 10,  # 单个主机最多保持的连接数
+    'pool_block': False,  # 连接数用尽时是否阻塞等待
+    'retries': 0,  # 连接失败重试次数（只针对连接阶段，不会重复发送已送达的请求）
+    'backoff_factor': 0,  # 重试间隔系数
+    'retry_status': [],  # 需要重试的响应状态码
+    'verify': True,  # 是否校验证书，也可以是CA证书路径
+    'cert': None,  # 客户端证书路径，或[证书, 私钥]
+    'keep_alive': True,  # 是否保持长连接
+}
+
+
+def get_http_cfg(http_cfg=None):
+    """
+    合并环境中的HTTP连接配置与默认配置
+    """
+    cfg = {**DEFAULT_HTTP_CFG, **(http_cfg or {})}
+    cfg['pool_connections'] = max(int(cfg['pool_connections']), 1)
+    cfg['pool_maxsize'] = max(int(cfg['pool_maxsize']), 1)
+    if isinstance(cfg['cert'], list):
+        cfg['cert'] = tuple(cfg['cert'])
+    return cfg
+
+
+connection_counter = threading.local()  # 当前线程建立的连接数，请求在哪个线程发送，建立的连接就计入哪个请求
+
+
+class CountConnectMixin:
+    """
+    建立连接时计数，用于统计每个请求是否复用了连接
+    """
+
+    def connect(self):
+        connection_counter.count = getattr(connection_counter, 'count', 0) + 1
+        return super().connect()
+
+
+class CountingHTTPConnection(CountConnectMixin, HTTPConnection):
+    pass
+
+
+class CountingHTTPSConnection(CountConnectMixin, HTTPSConnection):
+    pass
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+
+COUNTING_POOL_CLASSES = {'http': CountingHTTPConnectionPool, 'https': CountingHTTPSConnectionPool}
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """
+    建立连接时计数的HTTPAdapter
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = COUNTING_POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if manager.pool_classes_by_scheme is pool_classes_by_scheme:  # socks代理使用自己的连接池，不计数
+            manager.pool_classes_by_scheme = COUNTING_POOL_CLASSES
+        return manager
+
+
+def create_cookie_jar(jar_class=CookieJar):
+    """
+    不保存任何cookie的cookie容器，共用的session、httpx客户端不会把一个步骤响应的cookie带到其他请求中
+    """
+    return jar_class(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+class HttpSessionPool:
+    """
+    单次执行的HTTP连接池，按目标主机(scheme://host:port)维护一个 requests.Session
+    并统计连接的复用情况，写入每个步骤的请求日志
+    """
+
+    def __init__(self, http_cfg=None):
+        self.cfg = get_http_cfg(http_cfg)
+        self._sessions = {}
+        self._stats = {}  # {host: {'requests': 0, 'connections': 0}}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_host_key(url):
+        """
+        获取url对应的主机标识
+        """
+        split_url = urlsplit(url)
+        return f'{split_url.scheme}://{split_url.netloc}'.lower()
+
+    def _create_session(self):
+        """
+        按配置创建session
+        """
+        cfg = self.cfg
+        retry = Retry(total=int(cfg['retries']), connect=int(cfg['retries']), read=0,
+                      backoff_factor=float(cfg['backoff_factor']), status_forcelist=cfg['retry_status'] or None,
+                      allowed_methods=None, raise_on_status=False, raise_on_redirect=False)
+        adapter = CountingHTTPAdapter(pool_connections=cfg['pool_connections'], pool_maxsize=cfg['pool_maxsize'],
+                                      pool_block=bool(cfg['pool_block']), max_retries=retry)
+        session = requests.Session()
+        # 重定向时cookie由请求自己的cookie容器携带（与requests.request一致），session本身不保存cookie
+        session.cookies = create_cookie_jar(requests.cookies.RequestsCookieJar)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.verify = cfg['verify']
+        session.cert = cfg['cert']
+        if not cfg['keep_alive']:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def get_session(self, url):
+        """
+        获取目标主机对应的session
+        """
+        host = self.get_host_key(url)
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = self._create_session()
+                self._stats[host] = {'requests': 0, 'connections': 0}
+            return host, self._sessions[host]
+
+    def request(self, **req_params):
+        """
+        发送请求，返回响应以及本次请求的连接复用信息
+        """
+        url = req_params['url']
+        host, session = self.get_session(url)
+        connection_counter.count = 0
+        # 流式读取响应体，内存中只保留有限的字节数
+        r = capture_response(session.request(stream=True, **req_params))
+        return r, self.record(host, connection_counter.count)
+
+    def record(self, host, new_connections):
+        """
+        记录一次请求及其建立的连接数，返回请求日志中的连接信息：
+        host：目标主机，reused：本次请求是否复用了已有连接，
+        run_requests/run_connections/run_reused/run_reuse_rate：本次执行的请求数、建立的连接数、复用连接的请求数、复用率
+        """
+        with self._lock:
+            stats = self._stats[host]
+            stats['requests'] += 1
+            stats['connections'] += new_connections
+            return {'host': host, 'reused': new_connections == 0, **self.get_stats()}
+
+    def get_stats(self):
+        """
+        本次执行的连接复用统计
+        """
+        total_requests = sum(v['requests'] for v in self._stats.values())
+        total_connections = sum(v['connections'] for v in self._stats.values())
+        reused = max(total_requests - total_connections, 0)
+        return {'run_requests': total_requests, 'run_connections': total_connections, 'run_reused': reused,
+                'run_reuse_rate': round(reused / total_requests * 100, 2) if total_requests else 0}
+
+    def close(self):
+        """
+        关闭所有session及连接
+        """
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+def get_async_headers(response):
+    """
+    httpx的响应头转换为与requests一致的字典（保留原始大小写，重复的响应头以逗号拼接）
+    """
+    headers = {}
+    for key, value in response.headers.raw:
+        key, value = key.decode('latin-1'), value.decode('latin-1')
+        headers[key] = f'{headers[key]}, {value}' if key in headers else value
+    return headers
+
+
+class AsyncHttpClient:
+    """
+    异步执行模式使用的HTTP客户端，与HttpSessionPool共用连接配置及连接复用统计
+    请求由对应主机的 requests.Session 预处理（请求头、参数、请求体编码与同步模式完全一致），再由 httpx.AsyncClient 发送
+    httpx不支持按响应状态码重试及重试间隔，配置了retry_status或backoff_factor时，改为在线程池中使用requests发送请求
+    """
+
+    def __init__(self, http_pool):
+        self.http_pool = http_pool
+        self._client = None
+        cfg = http_pool.cfg
+        self.use_httpx = httpx is not None and not cfg['retry_status'] and not float(cfg['backoff_factor'])
+
+    def get_ssl_context(self):
+        """
+        按配置创建证书校验的ssl上下文
+        """
+        verify, cert = self.http_pool.cfg['verify'], self.http_pool.cfg['cert']
+        ctx = ssl.create_default_context(cafile=verify if isinstance(verify, str) else certifi.where())
+        if verify is False:
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+        if cert:
+            ctx.load_cert_chain(*cert) if isinstance(cert, tuple) else ctx.load_cert_chain(cert)
+        return ctx
+
+    def get_client(self):
+        if self._client is None:
+            cfg = self.http_pool.cfg
+            transport = httpx.AsyncHTTPTransport(
+                verify=self.get_ssl_context(), retries=int(cfg['retries']),
+                limits=httpx.Limits(max_keepalive_connections=cfg['pool_maxsize']))
+            self._client = httpx.AsyncClient(transport=transport, cookies=create_cookie_jar())
+        return self._client
+
+    async def request(self, **req_params):
+        """
+        发送请求，返回响应以及本次请求的连接信息（字段见HttpSessionPool.record，client为发送请求的客户端）
+        """
+        if not self.use_httpx:
+            r, connection = await asyncio.to_thread(self.http_pool.request, **req_params)
+            return r, {**connection, 'client': 'requests'}
+        timeout, allow_redirects = req_params.pop('timeout', None), req_params.pop('allow_redirects', True)
+        host, session = self.http_pool.get_session(req_params['url'])
+        prepared = session.prepare_request(requests.Request(**req_params))
+        body = prepared.body.encode('utf-8') if isinstance(prepared.body, str) else prepared.body
+        client, new_connections = self.get_client(), []
+
+        async def trace(event, info):  # 记录本次请求（含重定向、重试）建立的连接
+            if event == 'connection.connect_tcp.complete':
+                new_connections.append(event)
+
+        request = client.build_request(prepared.method, prepared.url, headers=dict(prepared.headers), content=body,
+                                       timeout=httpx.Timeout(timeout), extensions={'trace': trace})
+        r = await self.send(client, request, allow_redirects)
+        capture = BodyCapture()
+        try:
+            async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                capture.feed(chunk)
+        finally:
+            await r.aclose()
+        response = CapturedResponse(r.status_code, get_async_headers(r), str(r.url), r.elapsed, capture)
+        return response, {**self.http_pool.record(host, len(new_connections)), 'client': 'httpx'}
+
+    @staticmethod
+    async def send(client, request, allow_redirects):
+        """
+        发送请求并处理重定向：客户端不保存cookie，重定向过程中响应的cookie保存在本次请求的cookie容器中，
+        与requests.request一致，只在本次请求的后续重定向中携带
+        """
+        jar, redirects = httpx.Cookies(), 0
+        r = await client.send(request, stream=True, follow_redirects=False)
+        while allow_redirects and r.next_request is not None:
+            if redirects >= client.max_redirects:
+                await r.aclose()
+                raise httpx.TooManyRedirects('Exceeded maximum allowed redirects.', request=r.next_request)
+            jar.extract_cookies(r)
+            next_request = r.next_request
+            jar.set_cookie_header(next_request)
+            await r.aclose()
+            r = await client.send(next_request, stream=True, follow_redirects=False)
+            redirects += 1
+        return r
+
+    @staticmethod
+    def get_send_error(e):
+        """
+        将httpx发送请求时的异常转换为请求日志中的字段及提示信息，非请求异常时返回None
+        """
+        if httpx is None:
+            return None
+        if isinstance(e, httpx.UnsupportedProtocol):
+            return 'results', '无效的请求地址！'
+        elif isinstance(e, httpx.TransportError):
+            return 'response', '请求超时！'
+        return None
+
+    async def aclose(self):
+        """
+        关闭httpx客户端及连接
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
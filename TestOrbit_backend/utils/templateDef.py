@@ -0,0 +1,243 @@
+"""
+参数模板编译
+把参数（字符串、字典、列表）中的${变量}一次性解析为由字面量片段和变量查找组成的模板，并按内容哈希缓存（LRU淘汰），
+渲染时只需要查找变量、拼接字符串，不再重复执行正则匹配。渲染结果与模板编译前的逐次正则替换实现保持一致
+"""
+import hashlib
+import re
+
+import utils.paramsDef as paramsDef
+from utils.comDef import LRUCache
+from utils.constant import VAR_REGEX
+from utils.pathDef import get_path_accessor
+
+STR_CACHE_SIZE = 4096  # 字符串模板缓存数量
+STRUCT_CACHE_SIZE = 1024  # 字典/列表模板缓存数量
+EVAL_CACHE_SIZE = 1024  # eval(...)表达式编译结果缓存数量
+
+VAR_PATTERN = re.compile(VAR_REGEX)
+SENTINEL = '\x00{}\x00'  # 编译时模拟变量替换使用的占位值，不含 $ { } 字符
+
+str_template_cache = LRUCache(STR_CACHE_SIZE)
+struct_template_cache = LRUCache(STRUCT_CACHE_SIZE)
+eval_code_cache = LRUCache(EVAL_CACHE_SIZE)
+
+
+def has_special_char(value):
+    """
+    变量值中含有 $ { } 时，替换后可能组成新的变量，需要按原有的逐个替换方式处理
+    """
+    return '$' in value or '{' in value or '}' in value
+
+
+def eval_value(v, params, i):
+    """
+    执行eval(...)参数，编译结果按表达式缓存
+    """
+    if not isinstance(v, str):
+        return eval(v)  # 与原实现一致，非字符串直接交给eval（会报错）
+    code = eval_code_cache.get_or_create(v, lambda: compile(v.lstrip(' \t'), '<string>', 'eval'))
+    return eval(code, vars(paramsDef), {'v': v, 'params': params, 'i': i})
+
+
+def replace_render(v, params, i=0):
+    """
+    逐次正则匹配并替换字符串中的变量，用于嵌套变量名依赖替换结果、或变量值中含有 $ { } 的字符串
+    """
+    is_eval = False
+    if v.startswith('eval('):
+        v, is_eval = v[5:-1], True
+    var_name_list = VAR_PATTERN.findall(v)
+    var_name_len = len(var_name_list)
+    for j, var_name in enumerate(var_name_list):
+        real_var_name = var_name
+        if '${' in var_name:  # 当变量为${${a}}代表嵌套变量
+            real_var_name += '}'
+            real_var_name += re.findall(re.escape(real_var_name) + r"(.*?)}", v)[0]  # 补齐字段
+            var_name = str(replace_render(real_var_name, params, i))
+        res = get_path_accessor(var_name.split('.')).get(params, i)
+        if not res:
+            if var_name == 'i':  # i为固定变量
+                res = {'value': i}
+            else:
+                raise Exception("指定的变量不存在")
+        res_value = res['value']
+        # 变量加上${}后与原字符串相等时直接赋值，不需要替换
+        if j == 0 and 1 == var_name_len and (('${' + real_var_name + '}') == v):
+            v = res_value
+        else:
+            if not isinstance(res_value, str):
+                res_value = str(res_value)
+            v = v.replace('${' + real_var_name + '}', res_value)
+    if is_eval:
+        v = eval_value(v, params, i)
+    return v
+
+
+class ConstTemplate:
+    """
+    不含变量的值，渲染时原样返回
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def render(self, params, i=0):
+        return self.value
+
+
+class DictTemplate:
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def render(self, params, i=0):
+        return {key: template.render(params, i) for key, template in self.items}
+
+
+class ListTemplate:
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def render(self, params, i=0):
+        return [template.render(params, i) for template in self.items]
+
+
+class LegacyTemplate:
+    """
+    无法安全编译的字符串（嵌套变量的位置依赖替换后的内容），渲染时逐次正则替换
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def render(self, params, i=0):
+        return replace_render(self.value, params, i)
+
+
+class StrTemplate:
+    """
+    含变量的字符串模板
+    ops：按原有解析顺序排列的变量 (占位符, 变量名, 变量的取值器, 嵌套变量名的模板)
+    segments：不含嵌套变量时，按占位符切分后的片段，str为字面量，int为ops中变量的下标；含嵌套变量时为None，按占位符逐个替换
+    whole：整个字符串就是一个变量，渲染结果为变量的原始值（不转换为字符串）
+    """
+    __slots__ = ('value', 'source', 'is_eval', 'ops', 'segments', 'whole')
+
+    def __init__(self, value, source, is_eval, ops, segments, whole):
+        self.value, self.source, self.is_eval = value, source, is_eval
+        self.ops, self.segments, self.whole = ops, segments, whole
+
+    @staticmethod
+    def resolve(op, params, i):
+        """
+        查找变量的值
+        """
+        _, var_name, accessor, inner = op
+        if inner is not None:  # 嵌套变量，先渲染出变量名
+            var_name = str(inner.render(params, i))
+            accessor = get_path_accessor(var_name.split('.'))
+        res = accessor.get(params, i)
+        if not res:
+            if var_name == 'i':  # i为固定变量
+                res = {'value': i}
+            else:
+                raise Exception("指定的变量不存在")
+        return res['value']
+
+    def render(self, params, i=0):
+        if self.whole:
+            v = self.resolve(self.ops[0], params, i)
+        else:
+            values, special = [], False
+            for op in self.ops:
+                value = self.resolve(op, params, i)
+                if not isinstance(value, str):
+                    value = str(value)
+                special = special or has_special_char(value)
+                values.append(value)
+            if special and self.segments is None:
+                return replace_render(self.value, params, i)
+            if special or self.segments is None:  # 按原有方式逐个替换
+                v = self.source
+                for op, value in zip(self.ops, values):
+                    v = v.replace(op[0], value)
+            else:
+                v = ''.join(values[s] if isinstance(s, int) else s for s in self.segments)
+        if self.is_eval:
+            v = eval_value(v, params, i)
+        return v
+
+
+def compile_str(value):
+    """
+    编译字符串模板：按原有解析方式（正则取变量、补齐嵌套变量名）确定变量及其占位符
+    """
+    source, is_eval = value, False
+    if value.startswith('eval('):
+        source, is_eval = value[5:-1], True
+    var_name_list = VAR_PATTERN.findall(source)
+    if not var_name_list and not is_eval:
+        return ConstTemplate(value)
+
+    ops, simulated, nested = [], source, False
+    for j, var_name in enumerate(var_name_list):
+        real_var_name, inner = var_name, None
+        if '${' in var_name:  # 当变量为${${a}}代表嵌套变量
+            nested = True
+            real_var_name += '}'
+            tail = re.findall(re.escape(real_var_name) + r"(.*?)}", simulated)
+            # 变量名需要在前面的变量替换后才能确定时，使用原有的解析方式
+            if not tail or '\x00' in tail[0]:
+                return LegacyTemplate(value)
+            real_var_name += tail[0]
+            inner = get_str_template(real_var_name)
+        placeholder = '${' + real_var_name + '}'
+        ops.append((placeholder, var_name, None if inner else get_path_accessor(var_name.split('.')), inner))
+        simulated = simulated.replace(placeholder, SENTINEL.format(j))
+
+    segments = None
+    if not nested:
+        segments, pos, op_index = [], 0, {}
+        for j, op in enumerate(ops):
+            op_index.setdefault(op[0], j)
+        for match in VAR_PATTERN.finditer(source):
+            if match.start() > pos:
+                segments.append(source[pos:match.start()])
+            segments.append(op_index[match.group(0)])
+            pos = match.end()
+        if pos < len(source):
+            segments.append(source[pos:])
+    whole = len(ops) == 1 and ops[0][0] == source
+    return StrTemplate(value, source, is_eval, tuple(ops), segments, whole)
+
+
+def get_str_template(value):
+    return str_template_cache.get_or_create(value, lambda: compile_str(value))
+
+
+def compile_node(v):
+    if isinstance(v, str):
+        return get_str_template(v)
+    elif isinstance(v, dict):
+        return DictTemplate(tuple((key, compile_node(v[key])) for key in v))
+    elif isinstance(v, list):
+        return ListTemplate(tuple(compile_node(_v) for _v in v))
+    return ConstTemplate(v)
+
+
+def compile_template(v):
+    """
+    获取参数的模板，字典和列表按内容哈希缓存
+    """
+    if isinstance(v, str):
+        return get_str_template(v)
+    elif isinstance(v, (dict, list)):
+        key = hashlib.blake2b(repr(v).encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        return struct_template_cache.get_or_create((type(v), key), lambda: compile_node(v))
+    return ConstTemplate(v)